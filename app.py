@@ -1,16 +1,25 @@
 import streamlit as st
-from openai import OpenAI
+from src.utils.resources import get_registry
 import os
 from dotenv import load_dotenv
-from src.chatbot.base import BaseFODMAPChatbot
-from src.database.query_processor import FODMAPQueryProcessor
-from src.utils.constants import SYSTEM_PROMPT
-from src.chatbot.ai_chatbot import AIFODMAPChatbot
-class AIFODMAPChatbot(BaseFODMAPChatbot):
-    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str, openai_api_key: str):
-        super().__init__(neo4j_uri, neo4j_user, neo4j_password)
-        self.client = OpenAI(api_key=openai_api_key)
-        self.query_processor = FODMAPQueryProcessor(openai_api_key)
+from src.chatbot.ai_chatbot import AIFODMAPChatbot as ConsoleFODMAPChatbot
+
+
+def render_message(message: dict, container=st):
+    if message["role"] == "user":
+        container.markdown(
+            f'<div class="chat-message user-message">👤 You: {message["content"]}</div>',
+            unsafe_allow_html=True
+        )
+    else:
+        container.markdown(
+            f'<div class="chat-message bot-message">🤖 Assistant: {message["content"]}</div>',
+            unsafe_allow_html=True
+        )
+
+
+class AIFODMAPChatbot(ConsoleFODMAPChatbot):
+    """The chatbot with Streamlit output; retrieval and completion are shared with the console version"""
 
     def visualize_results(self, results: list, query_type: str):
         """Create visualizations based on query results"""
@@ -76,82 +85,52 @@ class AIFODMAPChatbot(BaseFODMAPChatbot):
     
     
         
-    def get_relevant_context(self, user_query: str) -> tuple[str, dict]:
-        queries, metadata = self.query_processor.process_query(user_query)
-        
-        context_parts = []
-        all_results = {}
-        
-        for query_info in queries:
-            results = self.query_graph(query_info["query"], query_info["params"])
-            
-            if metadata["query_type"] == "meal":
-                for analysis in metadata.get("meal_analyses", []):
-                    context_parts.append(f"\nAnalysis for {analysis['dish_name']}:")
-                    
-                    fodmap_concerns = []
-                    for result in results:
-                        status = result["status"]
-                        if status == "avoid":
-                            fodmap_concerns.append(
-                                f"- {result['ingredient']} should be avoided "
-                                f"(contains {', '.join(result['fodmap_categories'])})"
-                            )
-                        elif status == "recommended":
-                            context_parts.append(f"- {result['ingredient']} is safe to eat")
-                    
-                    if fodmap_concerns:
-                        context_parts.append("FODMAP concerns:")
-                        context_parts.extend(fodmap_concerns)
-                    
-                    all_results[f"meal_{analysis['dish_name']}"] = (results, "meal_analysis")
-            
-            else:
-                for result in results:
-                    if "ingredient" in result:
-                        context_parts.append(
-                            f"{result['ingredient']} ({result['status']}) "
-                            f"{'contains ' + ', '.join(result['fodmap_categories']) if result['fodmap_categories'] else ''}"
-                        )
-                    elif "group" in result:
-                        foods = [f"{food['name']} ({food['status']})" for food in result['foods']]
-                        context_parts.append(f"{result['group']}: {', '.join(foods[:5])}")
-                
-                all_results[metadata["query_type"]] = (results, metadata["query_type"])
-        
-        return "\n".join(context_parts), all_results
-
-    def generate_response(self, user_query: str) -> str:
+    def generate_response(self, user_query: str, stream: bool = True) -> str:
+        query_errors = []
         with st.spinner("🔍 Retrieving information from knowledge graph..."):
-            context, all_results = self.get_relevant_context(user_query)
-        
-        if not context:
-            context = "No specific information found in the FODMAP database."
+            context, all_results = self.get_relevant_context(user_query, query_errors)
+        for error in query_errors:
+            st.error(error)
         
         # Display context visualization
         st.write("📊 Retrieved Information:")
         for results, query_type in all_results.values():
             self.visualize_results(results, query_type)
         
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "system", "content": f"Context from FODMAP database:\n{context}"},
-            {"role": "user", "content": user_query}
-        ]
+        messages = self.build_messages(user_query, context)
         
         try:
-            with st.spinner("🤖 Generating response..."):
-                response = self.client.chat.completions.create(
-                    model="gpt-4",
-                    messages=messages,
-                    temperature=0.7,
-                    max_tokens=500
+            if stream:
+                # Render tokens as they arrive, then leave the finished answer in place as a chat bubble
+                placeholder = st.empty()
+                with placeholder.container():
+                    response = st.write_stream(self.stream_completion(messages))
+                render_message({"role": "assistant", "content": response}, placeholder)
+                st.caption(
+                    f"⏱️ First token after {self.last_timings['time_to_first_token'] or 0:.2f}s, "
+                    f"answer complete after {self.last_timings['total_generation_time']:.2f}s"
                 )
+                return response
             
-            return response.choices[0].message.content
+            with st.spinner("🤖 Generating response..."):
+                return self.complete(messages)
         
         except Exception as e:
-            return f"I encountered an error: {str(e)}. Please try again."
+            response = f"I encountered an error: {str(e)}. Please try again."
+            if stream:
+                render_message({"role": "assistant", "content": response})
+            return response
+
+@st.cache_resource
+def get_chatbot() -> AIFODMAPChatbot:
+    """One chatbot per process, shared across sessions and reruns; its driver closes at shutdown"""
+    load_dotenv()
+    return AIFODMAPChatbot(
+        neo4j_uri=os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+        neo4j_user=os.getenv("NEO4J_USER", "neo4j"),
+        neo4j_password=os.getenv("NEO4J_PASSWORD", "password"),
+        openai_api_key=os.getenv("OPENAI_API_KEY")
+    )
 
 def main():
     st.set_page_config(
@@ -209,16 +188,8 @@ def main():
     if 'messages' not in st.session_state:
         st.session_state.messages = []
 
-    # Load environment variables
-    load_dotenv()
-
     # Initialize chatbot
-    chatbot = AIFODMAPChatbot(
-        neo4j_uri=os.getenv("NEO4J_URI", "bolt://localhost:7687"),
-        neo4j_user=os.getenv("NEO4J_USER", "neo4j"),
-        neo4j_password=os.getenv("NEO4J_PASSWORD", "password"),
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
+    chatbot = get_chatbot()
 
     # Sidebar with example queries
     with st.sidebar:
@@ -238,6 +209,47 @@ def main():
         trigger foods for people with IBS and other digestive disorders.
         """)
 
+        pools = get_registry().pool_metrics()
+        if pools:
+            # The async pipeline has its own driver; the blocking one serves ad-hoc queries and refreshes
+            st.markdown("### Connection Pool")
+            for name, pool in pools.items():
+                st.caption(
+                    f"{name}: {pool['in_use']} in use (peak {pool['peak_in_use']}) of {pool['max_pool_size']}; "
+                    f"acquisition wait avg {pool['avg_acquisition_wait_ms']:.1f} ms, "
+                    f"max {pool['max_acquisition_wait_ms']:.1f} ms"
+                )
+
+        query_report = chatbot.profiler.report()
+        if query_report:
+            st.markdown("### Graph Queries")
+            for template, stats in sorted(query_report.items()):
+                st.caption(
+                    f"{template}: {stats['executions']} runs, p50 {stats['wall']['p50_ms']:.0f} ms, "
+                    f"p95 {stats['wall']['p95_ms']:.0f} ms, {stats['rows_mean']:.1f} rows avg"
+                )
+
+        llm_metrics = chatbot.gateway.metrics()
+        if llm_metrics:
+            st.markdown("### LLM Calls")
+            for call_site, metrics in llm_metrics.items():
+                st.caption(
+                    f"{call_site}: {metrics['calls']} calls, p50 {metrics['latency_p50_ms']:.0f} ms, "
+                    f"p95 {metrics['latency_p95_ms']:.0f} ms, queue p95 {metrics['queue_wait_p95_ms']:.0f} ms, "
+                    f"{metrics['retries']} retries, "
+                    f"{metrics['failures']} failures, "
+                    f"{metrics['prompt_tokens'] + metrics['completion_tokens']} tokens"
+                )
+
+        llm_cache = chatbot.query_processor.cache
+        if llm_cache is not None:
+            st.markdown("### LLM Cache")
+            for namespace, stats in llm_cache.stats().items():
+                st.caption(
+                    f"{namespace}: {stats['hit_rate']:.0%} hit rate "
+                    f"({stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries)"
+                )
+
     # Chat interface
     col1, col2 = st.columns([4, 1])
     with col1:
@@ -248,30 +260,23 @@ def main():
     with col2:
         send_button = st.button("Send")
 
+    shown = None
     if send_button or user_input:
         if user_input:
             # Add user message to chat history
             st.session_state.messages.append({"role": "user", "content": user_input})
             
-            # Get chatbot response
+            # Get chatbot response; the streamed answer is already on screen
             response = chatbot.generate_response(user_input)
+            shown = len(st.session_state.messages)
             
             # Add assistant response to chat history
             st.session_state.messages.append({"role": "assistant", "content": response})
 
     # Display chat history
-    for message in st.session_state.messages:
-        if message["role"] == "user":
-            st.markdown(
-                f'<div class="chat-message user-message">👤 You: {message["content"]}</div>',
-                unsafe_allow_html=True
-            )
-        else:
-            st.markdown(
-                f'<div class="chat-message bot-message">🤖 Assistant: {message["content"]}</div>',
-                unsafe_allow_html=True
-            )
+    for index, message in enumerate(st.session_state.messages):
+        if index != shown:
+            render_message(message)
 
-    chatbot.close()
 if __name__ == "__main__":
     main()
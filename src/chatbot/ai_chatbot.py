@@ -1,14 +1,26 @@
-from openai import OpenAI
+from typing import AsyncIterator, Iterator, Optional
+import time
+from ..utils.resources import get_registry, run_sync
 import streamlit as st
+from ..database.graph_backend import GraphBackend
+from ..database.knowledge_snapshot import FODMAPKnowledgeSnapshot
 from ..database.query_processor import FODMAPQueryProcessor
-from .base import BaseFODMAPChatbot
+from ..database.local_classifier import LocalQueryClassifier
+from ..database.fuzzy_matcher import FuzzyMatcher
+from .base import BaseFODMAPChatbot, collect_query_errors
 from ..utils.constants import SYSTEM_PROMPT
 
 class AIFODMAPChatbot(BaseFODMAPChatbot):
-    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str, openai_api_key: str):
-        super().__init__(neo4j_uri, neo4j_user, neo4j_password)
-        self.client = OpenAI(api_key=openai_api_key)
-        self.query_processor = FODMAPQueryProcessor(openai_api_key)
+    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str, openai_api_key: str,
+                 snapshot: Optional[FODMAPKnowledgeSnapshot] = None, backend: Optional[GraphBackend] = None):
+        super().__init__(neo4j_uri, neo4j_user, neo4j_password, snapshot=snapshot, backend=backend)
+        self.gateway = get_registry().llm_gateway(openai_api_key)
+        vocabulary = self.vocabulary_source
+        self.query_processor = FODMAPQueryProcessor(
+            openai_api_key,
+            local_classifier=LocalQueryClassifier(vocabulary) if vocabulary is not None else None,
+            fuzzy_matcher=FuzzyMatcher(vocabulary) if vocabulary is not None else None
+        )
 
     def visualize_results(self, results: list, query_type: str):
         """Create visualizations based on query results"""
@@ -59,35 +71,50 @@ class AIFODMAPChatbot(BaseFODMAPChatbot):
                 for food in unsafe_foods:
                     print(f"❌ {food['name']}")
     
-    def get_relevant_context(self, user_query: str) -> tuple[str, dict]:
-        queries, metadata = self.query_processor.process_query(user_query)
+    def _dish_context(self, dish_name: str, results: list) -> list:
+        """Context lines for one dish: safe ingredients first, then FODMAP concerns"""
+        context_parts = [f"\nAnalysis for {dish_name}:"]
+        fodmap_concerns = []
+        for result in results:
+            status = result["status"]
+            if status == "avoid":
+                fodmap_concerns.append(
+                    f"- {result['ingredient']} should be avoided "
+                    f"(contains {', '.join(result['fodmap_categories'])})"
+                )
+            elif status == "recommended":
+                context_parts.append(f"- {result['ingredient']} is safe to eat")
+        
+        if fodmap_concerns:
+            context_parts.append("FODMAP concerns:")
+            context_parts.extend(fodmap_concerns)
+        return context_parts
+
+    def get_relevant_context(self, user_query: str, errors: Optional[list] = None) -> tuple[str, dict]:
+        return run_sync(self.aget_relevant_context(user_query, errors))
+
+    async def aget_relevant_context(self, user_query: str, errors: Optional[list] = None) -> tuple[str, dict]:
+        """Graph context for the query; failed lookups are appended to errors for the caller to show"""
+        await self.query_processor.arefresh_vocabulary()
+        with collect_query_errors(errors):
+            # Foods named verbatim are looked up while classification runs; whatever it does not ask for is discarded
+            prefetched = self.prefetch_queries(self.query_processor.speculative_queries(user_query))
+            try:
+                queries, metadata = await self.query_processor.aprocess_query(user_query)
+                query_results = await self.arun_queries(queries, prefetched)
+            finally:
+                # Classification failed or was cancelled: nothing will await the speculative lookups
+                self.discard_prefetched(prefetched)
         
         context_parts = []
         all_results = {}
         
-        for query_info in queries:
-            results = self.query_graph(query_info["query"], query_info["params"])
-            
-            if metadata["query_type"] == "meal":
-                for analysis in metadata.get("meal_analyses", []):
-                    context_parts.append(f"\nAnalysis for {analysis['dish_name']}:")
-                    
-                    fodmap_concerns = []
-                    for result in results:
-                        status = result["status"]
-                        if status == "avoid":
-                            fodmap_concerns.append(
-                                f"- {result['ingredient']} should be avoided "
-                                f"(contains {', '.join(result['fodmap_categories'])})"
-                            )
-                        elif status == "recommended":
-                            context_parts.append(f"- {result['ingredient']} is safe to eat")
-                    
-                    if fodmap_concerns:
-                        context_parts.append("FODMAP concerns:")
-                        context_parts.extend(fodmap_concerns)
-                    
-                    all_results[f"meal_{analysis['dish_name']}"] = (results, "meal_analysis")
+        for query_info, results in zip(queries, query_results):
+            if query_info.get("template") == "meal_batch":
+                # Rows are already grouped per dish, so one linear pass builds the context
+                for row in results:
+                    context_parts.extend(self._dish_context(row["dish"], row["results"]))
+                    all_results[f"meal_{row['dish']}"] = (row["results"], "meal_analysis")
             
             else:
                 for result in results:
@@ -97,40 +124,102 @@ class AIFODMAPChatbot(BaseFODMAPChatbot):
                             f"{'contains ' + ', '.join(result['fodmap_categories']) if result['fodmap_categories'] else ''}"
                         )
                     elif "group" in result:
-                        foods = [f"{food['name']} ({food['status']})" for food in result['foods']]
-                        context_parts.append(f"{result['group']}: {', '.join(foods[:5])}")
+                        foods = [f"{food['name']} ({food['status']}, {food['fodmap_level']} FODMAP)"
+                                 for food in result['foods']]
+                        shown = f" (first {len(foods)} of {result['total']})" if result['total'] > len(foods) else ""
+                        context_parts.append(f"{result['group']}{shown}: {', '.join(foods)}")
                 
                 all_results[metadata["query_type"]] = (results, metadata["query_type"])
         
+        did_you_mean = metadata.get("did_you_mean")
+        if did_you_mean:
+            # A near miss is never swapped in silently; the answer has to confirm which food was meant
+            context_parts.append(
+                f"'{did_you_mean['name']}' is not a known food; it may be a typo for "
+                f"{', '.join(did_you_mean['candidates'])}. Ask the user which one they meant before advising on it."
+            )
+        
         return "\n".join(context_parts), all_results
 
-    def generate_response(self, user_query: str) -> str:
-        print("🔍 Retrieving information from knowledge graph...")
-        context, all_results = self.get_relevant_context(user_query)
-        
+    def build_messages(self, user_query: str, context: str) -> list:
         if not context:
             context = "No specific information found in the FODMAP database."
         
-        print("📊 Retrieved Information:")
-        for results, query_type in all_results.values():
-            self.visualize_results(results, query_type)
-        
-        messages = [
+        return [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "system", "content": f"Context from FODMAP database:\n{context}"},
             {"role": "user", "content": user_query}
         ]
+
+    def stream_completion(self, messages: list) -> Iterator[str]:
+        """Yield answer tokens as they arrive; timings are recorded in self.last_timings"""
+        started = time.perf_counter()
+        self.last_timings = {"time_to_first_token": None, "total_generation_time": None}
+        
+        for token in self.gateway.stream_chat("generate_response", messages, temperature=0.7, max_tokens=500):
+            if self.last_timings["time_to_first_token"] is None:
+                self.last_timings["time_to_first_token"] = time.perf_counter() - started
+            yield token
+        
+        self.last_timings["total_generation_time"] = time.perf_counter() - started
+
+    async def astream_completion(self, messages: list) -> AsyncIterator[str]:
+        """Async stream_completion, for callers already running on an event loop"""
+        started = time.perf_counter()
+        self.last_timings = {"time_to_first_token": None, "total_generation_time": None}
+        
+        async for token in self.gateway.astream_chat("generate_response", messages, temperature=0.7, max_tokens=500):
+            if self.last_timings["time_to_first_token"] is None:
+                self.last_timings["time_to_first_token"] = time.perf_counter() - started
+            yield token
+        
+        self.last_timings["total_generation_time"] = time.perf_counter() - started
+
+    async def acomplete(self, messages: list) -> str:
+        response = await self.gateway.achat(
+            "generate_response",
+            messages,
+            temperature=0.7,
+            max_tokens=500
+        )
+        return response.choices[0].message.content
+
+    def complete(self, messages: list) -> str:
+        """Non-streaming answer through the gateway; both UIs use this one path"""
+        return run_sync(self.acomplete(messages))
+
+    async def agenerate_response(self, user_query: str) -> str:
+        """Non-streaming generate_response for callers on the pipeline's event loop; many requests share one loop"""
+        context, _ = await self.aget_relevant_context(user_query)
+        messages = self.build_messages(user_query, context)
+        try:
+            return await self.acomplete(messages)
+        except Exception as e:
+            return f"I encountered an error: {str(e)}. Please try again."
+
+    def generate_response(self, user_query: str, stream: bool = False) -> str:
+        print("🔍 Retrieving information from knowledge graph...")
+        context, all_results = self.get_relevant_context(user_query)
+        
+        print("📊 Retrieved Information:")
+        for results, query_type in all_results.values():
+            self.visualize_results(results, query_type)
+        
+        messages = self.build_messages(user_query, context)
         
         try:
             print("🤖 Generating response...")
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
+            if stream:
+                tokens = []
+                for token in self.stream_completion(messages):
+                    print(token, end="", flush=True)
+                    tokens.append(token)
+                print()
+                print(f"⏱️ First token after {self.last_timings['time_to_first_token'] or 0:.2f}s, "
+                      f"done after {self.last_timings['total_generation_time']:.2f}s")
+                return "".join(tokens)
             
-            return response.choices[0].message.content
+            return self.complete(messages)
         
         except Exception as e:
             return f"I encountered an error: {str(e)}. Please try again."
@@ -1,33 +1,153 @@
-from typing import List, Dict, Any, Tuple
-from neo4j import GraphDatabase
-import streamlit as st
+from typing import List, Dict, Any, Optional
+import asyncio
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from ..database.graph_backend import GraphBackend, Neo4jGraphBackend, graph_backend_from_env
+from ..database.knowledge_snapshot import FODMAPKnowledgeSnapshot
+from ..database.query_profiler import QueryProfiler
+from ..utils.resources import get_registry, run_sync
+
+# Errors of the request being answered; lookup tasks and worker threads copy the context, so they see the same list
+_query_errors: ContextVar[Optional[List[str]]] = ContextVar("query_errors", default=None)
+
+
+def report_query_error(message: str):
+    """Log a failed graph lookup and pass it to the request collecting errors, if any.
+
+    Lookups run on the shared loop or its worker threads, where Streamlit calls have no script context,
+    so the UI shows the collected errors itself.
+    """
+    print(message)
+    errors = _query_errors.get()
+    if errors is not None:
+        errors.append(message)
+
+
+@contextmanager
+def collect_query_errors(errors: Optional[List[str]]):
+    """Send report_query_error messages of the current task, and the lookups it starts, to errors"""
+    token = _query_errors.set(errors)
+    try:
+        yield errors
+    finally:
+        _query_errors.reset(token)
+
+
+def query_key(query_info: Dict[str, Any]) -> str:
+    """Identity of a generated query: the same template with the same parameters returns the same rows"""
+    return json.dumps([query_info.get("template"), query_info.get("params")], sort_keys=True, ensure_ascii=False)
+
 
 class BaseFODMAPChatbot:
-    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str):
-        self.driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+    def __init__(self, neo4j_uri: str, neo4j_user: str, neo4j_password: str,
+                 use_snapshot: bool = True, snapshot_refresh_interval: float = 60.0,
+                 profiler: Optional[QueryProfiler] = None, snapshot: Optional[FODMAPKnowledgeSnapshot] = None,
+                 backend: Optional[GraphBackend] = None):
+        self.profiler = profiler or QueryProfiler.from_env()
+        if backend is None:
+            backend = graph_backend_from_env(self.profiler)
+        if backend is None:
+            # The driver is shared process-wide and closed by the registry at shutdown
+            self.driver = get_registry().neo4j_driver(neo4j_uri, neo4j_user, neo4j_password)
+            backend = Neo4jGraphBackend(self.driver, self.profiler,
+                                        get_registry().neo4j_async_driver(neo4j_uri, neo4j_user, neo4j_password))
+        else:
+            self.driver = getattr(backend, "driver", None)
+        self.backend = backend
+        # The snapshot saves round trips to Neo4j; in-process backends answer just as fast themselves
+        if snapshot is None and use_snapshot and not backend.in_process:
+            snapshot = FODMAPKnowledgeSnapshot(self.driver, snapshot_refresh_interval)
+        self.snapshot = snapshot
+        # Only touched on the pipeline's event loop, so no lock
+        self.speculation = {"prefetched": 0, "reused": 0, "discarded": 0}
 
     def close(self):
-        self.driver.close()
+        """Kept for callers that manage their own lifecycle; shared resources outlive the chatbot"""
+        pass
+
+    @property
+    def vocabulary_source(self) -> Optional[GraphBackend]:
+        """Where the local classifier and fuzzy matcher read food names from, if anywhere in-process"""
+        if self.snapshot is not None:
+            return self.snapshot
+        return self.backend if self.backend.in_process else None
+
+    def run_query(self, query_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Answer a generated query from the in-memory snapshot, falling back to the graph backend"""
+        return run_sync(self.arun_query(query_info))
 
-    def query_graph(self, query: str, params: dict = None) -> List[Dict[str, Any]]:
-        """Execute Neo4j query and return results"""
+    async def arun_query(self, query_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Async run_query; failures are passed to report_query_error and answered with no rows"""
+        template = query_info.get("template", "adhoc")
+        if self.snapshot is not None:
+            started = time.perf_counter()
+            records = await self.snapshot.aanswer(query_info)
+            if records is not None:
+                self.profiler.record(f"{template}@snapshot", (time.perf_counter() - started) * 1000,
+                                     rows=len(records))
+                return records
+        try:
+            records = await self.backend.aanswer(query_info)
+        except Exception as e:
+            report_query_error(f"Database query error: {str(e)}")
+            return []
+        if records is not None:
+            return records
+        return await asyncio.to_thread(self.query_graph, query_info["query"], query_info["params"], template)
+
+    def prefetch_queries(self, queries: List[Dict[str, Any]]) -> Dict[str, asyncio.Task]:
+        """Start lookups that may be needed before classification settles it; pass the result to arun_queries"""
+        prefetched = {}
+        for query_info in queries:
+            key = query_key(query_info)
+            if key not in prefetched:
+                prefetched[key] = asyncio.ensure_future(self.arun_query(query_info))
+        self.speculation["prefetched"] += len(prefetched)
+        return prefetched
+
+    def discard_prefetched(self, prefetched: Dict[str, asyncio.Task]):
+        """Cancel prefetched lookups nobody will await and empty the dict"""
+        for task in prefetched.values():
+            task.cancel()
+            # A lookup that already failed would otherwise log "exception was never retrieved"
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self.speculation["discarded"] += len(prefetched)
+        prefetched.clear()
+
+    async def arun_queries(self, queries: List[Dict[str, Any]],
+                           prefetched: Optional[Dict[str, asyncio.Task]] = None) -> List[List[Dict[str, Any]]]:
+        """Run generated queries concurrently, reusing identical prefetched lookups and cancelling the rest.
+
+        Reused tasks are removed from prefetched and the rest are discarded, so the dict is empty afterwards.
+        """
+        prefetched = prefetched if prefetched is not None else {}
+        tasks = []
+        for query_info in queries:
+            task = prefetched.pop(query_key(query_info), None)
+            if task is not None:
+                self.speculation["reused"] += 1
+            else:
+                task = asyncio.ensure_future(self.arun_query(query_info))
+            tasks.append(task)
+        self.discard_prefetched(prefetched)
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            # gather leaves the other lookups running when one fails or the caller is cancelled
+            for task in tasks:
+                task.cancel()
+            raise
+
+    def query_graph(self, query: str, params: dict = None, template: str = "adhoc") -> List[Dict[str, Any]]:
+        """Execute Neo4j query and return results, profiled under the given template name"""
+        if self.driver is None:
+            report_query_error(f"The {self.backend.name} graph backend cannot run Cypher queries")
+            return []
         try:
             with self.driver.session() as session:
-                # Debug logging
-                st.write("Executing query:", query)
-                st.write("With parameters:", params)
-                
-                if params is None:
-                    result = session.run(query)
-                else:
-                    result = session.run(query, params)
-                
-                records = [dict(record) for record in result]
-                
-                # Debug logging
-                st.write(f"Found {len(records)} results")
-                return records
-                
+                return self.profiler.run(session, template, query, params)
         except Exception as e:
-            st.error(f"Database query error: {str(e)}")
-            return []
\ No newline at end of file
+            report_query_error(f"Database query error: {str(e)}")
+            return []
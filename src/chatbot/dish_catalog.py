@@ -0,0 +1,239 @@
+from typing import Callable, Dict, Iterable, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from dotenv import load_dotenv
+from ..utils.cache import content_key
+from ..utils.constants import DISH_CATALOG_BATCH_PROMPT, KNOWN_DISHES, MEAL_ANALYSIS_PROMPT
+from ..utils.llm_gateway import LLMGateway
+from ..utils.llm_scheduler import BATCH
+from ..utils.text import fold_diacritics, normalize_name
+
+
+def dish_key(name: str) -> str:
+    """Spelling-insensitive key: "İmam bayıldı", "imambayildi" and "imam bayıldı" share one entry"""
+    return fold_diacritics(name).replace(" ", "")
+
+
+def prompt_version(prompt: str, model: str) -> str:
+    """Identifies the prompt and model behind a breakdown; changing either invalidates its entries"""
+    return content_key(prompt, model)[:16]
+
+
+def current_versions(gateway: LLMGateway) -> List[str]:
+    """Versions of the live and the batch breakdown prompts with the models the gateway uses today"""
+    return [
+        prompt_version(MEAL_ANALYSIS_PROMPT, gateway.model_for("analyze_meal")),
+        prompt_version(DISH_CATALOG_BATCH_PROMPT, gateway.model_for("build_dish_catalog"))
+    ]
+
+
+class DishCatalog:
+    """Persisted dish -> ingredients breakdowns, consulted before asking the LLM to decompose a dish.
+
+    Each entry records the prompt version that produced it and expires after ttl_seconds, so a
+    prompt or model change, or plain age, sends the dish back to the LLM.
+    """
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = 30 * 24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._listeners: List[Callable[[List[str]], None]] = []
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dishes (
+                    key TEXT PRIMARY KEY,
+                    dish_name TEXT NOT NULL,
+                    ingredients TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    model TEXT,
+                    updated_at REAL NOT NULL,
+                    version TEXT
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(dishes)")}
+            if "version" not in columns:
+                # Catalogs from before versioning: their entries have no version and count as stale
+                conn.execute("ALTER TABLE dishes ADD COLUMN version TEXT")
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets the app read while the batch job writes"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def subscribe(self, listener: Callable[[List[str]], None]):
+        """Call listener with the dish names of every later put, e.g. to teach the local classifier new dishes"""
+        self._listeners.append(listener)
+
+    def get(self, dish_name: str, versions: Optional[Iterable[str]] = None) -> Optional[Dict]:
+        """The stored breakdown in analyze_meal's shape, or None for an unknown, expired or stale dish.
+
+        With versions, an entry made by any other prompt version counts as stale.
+        """
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT dish_name, ingredients, source, updated_at, version FROM dishes WHERE key = ?",
+                (dish_key(dish_name),)
+            ).fetchone()
+        if row is None:
+            return None
+        if self.ttl_seconds is not None and time.time() - row[3] > self.ttl_seconds:
+            return None
+        if versions is not None and row[4] not in set(versions):
+            return None
+        return {"dish_name": row[0], "ingredients": json.loads(row[1]), "source": f"catalog:{row[2]}"}
+
+    def put(self, dish_name: str, ingredients: List[Dict], source: str, model: Optional[str] = None,
+            version: Optional[str] = None):
+        """Store a breakdown; an empty ingredient list is never stored"""
+        if not ingredients:
+            return
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO dishes (key, dish_name, ingredients, source, model, updated_at, version) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (dish_key(dish_name), dish_name, json.dumps(ingredients, ensure_ascii=False),
+                 source, model, time.time(), version)
+            )
+        for listener in self._listeners:
+            listener([dish_name])
+
+    def dish_names(self) -> List[str]:
+        with self._connection() as conn:
+            return [row[0] for row in conn.execute("SELECT dish_name FROM dishes ORDER BY dish_name")]
+
+    def __contains__(self, dish_name: str) -> bool:
+        return self.get(dish_name) is not None
+
+    def __len__(self) -> int:
+        with self._connection() as conn:
+            return conn.execute("SELECT count(*) FROM dishes").fetchone()[0]
+
+
+_default_dish_catalog = None
+_default_dish_catalog_lock = threading.Lock()
+
+
+def default_dish_catalog() -> Optional[DishCatalog]:
+    """Process-wide catalog at FODMAP_DISH_CATALOG_PATH; set the variable to an empty string to disable.
+
+    Entries expire after FODMAP_DISH_CATALOG_TTL seconds (30 days); an empty value keeps them forever.
+    """
+    global _default_dish_catalog
+    path = os.getenv("FODMAP_DISH_CATALOG_PATH", ".fodmap_cache/dish_catalog.sqlite3")
+    if not path:
+        return None
+    with _default_dish_catalog_lock:
+        if _default_dish_catalog is None or _default_dish_catalog.path != path:
+            ttl = os.getenv("FODMAP_DISH_CATALOG_TTL", str(30 * 24 * 3600))
+            _default_dish_catalog = DishCatalog(path, ttl_seconds=float(ttl) if ttl else None)
+        return _default_dish_catalog
+
+
+def decompose_dishes(gateway: LLMGateway, dish_names: List[str]) -> Dict[str, List[Dict]]:
+    """Break down several dishes in one LLM call; returns ingredients keyed by the requested name"""
+    response = gateway.chat(
+        "build_dish_catalog",
+        [
+            {"role": "system", "content": DISH_CATALOG_BATCH_PROMPT},
+            {"role": "user", "content": "Yemekler:\n" + "\n".join(f"- {name}" for name in dish_names)}
+        ],
+        timeout=300,
+        temperature=0.0
+    )
+    parsed = json.loads(response.choices[0].message.content)
+
+    requested = {dish_key(name): name for name in dish_names}
+    results = {}
+    for dish in parsed.get("dishes", []):
+        # Match on the key so a reformatted name ("Imam Bayildi") still lands on the right dish
+        name = requested.get(dish_key(dish.get("dish_name", "")))
+        if name is not None and dish.get("ingredients"):
+            results[name] = dish["ingredients"]
+    return results
+
+
+def build_catalog(catalog: DishCatalog, gateway: LLMGateway, dish_names: List[str], batch_size: int = 10,
+                  max_workers: int = 4, refresh: bool = False) -> Dict[str, int]:
+    """Decompose every missing dish in batches of batch_size per LLM call"""
+    versions = current_versions(gateway)
+    pending = []
+    seen = set()
+    for name in dish_names:
+        name = normalize_name(name)
+        if name and dish_key(name) not in seen and (refresh or catalog.get(name, versions) is None):
+            seen.add(dish_key(name))
+            pending.append(name)
+
+    batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+    model = gateway.model_for("build_dish_catalog")
+    version = prompt_version(DISH_CATALOG_BATCH_PROMPT, model)
+    stored = 0
+    failed = []
+
+    def run(batch: List[str]):
+        try:
+            return batch, decompose_dishes(gateway, batch)
+        except Exception as e:
+            print(f"⚠️ Batch failed ({', '.join(batch)}): {str(e)}")
+            return batch, {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch, results in executor.map(run, batches):
+            for name in batch:
+                if name in results:
+                    catalog.put(name, results[name], source="batch", model=model, version=version)
+                    stored += 1
+                else:
+                    failed.append(name)
+
+    if failed:
+        print(f"No breakdown returned for: {', '.join(failed)}")
+    return {"requested": len(pending), "stored": stored, "failed": len(failed), "llm_calls": len(batches)}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Precompute dish ingredient breakdowns")
+    arg_parser.add_argument("--dishes", help="text file with one dish per line (default: KNOWN_DISHES)")
+    arg_parser.add_argument("--batch-size", type=int, default=10, help="dishes decomposed per LLM call")
+    arg_parser.add_argument("--workers", type=int, default=4, help="LLM calls in flight")
+    arg_parser.add_argument("--refresh", action="store_true", help="re-decompose dishes already in the catalog")
+    args = arg_parser.parse_args()
+
+    load_dotenv()
+
+    if args.dishes:
+        with open(args.dishes, "r", encoding="utf-8") as f:
+            dish_names = [line.strip() for line in f if line.strip()]
+    else:
+        dish_names = KNOWN_DISHES
+
+    catalog = default_dish_catalog()
+    if catalog is None:
+        raise SystemExit("FODMAP_DISH_CATALOG_PATH is empty; nowhere to store the catalog")
+
+    gateway = LLMGateway.from_env(os.getenv("OPENAI_API_KEY"))
+    gateway.default_priority = BATCH
+    try:
+        stats = build_catalog(catalog, gateway, dish_names, args.batch_size, args.workers, args.refresh)
+    finally:
+        gateway.close()
+
+    print(f"Stored {stats['stored']} of {stats['requested']} dishes in {stats['llm_calls']} LLM calls; "
+          f"catalog now has {len(catalog)} dishes")
+
+if __name__ == "__main__":
+    main()
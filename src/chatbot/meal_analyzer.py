@@ -1,56 +1,91 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
+import asyncio
 import json
-from openai import OpenAI
+from ..utils.resources import get_registry, run_sync
+from ..utils.cache import LLMResponseCache
 from ..utils.constants import MEAL_ANALYSIS_PROMPT
+from ..utils.text import normalize_name
+from ..database.food_lookup import MEAL_INGREDIENTS_QUERY
+from ..database.fuzzy_matcher import FuzzyMatcher
+from .dish_catalog import DishCatalog, current_versions, prompt_version
 
 class MealAnalyzer:
-    def __init__(self, openai_api_key: str):
-        self.client = OpenAI(api_key=openai_api_key)
+    def __init__(self, openai_api_key: str, cache: Optional[LLMResponseCache] = None,
+                 fuzzy_matcher: Optional[FuzzyMatcher] = None, dish_catalog: Optional[DishCatalog] = None):
+        self.gateway = get_registry().llm_gateway(openai_api_key)
+        self.cache = cache
+        self.fuzzy_matcher = fuzzy_matcher
+        self.dish_catalog = dish_catalog
+
+    def analyze_meal(self, meal_name: str, timeout: Optional[float] = None) -> Dict:
+        """Break down a meal into its base ingredients, from the dish catalog when the dish is known"""
+        return run_sync(self.aanalyze_meal(meal_name, timeout))
+
+    async def aanalyze_meal(self, meal_name: str, timeout: Optional[float] = None) -> Dict:
+        """Async analyze_meal: catalog and cache first, then one LLM call; SQLite reads and writes run in worker threads"""
+        if self.dish_catalog is not None:
+            cataloged = await asyncio.to_thread(self.dish_catalog.get, meal_name, current_versions(self.gateway))
+            if cataloged is not None:
+                return cataloged
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(
+                "analyze_meal", MEAL_ANALYSIS_PROMPT, self.gateway.model_for("analyze_meal"), meal_name
+            )
+            cached = await asyncio.to_thread(self.cache.get, "analyze_meal", cache_key)
+            if cached is not None:
+                # The cache key already pins this prompt and model, so the breakdown is current
+                await self._catalog(meal_name, cached)
+                return cached
 
-    def analyze_meal(self, meal_name: str) -> Dict:
-        """Break down a meal into its base ingredients"""
         messages = [
             {"role": "system", "content": MEAL_ANALYSIS_PROMPT},
             {"role": "user", "content": f'List all main ingredients in this dish: "{meal_name}"'}
         ]
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
+            response = await self.gateway.achat(
+                "analyze_meal",
+                messages,
+                timeout=timeout,
                 temperature=0.1,
                 max_tokens=500
             )
             
-            return json.loads(response.choices[0].message.content)
+            meal_analysis = json.loads(response.choices[0].message.content)
+            if cache_key is not None:
+                await asyncio.to_thread(self.cache.put, "analyze_meal", cache_key, meal_analysis)
+            await self._catalog(meal_name, meal_analysis)
+            return meal_analysis
             
         except Exception as e:
+            print(f"⚠️ analyze_meal failed for {meal_name}: {str(e)}")
             return {
                 "error": str(e),
                 "dish_name": meal_name,
                 "ingredients": []
             }
 
+    async def _catalog(self, meal_name: str, meal_analysis: Dict):
+        """New dishes join the catalog, stamped with the live prompt version, so the next mention skips the LLM"""
+        if self.dish_catalog is None:
+            return
+        model = self.gateway.model_for("analyze_meal")
+        await asyncio.to_thread(self.dish_catalog.put, meal_name, meal_analysis.get("ingredients", []),
+                                source="live", model=model, version=prompt_version(MEAL_ANALYSIS_PROMPT, model))
+
     def generate_ingredient_queries(self, ingredients: List[Dict]) -> Dict:
         """Generate Cypher query for checking ingredients"""
         ingredient_names = [ing["name"] for ing in ingredients]
+        if self.fuzzy_matcher is not None:
+            # Misspelled or diacritic-less names still hit the exact-name index
+            ingredient_names = [self.fuzzy_matcher.resolve(name) or name for name in ingredient_names]
         
         return {
-            "query": """
-            MATCH (f:Food)
-            WHERE toLower(f.name) IN $ingredients
-            OPTIONAL MATCH (f)-[:BELONGS_TO]->(fg:FoodGroup)
-            OPTIONAL MATCH (f)-[:CONTAINS_FODMAP]->(fc:FODMAPCategory)
-            OPTIONAL MATCH (f)-[:SHOULD_AVOID]->()
-            OPTIONAL MATCH (f)-[:IS_RECOMMENDED]->()
-            RETURN f.name as ingredient,
-                   fg.name as food_group,
-                   collect(DISTINCT fc.name) as fodmap_categories,
-                   CASE WHEN (f)-[:SHOULD_AVOID]->() THEN 'avoid'
-                        WHEN (f)-[:IS_RECOMMENDED]->() THEN 'recommended'
-                        ELSE 'unknown' END as status
-            """,
+            "template": "meal_ingredients",
+            "query": MEAL_INGREDIENTS_QUERY,
             "params": {
-                "ingredients": [ing.lower() for ing in ingredient_names]
+                "ingredients": [normalize_name(ing) for ing in ingredient_names]
             }
         }
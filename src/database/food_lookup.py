@@ -0,0 +1,141 @@
+from typing import List, Optional
+import re
+from ..utils.constants import FOOD_GROUP_ALIASES
+from ..utils.text import normalize_name, turkish_stem_candidates
+
+# Full-text index over the Turkish-folded names of foods and their alternative names
+FOOD_NAMES_FULLTEXT_INDEX = "food_names_fulltext"
+
+# Shared row shape of every ingredient lookup; expects f, fg and fodmap_categories in scope
+FOOD_RESULT_FIELDS = """{
+    ingredient: f.name,
+    food_group: fg.name,
+    fodmap_categories: fodmap_categories,
+    status: CASE WHEN EXISTS { (f)-[:SHOULD_AVOID]->() } THEN 'avoid'
+                 WHEN EXISTS { (f)-[:IS_RECOMMENDED]->() } THEN 'recommended'
+                 ELSE 'unknown' END
+}"""
+
+# Resolve one normalized name to its canonical food through either index; expects ingredient_name
+RESOLVE_FOOD_BY_NAME = """
+CALL {
+    WITH ingredient_name
+    MATCH (f:Food {name_normalized: ingredient_name})
+    RETURN f
+    UNION
+    WITH ingredient_name
+    MATCH (:AlternativeName {name_normalized: ingredient_name})-[:REFERS_TO]->(f:Food)
+    RETURN f
+}
+"""
+
+# Foods per ingredient lookup unless the caller asks for another limit; every backend counts foods, not rows
+INGREDIENT_LIMIT = 25
+
+# Term search for a single ingredient, with the matching rule every backend shares (see words_match):
+# full-text word-prefix hits on foods or aliases, aliases mapped to their food, exact names first and
+# then name order. The limit applies to foods before they expand into one row per group
+INGREDIENT_QUERY = """
+CALL db.index.fulltext.queryNodes($index, $search) YIELD node
+OPTIONAL MATCH (node:AlternativeName)-[:REFERS_TO]->(canonical:Food)
+WITH coalesce(canonical, node) AS f, node
+WHERE f:Food
+WITH f, max(CASE WHEN node.name_normalized = $ingredient THEN 1 ELSE 0 END) AS exact
+ORDER BY exact DESC, f.name
+LIMIT $limit
+OPTIONAL MATCH (f)-[:BELONGS_TO]->(fg:FoodGroup)
+OPTIONAL MATCH (f)-[:CONTAINS_FODMAP]->(fc:FODMAPCategory)
+WITH f, exact, fg, collect(DISTINCT fc.name) as fodmap_categories
+WITH exact, f.name AS food_name, """ + FOOD_RESULT_FIELDS + """ AS row
+RETURN row.ingredient as ingredient,
+       row.food_group as food_group,
+       row.fodmap_categories as fodmap_categories,
+       row.status as status
+ORDER BY exact DESC, food_name
+"""
+
+# Exact lookup of a dish's ingredient list, one index seek per name
+MEAL_INGREDIENTS_QUERY = """
+UNWIND $ingredients AS ingredient_name
+""" + RESOLVE_FOOD_BY_NAME + """
+WITH DISTINCT f
+OPTIONAL MATCH (f)-[:BELONGS_TO]->(fg:FoodGroup)
+OPTIONAL MATCH (f)-[:CONTAINS_FODMAP]->(fc:FODMAPCategory)
+WITH f, fg, collect(DISTINCT fc.name) as fodmap_categories
+WITH """ + FOOD_RESULT_FIELDS + """ AS row
+RETURN row.ingredient as ingredient,
+       row.food_group as food_group,
+       row.fodmap_categories as fodmap_categories,
+       row.status as status
+"""
+
+# One round trip for every dish in a question; rows come back grouped per dish
+MEAL_BATCH_QUERY = """
+UNWIND $dishes AS dish
+CALL {
+    WITH dish
+    UNWIND dish.ingredients AS ingredient_name
+""" + RESOLVE_FOOD_BY_NAME + """
+    WITH DISTINCT f
+    OPTIONAL MATCH (f)-[:BELONGS_TO]->(fg:FoodGroup)
+    OPTIONAL MATCH (f)-[:CONTAINS_FODMAP]->(fc:FODMAPCategory)
+    WITH f, fg, collect(DISTINCT fc.name) as fodmap_categories
+    RETURN collect(""" + FOOD_RESULT_FIELDS + """) as results
+}
+RETURN dish.name as dish, dish.position as position, results
+ORDER BY position
+"""
+
+# Group questions read the food lists materialized on FoodGroup nodes at ingest. The page is sliced
+# before rows are built, so a page costs O(limit) rather than O(group size)
+FOOD_GROUP_QUERY = """
+UNWIND $groups AS group_name
+MATCH (fg:FoodGroup {name_normalized: group_name})
+WITH fg, coalesce(fg.food_count, 0) AS total,
+     coalesce(fg.food_names, [])[$offset..$offset + $limit] AS names,
+     coalesce(fg.food_statuses, [])[$offset..$offset + $limit] AS statuses,
+     coalesce(fg.food_levels, [])[$offset..$offset + $limit] AS levels
+RETURN fg.name as group,
+       [i IN range(0, size(names) - 1) | {
+           name: names[i],
+           status: statuses[i],
+           fodmap_level: levels[i]
+       }] as foods,
+       total
+"""
+
+_GROUP_ALIASES = {normalize_name(alias): group for alias, group in FOOD_GROUP_ALIASES.items()}
+
+
+def resolve_food_group(name: str) -> str:
+    """Canonical group name for a Turkish or English group mention ("meyveler" -> "Fruits")"""
+    normalized = normalize_name(name)
+    words = normalized.split()
+    if words:
+        prefix = " ".join(words[:-1])
+        for stem in turkish_stem_candidates(words[-1]):
+            group = _GROUP_ALIASES.get(f"{prefix} {stem}".strip())
+            if group is not None:
+                return group
+    return name
+
+
+def name_words(name: str) -> List[str]:
+    """The words of a normalized name, split the way the full-text index tokenizes it"""
+    return re.findall(r"[^\W_]+", normalize_name(name))
+
+
+def words_match(term_words: List[str], words: List[str]) -> bool:
+    """The ingredient matching rule: every word of the term starts some word of the name.
+
+    "soğan" matches "kuru soğan" and "soğanlı" but not "yeşilsoğan"; "kuru so" matches "kuru soğan".
+    """
+    return bool(term_words) and all(any(word.startswith(term_word) for word in words) for term_word in term_words)
+
+
+def fulltext_search(term: str) -> Optional[str]:
+    """Lucene query for words_match: every word of the term as a prefix"""
+    words = name_words(term)
+    if not words:
+        return None
+    return " AND ".join(f"{word}*" for word in words)
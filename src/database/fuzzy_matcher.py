@@ -0,0 +1,198 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from collections import defaultdict
+from .knowledge_snapshot import FODMAPKnowledgeSnapshot
+from ..utils.resources import on_event_loop
+from ..utils.text import fold_diacritics
+
+# Candidates ranked by shared trigrams that get the (more expensive) edit-distance check
+MAX_CANDIDATES = 24
+
+
+class FuzzyMatch(NamedTuple):
+    food: str
+    matched_name: str
+    score: float
+
+
+def trigrams(folded: str) -> Set[str]:
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> Optional[int]:
+    """Edit distance, or None as soon as it is known to exceed max_distance.
+
+    Only the diagonal band of width 2 * max_distance + 1 is computed; cells outside it
+    cannot lead to a distance within the bound.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    if a == b:
+        return 0
+    too_far = max_distance + 1
+    previous = {i: i for i in range(min(len(a), max_distance) + 1)}
+    for j in range(1, len(b) + 1):
+        char_b = b[j - 1]
+        low = max(0, j - max_distance)
+        high = min(len(a), j + max_distance)
+        current = {}
+        row_min = too_far
+        for i in range(low, high + 1):
+            if i == 0:
+                value = j
+            else:
+                value = previous.get(i - 1, too_far) + (a[i - 1] != char_b)
+                insert = current.get(i - 1, too_far) + 1
+                if insert < value:
+                    value = insert
+            delete = previous.get(i, too_far) + 1
+            if delete < value:
+                value = delete
+            current[i] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return None
+        previous = current
+    distance = previous.get(len(a), too_far)
+    return distance if distance <= max_distance else None
+
+
+def max_edits(length: int) -> int:
+    """Typos tolerated for a term of this length: none up to 3 letters, one up to 7, then two"""
+    if length <= 3:
+        return 0
+    return 1 if length <= 7 else 2
+
+
+class FuzzyMatcher:
+    """Diacritic-folding, typo-tolerant resolver from user-typed names to canonical foods.
+
+    Exact folded names ("sogan" -> "soğan") resolve with one dict lookup; anything else goes
+    through a trigram index to a handful of candidates that are checked with a bounded
+    Levenshtein distance.
+    """
+
+    def __init__(self, snapshot: Optional[FODMAPKnowledgeSnapshot] = None, min_score: float = 0.75,
+                 accept_score: float = 0.85):
+        self.snapshot = snapshot
+        self.min_score = min_score
+        # Matches between min_score and accept_score are only offered as suggestions: "elmas" is
+        # one edit from "elma" but is a different word, and a silent rewrite changes the answer
+        self.accept_score = accept_score
+        self._exact: Dict[str, List[Tuple[str, str]]] = {}
+        self._names: List[Tuple[str, str, str]] = []
+        self._grams: List[frozenset] = []
+        # trigram -> name length -> entry indexes, so only names of a plausible length are read
+        self._postings: Dict[str, Dict[int, List[int]]] = {}
+        self._built_version = None
+
+    @classmethod
+    def from_names(cls, names: Iterable[Tuple[str, str]], **kwargs) -> "FuzzyMatcher":
+        """Build from (surface name, canonical food) pairs without a snapshot"""
+        matcher = cls(**kwargs)
+        matcher.build(names)
+        return matcher
+
+    def build(self, names: Iterable[Tuple[str, str]]):
+        """Index every (surface name, canonical food) pair by its folded form and trigrams"""
+        exact = defaultdict(list)
+        entries = []
+        grams = []
+        postings = defaultdict(lambda: defaultdict(list))
+        for surface, food in names:
+            folded = fold_diacritics(surface)
+            if not folded or (surface, food) in exact[folded]:
+                continue
+            exact[folded].append((surface, food))
+            index = len(entries)
+            entries.append((folded, surface, food))
+            name_grams = frozenset(trigrams(folded))
+            grams.append(name_grams)
+            for gram in name_grams:
+                postings[gram][len(folded)].append(index)
+
+        self._exact = dict(exact)
+        self._names = entries
+        self._grams = grams
+        self._postings = {gram: dict(by_length) for gram, by_length in postings.items()}
+
+    def _sync(self):
+        """Rebuild whenever the backing snapshot reloads"""
+        if self.snapshot is None:
+            return
+        # On the event loop the pipeline refreshes through arefresh first; blocking here would stall every request
+        if not on_event_loop():
+            self.snapshot.refresh_quietly()
+        if self.snapshot.loaded and self.snapshot.version != self._built_version:
+            food_names, alternative_names, _ = self.snapshot.vocabulary()
+            self.build([(name, name) for name in food_names] + list(alternative_names.items()))
+            self._built_version = self.snapshot.version
+
+    def match(self, term: str, limit: int = 3) -> List[FuzzyMatch]:
+        """Ranked canonical foods for a user-typed name, best first, at most one entry per food"""
+        self._sync()
+        folded = fold_diacritics(term)
+        if not folded:
+            return []
+
+        exact = self._exact.get(folded)
+        if exact:
+            return [FuzzyMatch(food, surface, 1.0) for surface, food in exact[:limit]]
+
+        budget = max_edits(len(folded))
+        if budget == 0:
+            return []
+
+        # With k edits at most 3k trigrams of the term can be lost, so every name within k edits
+        # shares at least one of the term's 3k + 1 rarest trigrams; only those postings are read
+        term_grams = trigrams(folded)
+        min_overlap = len(term_grams) - 3 * budget
+        lengths = range(len(folded) - budget, len(folded) + budget + 1)
+        gram_postings = []
+        for gram in term_grams:
+            by_length = self._postings.get(gram, {})
+            gram_postings.append([by_length[length] for length in lengths if length in by_length])
+        gram_postings.sort(key=lambda lists: sum(map(len, lists)))
+        pool = set()
+        for lists in gram_postings[:3 * budget + 1]:
+            for indexes in lists:
+                pool.update(indexes)
+
+        grams = self._grams
+        overlap = {}
+        for index in pool:
+            count = len(term_grams & grams[index])
+            if count >= min_overlap:
+                overlap[index] = count
+        candidates = sorted(overlap, key=overlap.__getitem__, reverse=True)[:MAX_CANDIDATES]
+
+        best: Dict[str, FuzzyMatch] = {}
+        distances: Dict[str, int] = {}
+        bound = budget
+        for index in candidates:
+            name, surface, food = self._names[index]
+            distance = bounded_levenshtein(folded, name, bound)
+            if distance is None:
+                continue
+            score = 1.0 - distance / max(len(folded), len(name))
+            if score >= self.min_score and (food not in best or best[food].score < score):
+                best[food] = FuzzyMatch(food, surface, score)
+                distances[food] = distance
+                # Once `limit` foods are found, later candidates only matter if they are closer
+                if len(distances) >= limit:
+                    bound = sorted(distances.values())[limit - 1]
+
+        return sorted(best.values(), key=lambda match: (-match.score, match.food))[:limit]
+
+    def resolve(self, term: str) -> Optional[str]:
+        """Best canonical food for a term, or None when nothing is close enough to replace it"""
+        matches = self.match(term, limit=1)
+        return matches[0].food if matches and matches[0].score >= self.accept_score else None
+
+    def suggest(self, term: str, limit: int = 3) -> List[str]:
+        """Foods the term may be a typo for, when none is close enough for resolve; a "did you mean" list"""
+        matches = self.match(term, limit)
+        if not matches or matches[0].score >= self.accept_score:
+            return []
+        return [match.food for match in matches]
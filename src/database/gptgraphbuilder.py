@@ -1,22 +1,162 @@
-from openai import OpenAI
+from typing import Dict, List, Optional
+import argparse
+import hashlib
 import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from neo4j import GraphDatabase
 import os
 from dotenv import load_dotenv
+from .knowledge_snapshot import GRAPH_META_NAME
+from .food_lookup import FOOD_NAMES_FULLTEXT_INDEX
+from ..utils.cache import ParseCache, content_key
+from ..utils.llm_gateway import LLMGateway
+from ..utils.llm_scheduler import BATCH
+from ..utils.text import normalize_name
 
-class FODMAPParser:
-    def __init__(self, openai_api_key: str, neo4j_uri: str, neo4j_user: str, neo4j_password: str):
-        self.client = OpenAI(api_key=openai_api_key)
-        self.driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+# Used when no chunk of the source names the diet; the source documents describe this one
+DEFAULT_DIET_TYPE = {
+    "name": "Low FODMAP",
+    "description": "İrritabl bağırsak sendromu için düşük FODMAP eliminasyon diyeti"
+}
 
-    def parse_fodmap_data(self, file_path: str) -> dict:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
+# UNWIND queries used by the bulk loader; each one receives a batch of rows as $rows
+DIET_TYPE_BATCH_QUERY = """
+UNWIND $rows AS row
+CREATE (d:DietType {name: row.name, description: row.description})
+"""
+
+CATEGORY_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (d:DietType {name: row.diet_name})
+CREATE (fc:FODMAPCategory {name: row.name, description: row.description})
+CREATE (fc)-[:PART_OF]->(d)
+"""
+
+CATEGORY_FOOD_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (fc:FODMAPCategory {name: row.cat_name})
+MERGE (f:Food {name: row.food_name})
+SET f.name_normalized = row.food_name_normalized
+CREATE (f)-[:CONTAINS_FODMAP {amount: row.amount}]->(fc)
+"""
+
+GROUP_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (d:DietType {name: row.diet_name})
+CREATE (fg:FoodGroup {name: row.name, name_normalized: row.name_normalized})
+CREATE (fg)-[:PART_OF]->(d)
+"""
+
+FOOD_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (fg:FoodGroup {name: row.group_name})
+MATCH (d:DietType {name: row.diet_name})
+MERGE (f:Food {name: row.name})
+SET f += row.properties
+MERGE (f)-[:BELONGS_TO]->(fg)
+WITH f, d, row
+FOREACH(_ IN CASE WHEN row.should_avoid = true THEN [1] ELSE [] END |
+    MERGE (f)-[:SHOULD_AVOID]->(d)
+)
+FOREACH(_ IN CASE WHEN row.is_recommended = true THEN [1] ELSE [] END |
+    MERGE (f)-[:IS_RECOMMENDED]->(d)
+)
+"""
+
+ALTERNATIVE_NAME_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (f:Food {name: row.food_name})
+CREATE (a:AlternativeName {name: row.alt_name, name_normalized: row.alt_name_normalized})
+CREATE (a)-[:REFERS_TO]->(f)
+"""
+
+CONTENT_HASH_BATCH_QUERY = """
+UNWIND $rows AS row
+MATCH (f:Food {name: row.name})
+SET f.content_hash = row.content_hash
+"""
+
+# Upserts and deletes used by the incremental loader
+DIET_TYPE_UPSERT_QUERY = """
+UNWIND $rows AS row
+MERGE (d:DietType {name: row.name})
+SET d.description = row.description
+WITH collect(row.name) AS names
+MATCH (old:DietType) WHERE NOT old.name IN names
+DETACH DELETE old
+"""
+
+CATEGORY_UPSERT_QUERY = """
+UNWIND $rows AS row
+MATCH (d:DietType {name: row.diet_name})
+MERGE (fc:FODMAPCategory {name: row.name})
+SET fc.description = row.description
+MERGE (fc)-[:PART_OF]->(d)
+"""
 
-        system_message = """You are a precise parser that converts FODMAP diet information into structured JSON data. 
+GROUP_UPSERT_QUERY = """
+UNWIND $rows AS row
+MATCH (d:DietType {name: row.diet_name})
+MERGE (fg:FoodGroup {name: row.name})
+SET fg.name_normalized = row.name_normalized
+MERGE (fg)-[:PART_OF]->(d)
+"""
+
+# Per-group food lists (name order) with status and FODMAP level, read by the food_group template
+GROUP_FOOD_LISTS_QUERY = """
+MATCH (fg:FoodGroup)
+CALL {
+    WITH fg
+    MATCH (f:Food)-[:BELONGS_TO]->(fg)
+    WITH f ORDER BY f.name
+    RETURN collect(f.name) AS names,
+           collect(CASE WHEN EXISTS { (f)-[:SHOULD_AVOID]->() } THEN 'avoid'
+                        WHEN EXISTS { (f)-[:IS_RECOMMENDED]->() } THEN 'recommended'
+                        ELSE 'unknown' END) AS statuses,
+           collect(coalesce(f.fodmap_level, 'unknown')) AS levels
+}
+SET fg.food_names = names,
+    fg.food_statuses = statuses,
+    fg.food_levels = levels,
+    fg.food_count = size(names)
+"""
+
+# Labeled scans, each against its own name list, so a category named like a group is still removed
+STALE_CATEGORIES_QUERY = """
+MATCH (c:FODMAPCategory) WHERE NOT c.name IN $names
+DETACH DELETE c
+"""
+
+STALE_GROUPS_QUERY = """
+MATCH (fg:FoodGroup) WHERE NOT fg.name IN $names
+DETACH DELETE fg
+"""
+
+REMOVE_FOODS_QUERY = """
+UNWIND $rows AS name
+MATCH (f:Food {name: name})
+OPTIONAL MATCH (a:AlternativeName)-[:REFERS_TO]->(f)
+DETACH DELETE a, f
+"""
+
+RESET_FOODS_QUERY = """
+UNWIND $rows AS name
+MATCH (f:Food {name: name})
+OPTIONAL MATCH (a:AlternativeName)-[:REFERS_TO]->(f)
+DETACH DELETE a
+WITH DISTINCT f
+OPTIONAL MATCH (f)-[r]->()
+DELETE r
+WITH DISTINCT f
+SET f = {name: f.name}
+"""
+
+PARSE_SYSTEM_MESSAGE = """You are a precise parser that converts FODMAP diet information into structured JSON data. 
         Pay special attention to clearly identifying which foods should be avoided and which are recommended."""
 
-        user_message = f"""Parse the following FODMAP diet information into a structured JSON object.
+PARSE_USER_TEMPLATE = """Parse the following FODMAP diet information into a structured JSON object.
         For each food, explicitly specify both whether it should be avoided AND whether it is recommended.
         Some foods might be neither recommended nor avoided (neutral).
 
@@ -49,25 +189,310 @@ class FODMAPParser:
 
         Return only the JSON object, no additional text or explanations."""
 
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message}
+FODMAP_LEVEL_RANK = {"low": 0, "moderate": 1, "high": 2}
+
+
+def split_source_sections(content: str, max_chunk_chars: int = 12000) -> List[str]:
+    """Split source text on blank-line section boundaries into chunks of at most max_chunk_chars"""
+    sections = [section.strip() for section in re.split(r"\n\s*\n", content) if section.strip()]
+
+    pieces = []
+    for section in sections:
+        if len(section) <= max_chunk_chars:
+            pieces.append(section)
+            continue
+        # Oversized sections fall back to line boundaries
+        current = ""
+        for line in section.splitlines():
+            if current and len(current) + len(line) + 1 > max_chunk_chars:
+                pieces.append(current)
+                current = ""
+            current = f"{current}\n{line}" if current else line
+        if current:
+            pieces.append(current)
+
+    chunks = []
+    current = []
+    current_size = 0
+    for piece in pieces:
+        if current and current_size + len(piece) + 2 > max_chunk_chars:
+            # Keep a trailing heading together with the section it introduces
+            carried = []
+            if len(current) > 1 and "\n" not in current[-1] and len(current[-1]) < 100:
+                carried = [current.pop()]
+            chunks.append("\n\n".join(current))
+            current = carried
+            current_size = sum(len(item) + 2 for item in current)
+        current.append(piece)
+        current_size += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+
+    return chunks or [content]
+
+
+def _merge_food(existing: dict, food: dict):
+    """Merge a duplicate food entry into the first one seen"""
+    if "should_avoid" in existing or "should_avoid" in food:
+        # Conflicting chunks are resolved conservatively: any "avoid" wins
+        should_avoid = bool(existing.get("should_avoid")) or bool(food.get("should_avoid"))
+        existing["should_avoid"] = should_avoid
+        existing["is_recommended"] = not should_avoid and (
+            bool(existing.get("is_recommended")) or bool(food.get("is_recommended"))
+        )
+
+    levels = [level for level in (existing.get("fodmap_level"), food.get("fodmap_level")) if level]
+    if levels:
+        existing["fodmap_level"] = max(levels, key=lambda level: FODMAP_LEVEL_RANK.get(level, -1))
+
+    for key in ("serving_info", "amount"):
+        if not existing.get(key) and food.get(key):
+            existing[key] = food[key]
+
+    alternative_names = list(existing.get("alternative_names", []))
+    for alt_name in food.get("alternative_names", []):
+        if alt_name not in alternative_names:
+            alternative_names.append(alt_name)
+    if alternative_names:
+        existing["alternative_names"] = alternative_names
+
+
+def ensure_diet_type(data: dict) -> dict:
+    """Fill in DEFAULT_DIET_TYPE when the parse named no diet, so the loaders always have one"""
+    diet_type = data.get("diet_type") or {}
+    if not diet_type.get("name"):
+        print(f"⚠️ No diet type in the parsed data; using \"{DEFAULT_DIET_TYPE['name']}\"")
+        data["diet_type"] = dict(DEFAULT_DIET_TYPE)
+    else:
+        data["diet_type"] = {"description": None, **diet_type}
+    return data
+
+
+def merge_parsed_chunks(parts: List[dict]) -> dict:
+    """Combine per-chunk parse results into one document, de-duplicating groups, categories and foods"""
+    merged = {"diet_type": None, "standard_food_groups": [], "fodmap_categories": []}
+    sections = {"standard_food_groups": {}, "fodmap_categories": {}}
+
+    for part in parts:
+        if merged["diet_type"] is None and (part.get("diet_type") or {}).get("name"):
+            merged["diet_type"] = dict(part["diet_type"])
+
+        for key, index in sections.items():
+            for entry in part.get(key, []):
+                target = index.get(entry["name"])
+                if target is None:
+                    target = {k: v for k, v in entry.items() if k != "foods"}
+                    target["foods"] = []
+                    target["_foods"] = {}
+                    index[entry["name"]] = target
+                    merged[key].append(target)
+                elif not target.get("description") and entry.get("description"):
+                    target["description"] = entry["description"]
+
+                for food in entry.get("foods", []):
+                    food_key = normalize_name(food["name"])
+                    if food_key in target["_foods"]:
+                        _merge_food(target["_foods"][food_key], food)
+                    else:
+                        food = dict(food)
+                        target["_foods"][food_key] = food
+                        target["foods"].append(food)
+
+    for key in sections:
+        for entry in merged[key]:
+            del entry["_foods"]
+    return ensure_diet_type(merged)
+
+
+def flatten_fodmap_data(data: dict) -> Dict[str, List[Dict]]:
+    """Turn parsed FODMAP JSON into flat node/relationship rows for batched ingest"""
+    diet_name = data["diet_type"]["name"]
+    rows = {
+        "diet_types": [{"name": diet_name, "description": data["diet_type"].get("description")}],
+        "categories": [],
+        "category_foods": [],
+        "groups": [],
+        "foods": [],
+        "alternative_names": []
+    }
+
+    for category in data["fodmap_categories"]:
+        rows["categories"].append({
+            "diet_name": diet_name,
+            "name": category["name"],
+            "description": category["description"]
+        })
+        for food in category["foods"]:
+            rows["category_foods"].append({
+                "cat_name": category["name"],
+                "food_name": food["name"],
+                "food_name_normalized": normalize_name(food["name"]),
+                "amount": food.get("amount", "unknown")
+            })
+
+    for group in data["standard_food_groups"]:
+        rows["groups"].append({
+            "diet_name": diet_name,
+            "name": group["name"],
+            "name_normalized": normalize_name(group["name"])
+        })
+        for food in group["foods"]:
+            properties = {
+                "name": food["name"],
+                "name_normalized": normalize_name(food["name"]),
+                "fodmap_level": food["fodmap_level"]
+            }
+            if "serving_info" in food:
+                properties["serving_info"] = food["serving_info"]
+            if "alternative_names" in food:
+                properties["alternative_names"] = food["alternative_names"]
+
+            rows["foods"].append({
+                "group_name": group["name"],
+                "diet_name": diet_name,
+                "name": food["name"],
+                "properties": properties,
+                "should_avoid": food["should_avoid"],
+                "is_recommended": food["is_recommended"]
+            })
+            for alt_name in food.get("alternative_names", []):
+                rows["alternative_names"].append({
+                    "food_name": food["name"],
+                    "alt_name": alt_name,
+                    "alt_name_normalized": normalize_name(alt_name)
+                })
+
+    return rows
+
+
+def food_content_hashes(rows: Dict[str, List[Dict]]) -> Dict[str, str]:
+    """Hash everything a Food node's properties and edges are built from, keyed by food name"""
+    foods = {}
+
+    def entry(name: str) -> Dict:
+        return foods.setdefault(name, {
+            "properties": {"name": name},
+            "diet_name": rows["diet_types"][0]["name"],
+            "groups": [],
+            "categories": [],
+            "alternative_names": [],
+            "should_avoid": False,
+            "is_recommended": False
+        })
+
+    for row in rows["category_foods"]:
+        entry(row["food_name"])["categories"].append([row["cat_name"], row["amount"]])
+    for row in rows["foods"]:
+        food = entry(row["name"])
+        food["properties"].update(row["properties"])
+        food["groups"].append(row["group_name"])
+        food["should_avoid"] = food["should_avoid"] or row["should_avoid"] is True
+        food["is_recommended"] = food["is_recommended"] or row["is_recommended"] is True
+    for row in rows["alternative_names"]:
+        entry(row["food_name"])["alternative_names"].append(row["alt_name"])
+
+    hashes = {}
+    for name, food in foods.items():
+        for key in ("groups", "categories", "alternative_names"):
+            food[key] = sorted(food[key], key=lambda item: json.dumps(item, ensure_ascii=False))
+        payload = json.dumps(food, sort_keys=True, ensure_ascii=False, default=str)
+        hashes[name] = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return hashes
+
+
+def plan_incremental_update(rows: Dict[str, List[Dict]], current_hashes: Dict[str, Optional[str]]) -> Dict:
+    """Work out which foods an incremental update adds, resets or removes, and the rows it writes.
+
+    current_hashes maps every Food name in the graph to its stored content hash (None if it has
+    none). Changed foods are reset and rebuilt from their rows, which drops stale group, category
+    and alias links; unchanged foods are not written at all.
+    """
+    new_hashes = food_content_hashes(rows)
+    added = [name for name in new_hashes if name not in current_hashes]
+    removed = [name for name in current_hashes if name not in new_hashes]
+    changed = [name for name in new_hashes
+               if name in current_hashes and current_hashes[name] != new_hashes[name]]
+    upserted = set(added) | set(changed)
+
+    stage_rows = {}
+    for stage in ("category_foods", "foods", "alternative_names"):
+        name_key = "name" if stage == "foods" else "food_name"
+        stage_rows[stage] = [row for row in rows[stage] if row[name_key] in upserted]
+
+    return {
+        "added": added,
+        "changed": changed,
+        "removed": removed,
+        "stage_rows": stage_rows,
+        "hash_rows": [{"name": name, "content_hash": new_hashes[name]}
+                      for name in new_hashes if name in upserted],
+        "category_names": [row["name"] for row in rows["categories"]],
+        "group_names": [row["name"] for row in rows["groups"]]
+    }
+
+
+class FODMAPParser:
+    def __init__(self, openai_api_key: str, neo4j_uri: str, neo4j_user: str, neo4j_password: str,
+                 model: Optional[str] = None, cache_dir: Optional[str] = ".fodmap_cache/parse"):
+        self.gateway = LLMGateway.from_env(openai_api_key)
+        # Parsing is offline work; it must not starve the chat app sharing the same rate limit
+        self.gateway.default_priority = BATCH
+        if model:
+            self.gateway.models["parse_fodmap_data"] = model
+        self.driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+        self.model = self.gateway.model_for("parse_fodmap_data")
+        self.parse_cache = ParseCache(cache_dir) if cache_dir else None
+
+    def _parse_chunk(self, content: str) -> dict:
+        """Parse one piece of source text into the FODMAP JSON schema, reusing cached results"""
+        cache_key = content_key(content, PARSE_SYSTEM_MESSAGE, PARSE_USER_TEMPLATE, self.model)
+        if self.parse_cache is not None:
+            cached = self.parse_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        response = self.gateway.chat(
+            "parse_fodmap_data",
+            [
+                {"role": "system", "content": PARSE_SYSTEM_MESSAGE},
+                {"role": "user", "content": PARSE_USER_TEMPLATE.format(content=content)}
             ],
+            timeout=300,
             temperature=0.0
         )
 
         try:
-            return json.loads(response.choices[0].message.content)
+            parsed = json.loads(response.choices[0].message.content)
         except json.JSONDecodeError as e:
             print("Error in GPT-4 response:", response.choices[0].message.content)
             raise Exception(f"Failed to parse GPT-4 response as JSON: {e}")
 
+        if self.parse_cache is not None:
+            self.parse_cache.put(cache_key, parsed)
+        return parsed
+
+    def parse_fodmap_data(self, file_path: str, max_chunk_chars: int = 12000, max_workers: int = 4) -> dict:
+        """Parse a source document chunk by chunk, concurrently, and merge the partial results"""
+        with open(file_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+
+        chunks = split_source_sections(content, max_chunk_chars)
+        if len(chunks) == 1:
+            data = ensure_diet_type(self._parse_chunk(chunks[0]))
+        else:
+            print(f"Parsing {len(chunks)} chunks with up to {max_workers} workers...")
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                parts = list(executor.map(self._parse_chunk, chunks))
+            data = merge_parsed_chunks(parts)
+
+        if self.parse_cache is not None:
+            print(f"Parse cache: {self.parse_cache.hits} hits, {self.parse_cache.misses} misses")
+        return data
+
     def create_knowledge_graph(self, data: dict):
         with self.driver.session() as session:
-            # Clear existing data
-            session.run("MATCH (n) DETACH DELETE n")
+            # Clear existing data (the version marker survives so snapshots notice the rebuild)
+            session.run("MATCH (n) WHERE NOT n:GraphMeta DETACH DELETE n")
 
             # Create diet type node
             session.run("""
@@ -91,10 +516,12 @@ class FODMAPParser:
                     session.run("""
                         MATCH (fc:FODMAPCategory {name: $cat_name})
                         MERGE (f:Food {name: $food_name})
+                        SET f.name_normalized = $food_name_normalized
                         CREATE (f)-[:CONTAINS_FODMAP {amount: $amount}]->(fc)
                     """, {
                         "cat_name": category["name"],
                         "food_name": food["name"],
+                        "food_name_normalized": normalize_name(food["name"]),
                         "amount": food.get("amount", "unknown")
                     })
 
@@ -102,17 +529,19 @@ class FODMAPParser:
             for group in data["standard_food_groups"]:
                 session.run("""
                     MATCH (d:DietType {name: $diet_name})
-                    CREATE (fg:FoodGroup {name: $group_name})
+                    CREATE (fg:FoodGroup {name: $group_name, name_normalized: $group_name_normalized})
                     CREATE (fg)-[:PART_OF]->(d)
                 """, {
                     "diet_name": data["diet_type"]["name"],
-                    "group_name": group["name"]
+                    "group_name": group["name"],
+                    "group_name_normalized": normalize_name(group["name"])
                 })
 
                 for food in group["foods"]:
                     # Create food node with properties
                     properties = {
                         "name": food["name"],
+                        "name_normalized": normalize_name(food["name"]),
                         "fodmap_level": food["fodmap_level"]
                     }
                     if "serving_info" in food:
@@ -150,19 +579,148 @@ class FODMAPParser:
                         for alt_name in food["alternative_names"]:
                             session.run("""
                                 MATCH (f:Food {name: $food_name})
-                                CREATE (a:AlternativeName {name: $alt_name})
+                                CREATE (a:AlternativeName {name: $alt_name, name_normalized: $alt_name_normalized})
                                 CREATE (a)-[:REFERS_TO]->(f)
                             """, {
                                 "food_name": food["name"],
-                                "alt_name": alt_name
+                                "alt_name": alt_name,
+                                "alt_name_normalized": normalize_name(alt_name)
                             })
 
+            session.run(GROUP_FOOD_LISTS_QUERY)
+            self._mark_graph_version(session)
+
+    def _run_batches(self, session, query: str, rows: List[Dict], batch_size: int) -> int:
+        """Send rows to an UNWIND query in batches, one explicit write transaction per batch"""
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            session.execute_write(lambda tx, batch=batch: tx.run(query, {"rows": batch}).consume())
+        return len(rows)
+
+    def bulk_load_knowledge_graph(self, data: dict, batch_size: int = 500) -> Dict[str, float]:
+        """Rebuild the graph with batched UNWIND writes; same graph shape as create_knowledge_graph"""
+        rows = flatten_fodmap_data(data)
+        stages = [
+            ("diet_types", DIET_TYPE_BATCH_QUERY),
+            ("categories", CATEGORY_BATCH_QUERY),
+            ("category_foods", CATEGORY_FOOD_BATCH_QUERY),
+            ("groups", GROUP_BATCH_QUERY),
+            ("foods", FOOD_BATCH_QUERY),
+            ("alternative_names", ALTERNATIVE_NAME_BATCH_QUERY)
+        ]
+
+        # Lookups by name inside the batches need the indexes up front
+        self.add_useful_indexes()
+
+        total_rows = 0
+        started = time.perf_counter()
+        with self.driver.session() as session:
+            session.run("""
+                MATCH (n) WHERE NOT n:GraphMeta
+                CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF $batch_size ROWS
+            """, {"batch_size": batch_size}).consume()
+
+            for stage, query in stages:
+                stage_started = time.perf_counter()
+                count = self._run_batches(session, query, rows[stage], batch_size)
+                elapsed = time.perf_counter() - stage_started
+                total_rows += count
+                print(f"  {stage}: {count} rows in {elapsed:.2f}s "
+                      f"({count / elapsed if elapsed > 0 else 0:.0f} rows/s)")
+
+            # Content hashes let later incremental updates skip unchanged foods
+            hash_rows = [{"name": name, "content_hash": content_hash}
+                         for name, content_hash in food_content_hashes(rows).items()]
+            self._run_batches(session, CONTENT_HASH_BATCH_QUERY, hash_rows, batch_size)
+
+            session.execute_write(lambda tx: tx.run(GROUP_FOOD_LISTS_QUERY).consume())
+            self._mark_graph_version(session)
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            "rows": total_rows,
+            "seconds": elapsed,
+            "rows_per_second": total_rows / elapsed if elapsed > 0 else 0.0
+        }
+        print(f"Loaded {total_rows} rows in {elapsed:.2f}s ({stats['rows_per_second']:.0f} rows/s)")
+        return stats
+
+    def _write_rows(self, tx, query: str, rows: List, batch_size: int):
+        """Send rows to an UNWIND query in batches inside an existing transaction"""
+        for start in range(0, len(rows), batch_size):
+            tx.run(query, {"rows": rows[start:start + batch_size]}).consume()
+
+    def incremental_update_knowledge_graph(self, data: dict, batch_size: int = 500) -> Dict[str, float]:
+        """Apply only the foods whose content hash changed, in one transaction readers see atomically"""
+        rows = flatten_fodmap_data(data)
+
+        started = time.perf_counter()
+        self.add_useful_indexes()
+        with self.driver.session() as session:
+            current_hashes = {
+                record["name"]: record["content_hash"]
+                for record in session.run("MATCH (f:Food) RETURN f.name as name, f.content_hash as content_hash")
+            }
+
+            plan = plan_incremental_update(rows, current_hashes)
+            added, changed, removed = plan["added"], plan["changed"], plan["removed"]
+
+            def apply_changes(tx):
+                self._write_rows(tx, DIET_TYPE_UPSERT_QUERY, rows["diet_types"], batch_size)
+                self._write_rows(tx, CATEGORY_UPSERT_QUERY, rows["categories"], batch_size)
+                self._write_rows(tx, GROUP_UPSERT_QUERY, rows["groups"], batch_size)
+                tx.run(STALE_CATEGORIES_QUERY, {"names": plan["category_names"]}).consume()
+                tx.run(STALE_GROUPS_QUERY, {"names": plan["group_names"]}).consume()
+
+                self._write_rows(tx, REMOVE_FOODS_QUERY, removed, batch_size)
+                self._write_rows(tx, RESET_FOODS_QUERY, changed, batch_size)
+
+                for stage, query in (("category_foods", CATEGORY_FOOD_BATCH_QUERY),
+                                     ("foods", FOOD_BATCH_QUERY),
+                                     ("alternative_names", ALTERNATIVE_NAME_BATCH_QUERY)):
+                    self._write_rows(tx, query, plan["stage_rows"][stage], batch_size)
+
+                self._write_rows(tx, CONTENT_HASH_BATCH_QUERY, plan["hash_rows"], batch_size)
+                tx.run(GROUP_FOOD_LISTS_QUERY).consume()
+                self._mark_graph_version(tx)
+
+            session.execute_write(apply_changes)
+
+        elapsed = time.perf_counter() - started
+        print(f"Incremental update: {len(added)} added, {len(changed)} changed, "
+              f"{len(removed)} removed in {elapsed:.2f}s")
+        return {
+            "added": len(added),
+            "changed": len(changed),
+            "removed": len(removed),
+            "seconds": elapsed
+        }
+
+    def _mark_graph_version(self, session):
+        """Bump the graph version so in-process snapshots know to reload"""
+        session.run("""
+            MERGE (m:GraphMeta {name: $meta_name})
+            SET m.version = coalesce(m.version, 0) + 1, m.updated_at = datetime()
+        """, {"meta_name": GRAPH_META_NAME})
+
     def add_useful_indexes(self):
         with self.driver.session() as session:
             session.run("CREATE INDEX food_name IF NOT EXISTS FOR (f:Food) ON (f.name)")
             session.run("CREATE INDEX food_group_name IF NOT EXISTS FOR (fg:FoodGroup) ON (fg.name)")
+            session.run("CREATE INDEX food_group_name_normalized IF NOT EXISTS "
+                        "FOR (fg:FoodGroup) ON (fg.name_normalized)")
             session.run("CREATE INDEX fodmap_category_name IF NOT EXISTS FOR (fc:FODMAPCategory) ON (fc.name)")
             session.run("CREATE INDEX alternative_name IF NOT EXISTS FOR (a:AlternativeName) ON (a.name)")
+            # Lookups go through Turkish-folded names, so these are the indexes the chatbot actually hits
+            session.run("CREATE INDEX food_name_normalized IF NOT EXISTS FOR (f:Food) ON (f.name_normalized)")
+            session.run("CREATE INDEX alternative_name_normalized IF NOT EXISTS "
+                        "FOR (a:AlternativeName) ON (a.name_normalized)")
+            session.run(f"""
+                CREATE FULLTEXT INDEX {FOOD_NAMES_FULLTEXT_INDEX} IF NOT EXISTS
+                FOR (n:Food|AlternativeName) ON EACH [n.name_normalized]
+                OPTIONS {{indexConfig: {{`fulltext.analyzer`: 'standard-no-stop-words'}}}}
+            """)
+            session.run("CALL db.awaitIndexes(300)")
 
     def verify_relationships(self):
         """Verify and print statistics about the created relationships"""
@@ -184,30 +742,53 @@ class FODMAPParser:
 
     def close(self):
         self.driver.close()
+        self.gateway.close()
 
 def main():
+    arg_parser = argparse.ArgumentParser(description="Build the FODMAP knowledge graph")
+    arg_parser.add_argument("--batch-size", type=int, default=int(os.getenv("GRAPH_BATCH_SIZE", "500")),
+                            help="rows per write transaction in bulk mode")
+    arg_parser.add_argument("--row-by-row", action="store_true",
+                            help="use the original one-statement-per-row loader")
+    arg_parser.add_argument("--incremental", action="store_true",
+                            help="apply only added, changed or removed foods instead of rebuilding")
+    arg_parser.add_argument("--chunk-chars", type=int, default=12000,
+                            help="maximum characters of source text per LLM parse call")
+    arg_parser.add_argument("--parse-workers", type=int, default=4,
+                            help="number of chunks parsed concurrently")
+    arg_parser.add_argument("--no-cache", action="store_true",
+                            help="ignore cached parse results and call the LLM for every chunk")
+    args = arg_parser.parse_args()
+
     load_dotenv()
 
     parser = FODMAPParser(
         openai_api_key=os.getenv("OPENAI_API_KEY"),
         neo4j_uri=os.getenv("NEO4J_URI", "bolt://localhost:7687"),
         neo4j_user=os.getenv("NEO4J_USER", "neo4j"),
-        neo4j_password=os.getenv("NEO4J_PASSWORD", "password")
+        neo4j_password=os.getenv("NEO4J_PASSWORD", "password"),
+        cache_dir=None if args.no_cache else os.getenv("FODMAP_PARSE_CACHE_DIR", ".fodmap_cache/parse")
     )
 
     try:
         print("Parsing FODMAP data...")
-        data = parser.parse_fodmap_data("turkish.txt")
+        data = parser.parse_fodmap_data("turkish.txt", max_chunk_chars=args.chunk_chars,
+                                        max_workers=args.parse_workers)
 
         with open("fodmap_data.json", "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
         print("Parsed data saved to fodmap_data.json")
 
         print("Creating knowledge graph...")
-        parser.create_knowledge_graph(data)
-        
-        print("Creating indexes...")
-        parser.add_useful_indexes()
+        if args.incremental:
+            parser.incremental_update_knowledge_graph(data, batch_size=args.batch_size)
+        elif args.row_by_row:
+            parser.create_knowledge_graph(data)
+            # The batched loaders create their indexes before writing; the row-by-row one does not
+            print("Creating indexes...")
+            parser.add_useful_indexes()
+        else:
+            parser.bulk_load_knowledge_graph(data, batch_size=args.batch_size)
         
         print("Verifying relationships...")
         parser.verify_relationships()
@@ -0,0 +1,144 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+import asyncio
+import os
+from .food_lookup import (FOOD_GROUP_QUERY, FOOD_NAMES_FULLTEXT_INDEX, INGREDIENT_LIMIT, INGREDIENT_QUERY,
+                          MEAL_INGREDIENTS_QUERY, fulltext_search)
+from .query_profiler import QueryProfiler
+from ..utils.text import normalize_name
+
+GRAPH_BACKENDS = ("neo4j", "sqlite")
+
+
+class GraphBackend(ABC):
+    """The retrieval operations the chatbot needs, independent of where the FODMAP graph lives.
+
+    Every lookup returns rows in the shape of the Cypher templates in food_lookup, so callers
+    do not care which backend answered.
+    """
+
+    name = "graph"
+    # True when lookups run inside this process and need no snapshot in front of them
+    in_process = False
+
+    @abstractmethod
+    def lookup_ingredient(self, term: str, limit: int = INGREDIENT_LIMIT) -> List[Dict[str, Any]]:
+        """Foods with a name or alternative name that food_lookup.words_match accepts for the term.
+
+        Exact hits come first, then name order. limit counts foods; each food returns one row per group.
+        """
+
+    @abstractmethod
+    def lookup_ingredients(self, names: List[str]) -> List[Dict[str, Any]]:
+        """Exact match on a list of food or alternative names, one food at most once"""
+
+    @abstractmethod
+    def lookup_food_groups(self, groups: List[str], limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        """A page of foods per group, with the group total"""
+
+    def _dispatch(self, query_info: Dict) -> Optional[List[Dict[str, Any]]]:
+        """Answer a generated query by its template, or None for a template the backend cannot serve"""
+        template = query_info.get("template")
+        params = query_info.get("params") or {}
+        if template == "ingredient":
+            limit = params.get("limit")
+            return self.lookup_ingredient(params["ingredient"], INGREDIENT_LIMIT if limit is None else limit)
+        if template == "food_group":
+            return self.lookup_food_groups(params["groups"], params["limit"], params.get("offset", 0))
+        if template == "meal_batch":
+            return [{
+                "dish": dish["name"],
+                "position": dish["position"],
+                "results": self.lookup_ingredients(dish["ingredients"])
+            } for dish in params["dishes"]]
+        if template == "meal_ingredients":
+            return self.lookup_ingredients(params["ingredients"])
+        return None
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reload if the underlying data changed; returns True when a reload happened"""
+        return False
+
+    def refresh_due(self) -> bool:
+        """True when refresh may have I/O to do, so async callers know to move it off the event loop"""
+        return False
+
+    def refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"{self.name} refresh failed: {str(e)}")
+
+    async def arefresh(self):
+        """refresh for the async pipeline: a due refresh runs in a worker thread, never on the event loop"""
+        if self.refresh_due():
+            await asyncio.to_thread(self.refresh_quietly)
+
+    def answer(self, query_info: Dict) -> Optional[List[Dict[str, Any]]]:
+        return self._dispatch(query_info)
+
+    async def aanswer(self, query_info: Dict) -> Optional[List[Dict[str, Any]]]:
+        """answer for the async pipeline; in-process lookups take microseconds, so they run inline"""
+        return self.answer(query_info)
+
+    def close(self):
+        pass
+
+
+class Neo4jGraphBackend(GraphBackend):
+    """Lookups as Cypher against the graph built by gptgraphbuilder, timed by the query profiler"""
+
+    name = "neo4j"
+
+    def __init__(self, driver, profiler: Optional[QueryProfiler] = None, async_driver=None):
+        self.driver = driver
+        self.async_driver = async_driver
+        self.profiler = profiler or QueryProfiler.from_env()
+
+    def _run(self, template: str, query: str, params: Dict) -> List[Dict[str, Any]]:
+        with self.driver.session() as session:
+            return self.profiler.run(session, template, query, params)
+
+    def lookup_ingredient(self, term: str, limit: int = INGREDIENT_LIMIT) -> List[Dict[str, Any]]:
+        search = fulltext_search(term)
+        if search is None:
+            return []
+        return self._run("ingredient", INGREDIENT_QUERY, {
+            "ingredient": normalize_name(term),
+            "index": FOOD_NAMES_FULLTEXT_INDEX,
+            "search": search,
+            "limit": limit
+        })
+
+    def lookup_ingredients(self, names: List[str]) -> List[Dict[str, Any]]:
+        return self._run("meal_ingredients", MEAL_INGREDIENTS_QUERY,
+                         {"ingredients": [normalize_name(name) for name in names]})
+
+    def lookup_food_groups(self, groups: List[str], limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        return self._run("food_group", FOOD_GROUP_QUERY,
+                         {"groups": [normalize_name(group) for group in groups], "offset": offset, "limit": limit})
+
+    def answer(self, query_info: Dict) -> Optional[List[Dict[str, Any]]]:
+        """Run the generated Cypher as is, so ad-hoc queries and batched meal lookups stay one round trip"""
+        if "query" not in query_info:
+            return self._dispatch(query_info)
+        return self._run(query_info.get("template", "adhoc"), query_info["query"], query_info.get("params") or {})
+
+    async def aanswer(self, query_info: Dict) -> Optional[List[Dict[str, Any]]]:
+        """answer over the async driver, so the event loop is never blocked on the database"""
+        if self.async_driver is None or "query" not in query_info:
+            return await asyncio.to_thread(self.answer, query_info)
+        async with self.async_driver.session() as session:
+            return await self.profiler.arun(session, query_info.get("template", "adhoc"), query_info["query"],
+                                            query_info.get("params") or {})
+
+
+def graph_backend_from_env(profiler: Optional[QueryProfiler] = None) -> Optional[GraphBackend]:
+    """The backend named by FODMAP_GRAPH_BACKEND, or None for the default Neo4j graph"""
+    kind = os.getenv("FODMAP_GRAPH_BACKEND", "neo4j").lower()
+    if kind not in GRAPH_BACKENDS:
+        raise ValueError(f"Unknown graph backend: {kind} (expected one of {', '.join(GRAPH_BACKENDS)})")
+    if kind == "sqlite":
+        from .sqlite_backend import SQLiteGraphBackend
+        return SQLiteGraphBackend.from_env(profiler)
+    return None
@@ -0,0 +1,256 @@
+from typing import Dict, List, Any, Optional, Tuple, NamedTuple
+import threading
+import time
+from .food_lookup import INGREDIENT_LIMIT, name_words, words_match
+from .graph_backend import GraphBackend
+from ..utils.text import normalize_name
+
+GRAPH_META_NAME = "fodmap"
+
+# Generated query templates the snapshot can answer; anything else goes to the graph backend
+SNAPSHOT_TEMPLATES = ("ingredient", "meal_ingredients", "meal_batch", "food_group")
+
+SNAPSHOT_QUERY = """
+MATCH (f:Food)
+OPTIONAL MATCH (f)-[:BELONGS_TO]->(fg:FoodGroup)
+OPTIONAL MATCH (f)-[:CONTAINS_FODMAP]->(fc:FODMAPCategory)
+OPTIONAL MATCH (a:AlternativeName)-[:REFERS_TO]->(f)
+RETURN f.name as name,
+       f.fodmap_level as fodmap_level,
+       collect(DISTINCT fg.name) as food_groups,
+       collect(DISTINCT fc.name) as fodmap_categories,
+       collect(DISTINCT a.name) as alternative_names,
+       CASE WHEN EXISTS { (f)-[:SHOULD_AVOID]->() } THEN 'avoid'
+            WHEN EXISTS { (f)-[:IS_RECOMMENDED]->() } THEN 'recommended'
+            ELSE 'unknown' END as status
+"""
+
+GRAPH_VERSION_QUERY = """
+OPTIONAL MATCH (m:GraphMeta {name: $meta_name})
+WITH m
+OPTIONAL MATCH (f:Food)
+RETURN m.version as version, count(f) as food_count
+"""
+
+
+class FoodRecord(NamedTuple):
+    name: str
+    fodmap_level: Optional[str]
+    food_groups: Tuple[str, ...]
+    fodmap_categories: Tuple[str, ...]
+    alternative_names: Tuple[str, ...]
+    status: str
+
+
+def records_from_data(data: dict) -> List[Dict[str, Any]]:
+    """Build snapshot rows straight from parsed FODMAP JSON, without a graph round trip"""
+    foods = {}
+
+    def entry(name: str) -> Dict[str, Any]:
+        return foods.setdefault(name, {
+            "name": name,
+            "fodmap_level": None,
+            "food_groups": [],
+            "fodmap_categories": [],
+            "alternative_names": [],
+            "status": "unknown"
+        })
+
+    for category in data.get("fodmap_categories", []):
+        for food in category.get("foods", []):
+            record = entry(food["name"])
+            if category["name"] not in record["fodmap_categories"]:
+                record["fodmap_categories"].append(category["name"])
+
+    for group in data.get("standard_food_groups", []):
+        for food in group.get("foods", []):
+            record = entry(food["name"])
+            record["fodmap_level"] = food.get("fodmap_level")
+            if group["name"] not in record["food_groups"]:
+                record["food_groups"].append(group["name"])
+            for alt_name in food.get("alternative_names", []):
+                if alt_name not in record["alternative_names"]:
+                    record["alternative_names"].append(alt_name)
+            if food.get("should_avoid") is True or record["status"] == "avoid":
+                record["status"] = "avoid"
+            elif food.get("is_recommended") is True:
+                record["status"] = "recommended"
+
+    return list(foods.values())
+
+
+class FODMAPKnowledgeSnapshot(GraphBackend):
+    """Read-side, in-process copy of the Food graph used to answer lookups without Neo4j"""
+
+    name = "snapshot"
+    in_process = True
+
+    def __init__(self, driver, refresh_interval: float = 60.0):
+        self.driver = driver
+        self.refresh_interval = refresh_interval
+        self.version = None
+        self._foods: Dict[str, FoodRecord] = {}
+        self._aliases: Dict[str, str] = {}
+        self._groups: Dict[str, Tuple[str, List[FoodRecord]]] = {}
+        # (normalized name, its words, food key) for every canonical and alternative name
+        self._names: List[Tuple[str, List[str], str]] = []
+        # Monotonic time of the last version check, successful or not; None before the first one
+        self._last_check: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.version is not None
+
+    def _graph_version(self) -> tuple:
+        with self.driver.session() as session:
+            record = session.run(GRAPH_VERSION_QUERY, {"meta_name": GRAPH_META_NAME}).single()
+        return (record["version"], record["food_count"])
+
+    def load_records(self, records: List[Dict[str, Any]], version=None):
+        """Build the lookup index from snapshot rows and swap it in atomically"""
+        foods = {}
+        aliases = {}
+        for record in records:
+            food = FoodRecord(
+                name=record["name"],
+                fodmap_level=record.get("fodmap_level"),
+                food_groups=tuple(record.get("food_groups") or ()),
+                fodmap_categories=tuple(record.get("fodmap_categories") or ()),
+                alternative_names=tuple(record.get("alternative_names") or ()),
+                status=record.get("status", "unknown")
+            )
+            key = normalize_name(food.name)
+            foods[key] = food
+            for alt_name in food.alternative_names:
+                aliases.setdefault(normalize_name(alt_name), key)
+
+        groups = {}
+        for food in sorted(foods.values(), key=lambda food: food.name):
+            for group in food.food_groups:
+                groups.setdefault(normalize_name(group), (group, []))[1].append(food)
+
+        # Canonical names win over an alias spelled the same way
+        self._aliases = {alias: key for alias, key in aliases.items() if alias not in foods}
+        self._groups = groups
+        self._names = [(normalize_name(name), name_words(name), key)
+                       for key, food in foods.items() for name in (food.name,) + food.alternative_names]
+        self._foods = foods
+        self.version = version if version is not None else ("static", len(foods))
+        self._last_check = time.monotonic()
+
+    def _checked_recently(self, now: float) -> bool:
+        return self._last_check is not None and now - self._last_check < self.refresh_interval
+
+    def refresh_due(self) -> bool:
+        return self.driver is not None and not self._checked_recently(time.monotonic())
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reload the snapshot if the graph changed; returns True when a reload happened"""
+        if self.driver is None:
+            return False
+
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_recently(now):
+                return False
+
+            # Count the attempt before querying, so an unreachable graph is retried once per
+            # interval instead of stalling every request until the acquisition timeout
+            self._last_check = now
+            version = self._graph_version()
+            if not force and version == self.version:
+                return False
+
+            with self.driver.session() as session:
+                records = [dict(record) for record in session.run(SNAPSHOT_QUERY)]
+            self.load_records(records, version)
+            print(f"Loaded FODMAP snapshot with {len(self._foods)} foods (version {version})")
+            return True
+
+    def vocabulary(self) -> Tuple[List[str], Dict[str, str], List[str]]:
+        """Food names, alternative name -> food name, and food group names in the snapshot"""
+        foods = self._foods
+        alternative_names = {}
+        groups = set()
+        for food in foods.values():
+            for alt_name in food.alternative_names:
+                alternative_names.setdefault(alt_name, food.name)
+            groups.update(food.food_groups)
+        return [food.name for food in foods.values()], alternative_names, sorted(groups)
+
+    def _rows(self, food: FoodRecord) -> List[Dict[str, Any]]:
+        """Mirror the row shape returned by the ingredient Cypher queries"""
+        groups = food.food_groups or (None,)
+        return [{
+            "ingredient": food.name,
+            "food_group": group,
+            "fodmap_categories": list(food.fodmap_categories),
+            "status": food.status
+        } for group in groups]
+
+    def lookup_ingredient(self, term: str, limit: int = INGREDIENT_LIMIT) -> List[Dict[str, Any]]:
+        """Word-prefix match on food and alternative names, aliases resolved to their food"""
+        term = normalize_name(term)
+        term_words = name_words(term)
+        foods, names = self._foods, self._names
+        exact: Dict[str, bool] = {}
+        for name, words, key in names:
+            # key in foods guards against a reload swapping the two between these reads
+            if key in foods and words_match(term_words, words):
+                exact[key] = exact.get(key, False) or name == term
+        matched = sorted(exact, key=lambda key: (not exact[key], foods[key].name))
+
+        results = []
+        for key in matched[:limit]:
+            results.extend(self._rows(foods[key]))
+        return results
+
+    def lookup_ingredients(self, names: List[str]) -> List[Dict[str, Any]]:
+        """Exact match on a list of food or alternative names"""
+        foods, aliases = self._foods, self._aliases
+        results = []
+        seen = set()
+        for name in names:
+            key = normalize_name(name)
+            food = foods.get(key) or foods.get(aliases.get(key, ""))
+            if food is not None and food.name not in seen:
+                seen.add(food.name)
+                results.extend(self._rows(food))
+        return results
+
+    def lookup_food_groups(self, groups: List[str], limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        """Group rows shaped like the food_group template: a page of foods plus the total"""
+        results = []
+        for group in groups:
+            entry = self._groups.get(normalize_name(group))
+            if entry is None:
+                continue
+            name, foods = entry
+            results.append({
+                "group": name,
+                "foods": [{"name": food.name, "status": food.status, "fodmap_level": food.fodmap_level or "unknown"}
+                          for food in foods[offset:offset + limit]],
+                "total": len(foods)
+            })
+        return results
+
+    def answer(self, query_info: Dict) -> Optional[List[Dict[str, Any]]]:
+        """Answer a generated query from memory, or return None to fall back to the graph backend"""
+        if query_info.get("template") not in SNAPSHOT_TEMPLATES:
+            return None
+
+        self.refresh_quietly()
+        if not self.loaded:
+            return None
+        return self._dispatch(query_info)
+
+    async def aanswer(self, query_info: Dict) -> Optional[List[Dict[str, Any]]]:
+        """answer for the async pipeline; a due refresh queries Neo4j, so it runs off the event loop"""
+        if query_info.get("template") not in SNAPSHOT_TEMPLATES:
+            return None
+
+        await self.arefresh()
+        if not self.loaded:
+            return None
+        return self._dispatch(query_info)
@@ -0,0 +1,296 @@
+from typing import Dict, List, Optional, Tuple, Iterable
+import argparse
+import json
+import os
+import re
+import threading
+from .knowledge_snapshot import FODMAPKnowledgeSnapshot, records_from_data
+from ..utils.constants import KNOWN_DISHES, FOOD_GROUP_ALIASES
+from ..utils.resources import on_event_loop
+from ..utils.text import normalize_name, turkish_stem_candidates
+
+GENERAL_PATTERNS = ("fodmap nedir", "fodmap ne demek", "fodmap diyeti nedir", "nedir", "ne demek", "açıkla")
+
+MAX_PHRASE_WORDS = 4
+
+# Question particles, connectives and diet words that carry no food of their own
+FILLER_WORDS = {
+    "mi", "mı", "mu", "mü", "miyim", "mıyım", "muyum", "müyüm", "misin", "mısın", "musun", "müsün",
+    "miyiz", "mıyız", "midir", "mıdır", "mudur", "müdür", "ne", "neler", "nedir", "hangi", "hangisi",
+    "hangileri", "nasıl", "neden", "kaç", "kadar", "ve", "ile", "veya", "ya", "yada", "da", "de", "ki",
+    "bir", "bu", "şu", "o", "ben", "benim", "için", "gibi", "çok", "az", "biraz", "fazla", "daha", "en",
+    "var", "yok", "uygun", "güvenli", "sağlıklı", "zararlı", "sakıncalı", "sorun", "sorunlu", "olur",
+    "olarak", "acaba", "fodmap", "düşük", "yüksek", "diyet", "diyeti", "diyetinde", "diyette", "açısından",
+    "ibs", "yerine", "tane", "porsiyon", "miktar", "miktarda", "her", "gün", "günde", "tamam", "evet", "hayır"
+}
+
+# Stems of the verbs people ask with (yiyebilir miyim, içebilir miyim, kullanabilir miyim, ...)
+VERB_PREFIXES = ("yiy", "yey", "yem", "yen", "iç", "kullan", "tüket", "yap", "iste", "isti", "pişir", "ekle", "koy",
+                 "al", "ver", "öner", "bil", "söyle")
+
+# Confidence when the query names something the vocabulary does not know
+UNKNOWN_HEAD_CONFIDENCE = 0.5
+UNKNOWN_WORD_CONFIDENCE = 0.7
+
+
+def is_filler(word: str) -> bool:
+    """True for words that cannot name a food: particles, connectives and question verbs"""
+    return word in FILLER_WORDS or word.startswith(VERB_PREFIXES)
+
+
+class LocalQueryClassifier:
+    """Rule-based fast path for classify_query built from the graph's food, alias and group names"""
+
+    def __init__(self, snapshot: Optional[FODMAPKnowledgeSnapshot] = None,
+                 dish_names: Iterable[str] = KNOWN_DISHES, min_confidence: float = 0.8):
+        self.snapshot = snapshot
+        self.dish_names = list(dish_names)
+        self.min_confidence = min_confidence
+        self._vocabulary: Dict[str, Tuple[str, str]] = {}
+        self._built_version = None
+        # add_dish_names runs on catalog worker threads while requests call _sync on others
+        self._lock = threading.RLock()
+        self.build([], {}, [])
+
+    @classmethod
+    def from_data(cls, data: dict, **kwargs) -> "LocalQueryClassifier":
+        """Build from parsed FODMAP JSON (e.g. fodmap_data.json) without a graph connection"""
+        snapshot = FODMAPKnowledgeSnapshot(None)
+        snapshot.load_records(records_from_data(data))
+        return cls(snapshot, **kwargs)
+
+    def build(self, food_names: List[str], alternative_names: Dict[str, str], group_names: List[str]):
+        """Index every known surface form as (query_type, canonical item).
+
+        Groups and foods are added before dishes, so a dish name never shadows a food or group.
+        """
+        vocabulary = {}
+
+        def add(surface: str, query_type: str, item: str):
+            key = normalize_name(surface)
+            if not key:
+                return
+            vocabulary.setdefault(key, (query_type, item))
+            if " " in key:
+                vocabulary.setdefault(key.replace(" ", ""), (query_type, item))
+
+        for alias, group in FOOD_GROUP_ALIASES.items():
+            add(alias, "food_group", group)
+        for group in group_names:
+            add(group, "food_group", group)
+        for food in food_names:
+            add(food, "ingredient", normalize_name(food))
+        for alt_name, food in alternative_names.items():
+            add(alt_name, "ingredient", normalize_name(food))
+        for dish in self.dish_names:
+            add(dish, "meal", normalize_name(dish))
+
+        self._vocabulary = vocabulary
+
+    def add_dish_names(self, dish_names: Iterable[str]):
+        """Recognise more dishes (e.g. from the dish catalog) as meal queries.
+
+        Names the vocabulary already knows as a food or group are skipped, so an LLM that labels an
+        ingredient as a meal cannot turn later questions about it into meal decompositions.
+        """
+        with self._lock:
+            self._sync_vocabulary()
+            known = {normalize_name(dish) for dish in self.dish_names}
+            added = []
+            for dish in dish_names:
+                key = normalize_name(dish)
+                match = self._vocabulary.get(key) or self._vocabulary.get(key.replace(" ", ""))
+                if key and key not in known and (match is None or match[0] == "meal"):
+                    known.add(key)
+                    added.append(dish)
+            if not added:
+                return
+            self.dish_names.extend(added)
+            if self.snapshot is not None and self.snapshot.loaded:
+                self._built_version = None
+            else:
+                self.build([], {}, [])
+
+    def _sync(self):
+        """Rebuild the vocabulary whenever the backing snapshot reloads"""
+        if self.snapshot is None:
+            return
+        # On the event loop the pipeline refreshes through arefresh first; blocking here would stall every request
+        if not on_event_loop():
+            self.snapshot.refresh_quietly()
+        with self._lock:
+            self._sync_vocabulary()
+
+    def _sync_vocabulary(self):
+        """Rebuild from an already refreshed snapshot; call with the lock held"""
+        if self.snapshot is not None and self.snapshot.loaded and self.snapshot.version != self._built_version:
+            self.build(*self.snapshot.vocabulary())
+            self._built_version = self.snapshot.version
+
+    def _match_phrase(self, words: List[str]) -> Optional[Tuple[str, str, bool]]:
+        """Look up a phrase, stripping suffixes from its last word; returns (type, item, exact)"""
+        prefix = words[:-1]
+        for index, last in enumerate(turkish_stem_candidates(words[-1])):
+            phrase_words = prefix + [last]
+            for key in (" ".join(phrase_words), "".join(phrase_words)):
+                match = self._vocabulary.get(key)
+                if match is not None:
+                    return match[0], match[1], index == 0
+        return None
+
+    def _find_matches(self, text: str) -> List[Tuple[int, Tuple[str, str, bool]]]:
+        """Known phrases in normalized text, longest first and without overlaps, in query order"""
+        return [(start, match) for start, _, match in self._scan(re.findall(r"[^\W\d_]+", text))]
+
+    def _scan(self, words: List[str]) -> List[Tuple[int, int, Tuple[str, str, bool]]]:
+        """(start, length, match) for every known phrase in words, longest first and without overlaps"""
+        matches = []
+        used = [False] * len(words)
+        for length in range(min(MAX_PHRASE_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - length + 1):
+                if any(used[start:start + length]):
+                    continue
+                match = self._match_phrase(words[start:start + length])
+                if match is not None:
+                    matches.append((start, length, match))
+                    for position in range(start, start + length):
+                        used[position] = True
+        matches.sort()
+        return matches
+
+    def candidate_foods(self, user_query: str) -> List[str]:
+        """Canonical names of the foods the query mentions, in order, whatever the query turns out to be"""
+        self._sync()
+        foods = []
+        for _, (match_type, item, _) in self._find_matches(normalize_name(user_query)):
+            if match_type == "ingredient" and item not in foods:
+                foods.append(item)
+        return foods
+
+    def predict(self, user_query: str) -> Optional[Dict]:
+        """Best local guess with a confidence score, or None if nothing was recognised"""
+        self._sync()
+        text = normalize_name(user_query)
+        words = re.findall(r"[^\W\d_]+", text)
+        spans = self._scan(words)
+        matches = [(start, match) for start, _, match in spans]
+
+        if not matches:
+            if "fodmap" in text and any(pattern in text for pattern in GENERAL_PATTERNS):
+                return {
+                    "query_type": "general",
+                    "identified_items": [],
+                    "requires_ingredient_breakdown": False,
+                    "confidence": 0.85,
+                    "source": "local"
+                }
+            return None
+
+        query_types = {query_type for _, (query_type, _, _) in matches}
+        query_type = "meal" if "meal" in query_types else sorted(query_types)[0]
+
+        items = []
+        for _, (match_type, item, _) in matches:
+            if match_type == query_type and item not in items:
+                items.append(item)
+
+        if len(query_types) > 1:
+            confidence = 0.6
+        elif all(exact for _, (_, _, exact) in matches):
+            confidence = 0.95
+        else:
+            confidence = 0.85
+        confidence = min(confidence, self._coverage_confidence(words, spans))
+
+        return {
+            "query_type": query_type,
+            "identified_items": items,
+            "requires_ingredient_breakdown": query_type == "meal",
+            "confidence": confidence,
+            "source": "local"
+        }
+
+    @staticmethod
+    def _coverage_confidence(words: List[str], spans: List[Tuple[int, int, Tuple[str, str, bool]]]) -> float:
+        """Cap on the confidence from the words no match covers.
+
+        An unknown word right after a match is usually the head of a compound or possessive
+        ("sebze çorbası", "soğan tozu"), so the match is only a modifier and the query is about
+        something else. Any other unknown word (the "reçel" in "bal mı reçel mi") is a food
+        the vocabulary lacks.
+        """
+        covered = [False] * len(words)
+        match_ends = set()
+        for start, length, _ in spans:
+            match_ends.add(start + length)
+            for position in range(start, start + length):
+                covered[position] = True
+
+        confidence = 1.0
+        for position, word in enumerate(words):
+            if covered[position] or is_filler(word):
+                continue
+            if position in match_ends:
+                return UNKNOWN_HEAD_CONFIDENCE
+            confidence = UNKNOWN_WORD_CONFIDENCE
+        return confidence
+
+    def classify(self, user_query: str) -> Optional[Dict]:
+        """Local classification when confident enough, otherwise None so the caller asks the LLM"""
+        prediction = self.predict(user_query)
+        if prediction is None or prediction["confidence"] < self.min_confidence:
+            return None
+        return prediction
+
+    def agreement_report(self, test_cases: List[Dict]) -> Dict:
+        """Compare confident local classifications against expected_classification"""
+        details = []
+        for test_case in test_cases:
+            prediction = self.classify(test_case["query"])
+            details.append({
+                "query": test_case["query"],
+                "expected_type": test_case["expected_classification"],
+                "local_type": prediction["query_type"] if prediction else None,
+                "identified_items": prediction["identified_items"] if prediction else []
+            })
+
+        covered = [detail for detail in details if detail["local_type"] is not None]
+        agreed = [detail for detail in covered if detail["local_type"] == detail["expected_type"]]
+        return {
+            "cases": len(details),
+            "covered": len(covered),
+            "coverage": len(covered) / len(details) if details else 0.0,
+            "agreement_rate": len(agreed) / len(covered) if covered else 0.0,
+            "details": details
+        }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Report local classifier agreement with the test cases")
+    arg_parser.add_argument("--data", default="fodmap_data.json", help="parsed FODMAP data for the vocabulary")
+    arg_parser.add_argument("--test-cases", default="tests/test_cases.json")
+    args = arg_parser.parse_args()
+
+    if os.path.exists(args.data):
+        with open(args.data, "r", encoding="utf-8") as f:
+            classifier = LocalQueryClassifier.from_data(json.load(f))
+    else:
+        print(f"{args.data} not found; using only the dish and food group catalog")
+        classifier = LocalQueryClassifier()
+
+    with open(args.test_cases, "r", encoding="utf-8") as f:
+        test_cases = json.load(f)["test_cases"]
+
+    report = classifier.agreement_report(test_cases)
+    for detail in report["details"]:
+        marker = "-" if detail["local_type"] is None else (
+            "✅" if detail["local_type"] == detail["expected_type"] else "❌"
+        )
+        print(f"{marker} {detail['query']} -> {detail['local_type'] or 'LLM fallback'} "
+              f"(expected {detail['expected_type']})")
+
+    print(f"\nCoverage: {report['covered']}/{report['cases']} ({report['coverage']:.0%})")
+    print(f"Agreement on covered queries: {report['agreement_rate']:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -1,85 +1,201 @@
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+import asyncio
 import json
-from openai import OpenAI
+from ..utils.resources import get_registry, run_sync
 from ..chatbot.meal_analyzer import MealAnalyzer
+from ..chatbot.dish_catalog import DishCatalog, default_dish_catalog
+from .local_classifier import LocalQueryClassifier
+from .fuzzy_matcher import FuzzyMatcher
+from .food_lookup import (FOOD_GROUP_QUERY, FOOD_NAMES_FULLTEXT_INDEX, INGREDIENT_LIMIT, INGREDIENT_QUERY,
+                          MEAL_BATCH_QUERY, fulltext_search, resolve_food_group)
+from ..utils.cache import LLMResponseCache, default_llm_cache
 from ..utils.constants import QUERY_CLASSIFICATION_PROMPT
+from ..utils.text import normalize_name
 
 class FODMAPQueryProcessor:
-    def __init__(self, openai_api_key: str):
-        self.client = OpenAI(api_key=openai_api_key)
-        self.meal_analyzer = MealAnalyzer(openai_api_key)
+    def __init__(self, openai_api_key: str, cache: Optional[LLMResponseCache] = None,
+                 local_classifier: Optional[LocalQueryClassifier] = None,
+                 fuzzy_matcher: Optional[FuzzyMatcher] = None, dish_catalog: Optional[DishCatalog] = None,
+                 max_meal_workers: int = 4, meal_timeout: float = 20.0, group_page_size: int = 50,
+                 speculative_lookups: int = 2):
+        self.gateway = get_registry().llm_gateway(openai_api_key)
+        self.cache = cache if cache is not None else default_llm_cache()
+        self.local_classifier = local_classifier
+        self.fuzzy_matcher = fuzzy_matcher
+        self.max_meal_workers = max_meal_workers
+        self.meal_timeout = meal_timeout
+        self.group_page_size = group_page_size
+        self.speculative_lookups = speculative_lookups
+        self.dish_catalog = dish_catalog if dish_catalog is not None else default_dish_catalog()
+        self.meal_analyzer = MealAnalyzer(openai_api_key, cache=self.cache, fuzzy_matcher=fuzzy_matcher,
+                                          dish_catalog=self.dish_catalog)
+        if self.local_classifier is not None and self.dish_catalog is not None:
+            # Cataloged dishes are recognised as meals without the classification call, including ones added later
+            self.local_classifier.add_dish_names(self.dish_catalog.dish_names())
+            self.dish_catalog.subscribe(self.local_classifier.add_dish_names)
+
+    def canonical_name(self, name: str) -> str:
+        """Normalized canonical food name for a typed or misspelled name, or the name itself when unsure"""
+        if self.fuzzy_matcher is not None:
+            resolved = self.fuzzy_matcher.resolve(name)
+            if resolved is not None:
+                return normalize_name(resolved)
+        return normalize_name(name)
+
+    def ingredient_query(self, ingredient: str) -> Optional[Dict]:
+        """The generated lookup for one canonical ingredient name, or None when nothing is searchable"""
+        search = fulltext_search(ingredient)
+        if search is None:
+            return None
+        return {
+            "template": "ingredient",
+            "query": INGREDIENT_QUERY,
+            "params": {
+                "ingredient": ingredient,
+                "index": FOOD_NAMES_FULLTEXT_INDEX,
+                "search": search,
+                "limit": INGREDIENT_LIMIT
+            }
+        }
+
+    def speculative_queries(self, user_query: str) -> List[Dict]:
+        """Lookups for foods the raw query names verbatim, to run while classification is still pending.
+
+        They are exactly the queries process_query generates for an ingredient question about the
+        same food, so the caller can reuse a prefetched result or discard it after classification.
+        """
+        if self.local_classifier is None or self.speculative_lookups <= 0:
+            return []
+        queries = []
+        for food in self.local_classifier.candidate_foods(user_query)[:self.speculative_lookups]:
+            query_info = self.ingredient_query(self.canonical_name(food))
+            if query_info is not None:
+                queries.append(query_info)
+        return queries
 
     def classify_query(self, user_query: str) -> Dict:
+        return run_sync(self.aclassify_query(user_query))
+
+    async def arefresh_vocabulary(self):
+        """Bring the classifier's and matcher's vocabulary up to date without blocking the event loop"""
+        sources = []
+        for component in (self.local_classifier, self.fuzzy_matcher):
+            source = getattr(component, "snapshot", None)
+            if source is not None and source not in sources:
+                sources.append(source)
+        for source in sources:
+            await source.arefresh()
+
+    async def aclassify_query(self, user_query: str) -> Dict:
+        await self.arefresh_vocabulary()
+        # Recognisable queries are classified locally; the LLM only sees low-confidence ones
+        if self.local_classifier is not None:
+            classification = self.local_classifier.classify(user_query)
+            if classification is not None:
+                return classification
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(
+                "classify_query", QUERY_CLASSIFICATION_PROMPT, self.gateway.model_for("classify_query"), user_query
+            )
+            cached = await asyncio.to_thread(self.cache.get, "classify_query", cache_key)
+            if cached is not None:
+                return cached
+
         messages = [
             {"role": "system", "content": QUERY_CLASSIFICATION_PROMPT},
             {"role": "user", "content": f'Classify this query: "{user_query}"'}
         ]
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
+            response = await self.gateway.achat(
+                "classify_query",
+                messages,
                 temperature=0.1,
                 max_tokens=500
             )
             
-            return json.loads(response.choices[0].message.content)
+            classification = json.loads(response.choices[0].message.content)
+            if cache_key is not None:
+                await asyncio.to_thread(self.cache.put, "classify_query", cache_key, classification)
+            return classification
             
         except Exception as e:
+            print(f"⚠️ classify_query failed, falling back to ingredient search: {str(e)}")
             return {
                 "query_type": "ingredient",  # Default to ingredient search
                 "identified_items": [user_query.lower()],
                 "error": str(e)
             }
 
+    def analyze_meals(self, meals: List[str]) -> List[Dict]:
+        return run_sync(self.aanalyze_meals(meals))
+
+    async def aanalyze_meals(self, meals: List[str]) -> List[Dict]:
+        """Decompose dishes concurrently, in input order; a failed or timed-out dish gets no ingredients"""
+        # At most max_meal_workers decompositions at once; a queued dish's timeout starts when it runs
+        slots = asyncio.Semaphore(self.max_meal_workers)
+
+        async def analyze(meal: str) -> Dict:
+            async with slots:
+                try:
+                    return await asyncio.wait_for(self.meal_analyzer.aanalyze_meal(meal, self.meal_timeout),
+                                                  self.meal_timeout)
+                except asyncio.TimeoutError:
+                    return {"error": "timed out", "dish_name": meal, "ingredients": []}
+                except Exception as e:
+                    return {"error": str(e), "dish_name": meal, "ingredients": []}
+
+        return list(await asyncio.gather(*(analyze(meal) for meal in meals)))
+
     def process_query(self, user_query: str) -> Tuple[List[Dict], Dict]:
-        classification = self.classify_query(user_query)
+        return run_sync(self.aprocess_query(user_query))
+
+    async def aprocess_query(self, user_query: str) -> Tuple[List[Dict], Dict]:
+        classification = await self.aclassify_query(user_query)
         queries = []
         
         if classification["query_type"] == "meal":
-            meal_analyses = []
-            for meal in classification["identified_items"]:
-                meal_analysis = self.meal_analyzer.analyze_meal(meal)
-                meal_analyses.append(meal_analysis)
-                
-                if meal_analysis["ingredients"]:
-                    queries.append({
-                        "query": """
-                        MATCH (f:Food)
-                        WHERE toLower(f.name) IN $ingredients
-                        OPTIONAL MATCH (f)-[:BELONGS_TO]->(fg:FoodGroup)
-                        OPTIONAL MATCH (f)-[:CONTAINS_FODMAP]->(fc:FODMAPCategory)
-                        RETURN f.name as ingredient,
-                               fg.name as food_group,
-                               collect(DISTINCT fc.name) as fodmap_categories,
-                               CASE WHEN exists((f)-[:SHOULD_AVOID]->()) THEN 'avoid'
-                                    WHEN exists((f)-[:IS_RECOMMENDED]->()) THEN 'recommended'
-                                    ELSE 'unknown' END as status
-                        """,
-                        "params": {
-                            "ingredients": [ing["name"].lower() for ing in meal_analysis["ingredients"]]
-                        }
-                    })
+            meal_analyses = await self.aanalyze_meals(classification["identified_items"])
+            dishes = [
+                {
+                    "name": meal_analysis.get("dish_name") or meal,
+                    "position": position,
+                    "ingredients": [self.canonical_name(ing["name"]) for ing in meal_analysis["ingredients"]]
+                }
+                for position, (meal, meal_analysis) in enumerate(zip(classification["identified_items"], meal_analyses))
+                if meal_analysis["ingredients"]
+            ]
+            if dishes:
+                queries.append({
+                    "template": "meal_batch",
+                    "query": MEAL_BATCH_QUERY,
+                    "params": {"dishes": dishes}
+                })
             
             classification["meal_analyses"] = meal_analyses
             
         elif classification["query_type"] == "ingredient":
-            queries.append({
-                "query": """
-                MATCH (f:Food)
-                WHERE toLower(f.name) CONTAINS $ingredient
-                OPTIONAL MATCH (f)-[:BELONGS_TO]->(fg:FoodGroup)
-                OPTIONAL MATCH (f)-[:CONTAINS_FODMAP]->(fc:FODMAPCategory)
-                RETURN f.name as ingredient,
-                       fg.name as food_group,
-                       collect(DISTINCT fc.name) as fodmap_categories,
-                       CASE WHEN exists((f)-[:SHOULD_AVOID]->()) THEN 'avoid'
-                            WHEN exists((f)-[:IS_RECOMMENDED]->()) THEN 'recommended'
-                            ELSE 'unknown' END as status
-                """,
-                "params": {
-                    "ingredient": classification["identified_items"][0].lower()
-                }
-            })
+            item = classification["identified_items"][0]
+            query_info = self.ingredient_query(self.canonical_name(item))
+            if query_info is not None:
+                queries.append(query_info)
+            suggestions = self.fuzzy_matcher.suggest(item) if self.fuzzy_matcher is not None else []
+            if suggestions:
+                classification["did_you_mean"] = {"name": item, "candidates": suggestions}
+            
+        elif classification["query_type"] == "food_group":
+            groups = []
+            for item in classification["identified_items"]:
+                group = normalize_name(resolve_food_group(item))
+                if group not in groups:
+                    groups.append(group)
+            if groups:
+                queries.append({
+                    "template": "food_group",
+                    "query": FOOD_GROUP_QUERY,
+                    "params": {"groups": groups, "offset": 0, "limit": self.group_page_size}
+                })
             
         return queries, classification
\ No newline at end of file
@@ -0,0 +1,302 @@
+from typing import Any, Dict, List, Optional
+import argparse
+import json
+import os
+import threading
+import time
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+# Plan operators that touch every node of a label (or the whole store) instead of using an index
+SCAN_OPERATORS = ("AllNodesScan", "NodeByLabelScan", "DirectedRelationshipTypeScan",
+                  "UndirectedRelationshipTypeScan", "DirectedAllRelationshipsScan",
+                  "UndirectedAllRelationshipsScan")
+
+PROFILE_MODES = ("off", "explain", "profile")
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; percentiles resolve to bucket upper bounds"""
+
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value_ms: float):
+        index = 0
+        while index < len(self.bounds) and value_ms > self.bounds[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value_ms
+        self.max = max(self.max, value_ms)
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        target = p * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "bounds_ms": list(self.bounds),
+            "counts": list(self.counts),
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max
+        }
+
+
+def _operator_name(plan: Dict[str, Any]) -> str:
+    name = plan.get("operatorType") or plan.get("operator_type") or ""
+    return name.split("@")[0]
+
+
+def summarize_plan(plan: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Flatten a PROFILE/EXPLAIN plan tree into operators, total db hits and any label or store scans"""
+    if not plan:
+        return None
+
+    operators = []
+    scans = []
+    db_hits = 0
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        name = _operator_name(node)
+        args = node.get("args") or node.get("arguments") or {}
+        hits = node.get("dbHits", node.get("db_hits"))
+        operators.append({
+            "operator": name,
+            "details": args.get("Details"),
+            "rows": node.get("rows"),
+            "db_hits": hits
+        })
+        db_hits += hits or 0
+        if name in SCAN_OPERATORS:
+            scans.append(f"{name}: {args.get('Details', '')}".rstrip(": "))
+        stack.extend(reversed(node.get("children") or []))
+
+    return {
+        "operators": operators,
+        "db_hits": db_hits if any(op["db_hits"] is not None for op in operators) else None,
+        "scans": scans
+    }
+
+
+class TemplateStats:
+    def __init__(self):
+        self.executions = 0
+        self.errors = 0
+        self.rows_total = 0
+        self.rows_max = 0
+        self.wall = Histogram()
+        self.consume = Histogram()
+        self.plan: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "executions": self.executions,
+            "errors": self.errors,
+            "rows_mean": self.rows_total / self.executions if self.executions else 0.0,
+            "rows_max": self.rows_max,
+            "wall": self.wall.to_dict(),
+            "consume": self.consume.to_dict(),
+            "plan": self.plan
+        }
+
+
+class QueryProfiler:
+    """Per-template timings for graph queries, with optional EXPLAIN/PROFILE plan capture.
+
+    mode "explain" plans the query without running it twice; "profile" runs the real query
+    under PROFILE and records db hits, so it costs extra work on the server. Plans are
+    captured on the first execution of each template and then every `sample_every` runs.
+    """
+
+    def __init__(self, mode: str = "off", sample_every: int = 100, slow_query_ms: float = 500.0):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.mode = mode
+        self.sample_every = sample_every
+        self.slow_query_ms = slow_query_ms
+        self._stats: Dict[str, TemplateStats] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "QueryProfiler":
+        return cls(
+            mode=os.getenv("FODMAP_QUERY_PROFILE", "off"),
+            sample_every=int(os.getenv("FODMAP_QUERY_PROFILE_SAMPLE", "100")),
+            slow_query_ms=float(os.getenv("FODMAP_SLOW_QUERY_MS", "500"))
+        )
+
+    def _template_stats(self, template: str) -> TemplateStats:
+        stats = self._stats.get(template)
+        if stats is None:
+            stats = self._stats.setdefault(template, TemplateStats())
+        return stats
+
+    def should_capture(self, template: str) -> bool:
+        if self.mode == "off":
+            return False
+        with self._lock:
+            executions = self._template_stats(template).executions
+        return executions == 0 or (self.sample_every > 0 and executions % self.sample_every == 0)
+
+    def record(self, template: str, wall_ms: float, consume_ms: float = 0.0, rows: int = 0,
+               error: bool = False, plan: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            stats = self._template_stats(template)
+            stats.executions += 1
+            if error:
+                stats.errors += 1
+            stats.rows_total += rows
+            stats.rows_max = max(stats.rows_max, rows)
+            stats.wall.add(wall_ms)
+            stats.consume.add(consume_ms)
+            if plan is not None:
+                stats.plan = plan
+
+        if wall_ms >= self.slow_query_ms:
+            print(f"Slow graph query [{template}]: {wall_ms:.0f} ms, {rows} rows")
+        if plan is not None and plan["scans"]:
+            print(f"Graph query [{template}] scans instead of using an index: {'; '.join(plan['scans'])}")
+
+    def run(self, session, template: str, query: str, params: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """Run a query on the session, recording wall time, rows and result-consumption time"""
+        capture = self.should_capture(template)
+        plan = None
+        if capture and self.mode == "explain":
+            plan = summarize_plan(session.run(f"EXPLAIN {query}", params or {}).consume().plan)
+
+        prefix = "PROFILE " if capture and self.mode == "profile" else ""
+        started = time.perf_counter()
+        try:
+            result = session.run(prefix + query, params or {})
+            first_response = time.perf_counter()
+            records = [dict(record) for record in result]
+            summary = result.consume()
+        except Exception:
+            self.record(template, (time.perf_counter() - started) * 1000, error=True)
+            raise
+        finished = time.perf_counter()
+
+        if prefix:
+            plan = summarize_plan(summary.profile)
+        self.record(template, (finished - started) * 1000, (finished - first_response) * 1000,
+                    len(records), plan=plan)
+        return records
+
+    async def arun(self, session, template: str, query: str, params: Optional[Dict] = None) -> List[Dict[str, Any]]:
+        """run for an async Neo4j session"""
+        capture = self.should_capture(template)
+        plan = None
+        if capture and self.mode == "explain":
+            explained = await session.run(f"EXPLAIN {query}", params or {})
+            plan = summarize_plan((await explained.consume()).plan)
+
+        prefix = "PROFILE " if capture and self.mode == "profile" else ""
+        started = time.perf_counter()
+        try:
+            result = await session.run(prefix + query, params or {})
+            first_response = time.perf_counter()
+            records = [dict(record) async for record in result]
+            summary = await result.consume()
+        except Exception:
+            self.record(template, (time.perf_counter() - started) * 1000, error=True)
+            raise
+        finished = time.perf_counter()
+
+        if prefix:
+            plan = summarize_plan(summary.profile)
+        self.record(template, (finished - started) * 1000, (finished - first_response) * 1000,
+                    len(records), plan=plan)
+        return records
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {template: stats.to_dict() for template, stats in self._stats.items()}
+
+    def export(self, path: str):
+        """Write the aggregated report as JSON for comparison with later runs"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"mode": self.mode, "exported_at": time.time(), "templates": self.report()},
+                      f, ensure_ascii=False, indent=2)
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any],
+                    threshold: float = 0.2) -> List[Dict[str, Any]]:
+    """Per-template p50/p95 and db-hit changes between two exported reports; flags regressions over threshold"""
+    rows = []
+    baseline_templates = baseline.get("templates", {})
+    current_templates = current.get("templates", {})
+    for template in sorted(set(baseline_templates) | set(current_templates)):
+        before = baseline_templates.get(template)
+        after = current_templates.get(template)
+        row = {"template": template, "regressions": []}
+        if before is None or after is None:
+            row["status"] = "added" if before is None else "removed"
+            rows.append(row)
+            continue
+
+        row["status"] = "compared"
+        for metric in ("p50_ms", "p95_ms"):
+            old, new = before["wall"][metric], after["wall"][metric]
+            row[f"wall_{metric}"] = (old, new)
+            if old and (new - old) / old > threshold:
+                row["regressions"].append(f"wall {metric} {old:.0f} -> {new:.0f}")
+
+        old_hits = (before.get("plan") or {}).get("db_hits")
+        new_hits = (after.get("plan") or {}).get("db_hits")
+        row["db_hits"] = (old_hits, new_hits)
+        if old_hits and new_hits is not None and (new_hits - old_hits) / old_hits > threshold:
+            row["regressions"].append(f"db hits {old_hits} -> {new_hits}")
+        if (after.get("plan") or {}).get("scans") and not (before.get("plan") or {}).get("scans"):
+            row["regressions"].append("new scan: " + "; ".join(after["plan"]["scans"]))
+        rows.append(row)
+    return rows
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Compare two exported graph query profiles")
+    arg_parser.add_argument("baseline")
+    arg_parser.add_argument("current")
+    arg_parser.add_argument("--threshold", type=float, default=0.2,
+                            help="relative increase reported as a regression")
+    args = arg_parser.parse_args()
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+
+    rows = compare_reports(baseline, current, args.threshold)
+    for row in rows:
+        if row["status"] != "compared":
+            print(f"  {row['template']}: {row['status']}")
+            continue
+        (old_p50, new_p50), (old_p95, new_p95) = row["wall_p50_ms"], row["wall_p95_ms"]
+        marker = "❌" if row["regressions"] else "✅"
+        print(f"{marker} {row['template']}: p50 {old_p50:.0f} -> {new_p50:.0f} ms, "
+              f"p95 {old_p95:.0f} -> {new_p95:.0f} ms, db hits {row['db_hits'][0]} -> {row['db_hits'][1]}")
+        for regression in row["regressions"]:
+            print(f"     {regression}")
+
+    if any(row["regressions"] for row in rows):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from .food_lookup import INGREDIENT_LIMIT, name_words
+from .graph_backend import GraphBackend
+from .knowledge_snapshot import records_from_data
+from .query_profiler import QueryProfiler
+from ..utils.text import normalize_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS foods (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_normalized TEXT NOT NULL UNIQUE,
+    fodmap_level TEXT,
+    status TEXT NOT NULL,
+    food_groups TEXT NOT NULL,
+    fodmap_categories TEXT NOT NULL
+);
+-- Every canonical and alternative name, normalized, pointing at its food
+CREATE TABLE IF NOT EXISTS food_names (
+    name_normalized TEXT NOT NULL,
+    food_id INTEGER NOT NULL REFERENCES foods(id),
+    name TEXT NOT NULL,
+    canonical INTEGER NOT NULL,
+    PRIMARY KEY (name_normalized, food_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS food_names_food ON food_names(food_id);
+-- Every word of every name, so a word-prefix search is one range read per term word
+CREATE TABLE IF NOT EXISTS food_name_words (
+    word TEXT NOT NULL,
+    name_normalized TEXT NOT NULL,
+    food_id INTEGER NOT NULL REFERENCES foods(id),
+    PRIMARY KEY (word, name_normalized, food_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS food_groups (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_normalized TEXT NOT NULL UNIQUE,
+    food_count INTEGER NOT NULL
+);
+-- Group members in name order, so a page is one range read on the primary key
+CREATE TABLE IF NOT EXISTS group_foods (
+    group_id INTEGER NOT NULL REFERENCES food_groups(id),
+    position INTEGER NOT NULL,
+    food_id INTEGER NOT NULL REFERENCES foods(id),
+    PRIMARY KEY (group_id, position)
+) WITHOUT ROWID;
+"""
+
+# Part of the stored data hash, so a database written with an older schema is reloaded
+SCHEMA_VERSION = "2"
+
+# Sorts after any character that can follow a prefix, closing the range of words that start with it
+PREFIX_END = "\U0010ffff"
+
+FOOD_COLUMNS = "f.name, f.fodmap_level, f.status, f.food_groups, f.fodmap_categories"
+
+
+class SQLiteGraphBackend(GraphBackend):
+    """Embedded FODMAP graph in SQLite, loaded from the same JSON that gptgraphbuilder produces.
+
+    Lookups run in-process against indexed tables. Connections are per thread; pass ":memory:"
+    for a private in-memory database shared by the threads of this process.
+    """
+
+    name = "sqlite"
+    in_process = True
+
+    def __init__(self, path: str = ":memory:", profiler: Optional[QueryProfiler] = None):
+        self.path = path
+        self.profiler = profiler
+        self._local = threading.local()
+        self._load_lock = threading.Lock()
+        self.data_path: Optional[str] = None
+        self._data_stamp: Optional[Tuple[int, int]] = None
+        if path == ":memory:":
+            self._database, self._uri = f"file:fodmap-graph-{id(self)}?mode=memory&cache=shared", True
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._database, self._uri = path, False
+
+        # Holding one connection keeps a shared in-memory database alive
+        self._anchor = self._connection()
+        self._anchor.executescript(SCHEMA)
+        self.version = self._meta("data_hash")
+
+    @classmethod
+    def from_env(cls, profiler: Optional[QueryProfiler] = None) -> "SQLiteGraphBackend":
+        """Database at FODMAP_SQLITE_PATH, (re)loaded from FODMAP_GRAPH_DATA when that file changed"""
+        backend = cls(os.getenv("FODMAP_SQLITE_PATH", ".fodmap_cache/graph.sqlite3"), profiler)
+        data_path = os.getenv("FODMAP_GRAPH_DATA", "fodmap_data.json")
+        if os.path.exists(data_path):
+            backend.load_file(data_path)
+        elif not backend.loaded:
+            print(f"⚠️ No graph data at {data_path}; the SQLite graph is empty")
+        return backend
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._database, uri=self._uri, timeout=30, check_same_thread=False)
+            if not self._uri:
+                conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @property
+    def loaded(self) -> bool:
+        return self.version is not None
+
+    def _data_file_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.data_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh_due(self) -> bool:
+        """True when the data file passed to load_file was modified since it was loaded"""
+        return self.data_path is not None and self._data_file_stamp() not in (None, self._data_stamp)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reload from the data file when it changed; the content hash decides whether anything is rewritten"""
+        if self.data_path is None or not (force or self.refresh_due()):
+            return False
+        return self.load_file(self.data_path)
+
+    def load_file(self, path: str) -> bool:
+        """Load a data file and remember it, so refresh picks up later edits"""
+        with self._load_lock:
+            self.data_path = path
+            # Stamped before reading, so an edit made while loading is picked up by the next refresh
+            self._data_stamp = self._data_file_stamp()
+            with open(path, "r", encoding="utf-8") as f:
+                return self.load_data(json.load(f))
+
+    def load_data(self, data: dict) -> bool:
+        """Replace the stored graph with parsed FODMAP JSON; returns False when it is already loaded"""
+        data_hash = hashlib.sha256(
+            (SCHEMA_VERSION + json.dumps(data, sort_keys=True, ensure_ascii=False)).encode("utf-8")
+        ).hexdigest()
+        if data_hash == self.version:
+            return False
+
+        # Same normalization and precedence as the in-memory snapshot: later duplicates win
+        foods = {}
+        for record in records_from_data(data):
+            foods[normalize_name(record["name"])] = record
+
+        conn = self._connection()
+        with conn:
+            for table in ("group_foods", "food_groups", "food_name_words", "food_names", "foods"):
+                conn.execute(f"DELETE FROM {table}")
+
+            names = {}
+            groups: Dict[str, Tuple[str, List[int]]] = {}
+            for food_id, (key, record) in enumerate(sorted(foods.items(), key=lambda item: item[1]["name"]), 1):
+                conn.execute(
+                    "INSERT INTO foods (id, name, name_normalized, fodmap_level, status, food_groups, "
+                    "fodmap_categories) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (food_id, record["name"], key, record.get("fodmap_level"), record.get("status", "unknown"),
+                     json.dumps(record.get("food_groups") or [], ensure_ascii=False),
+                     json.dumps(record.get("fodmap_categories") or [], ensure_ascii=False))
+                )
+                names[(key, food_id)] = (record["name"], 1)
+                for alt_name in record.get("alternative_names") or []:
+                    names.setdefault((normalize_name(alt_name), food_id), (alt_name, 0))
+                for group in record.get("food_groups") or []:
+                    groups.setdefault(normalize_name(group), (group, []))[1].append(food_id)
+
+            conn.executemany(
+                "INSERT INTO food_names (name_normalized, food_id, name, canonical) VALUES (?, ?, ?, ?)",
+                [(key, food_id, name, canonical) for (key, food_id), (name, canonical) in names.items()]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO food_name_words (word, name_normalized, food_id) VALUES (?, ?, ?)",
+                [(word, key, food_id) for key, food_id in names for word in name_words(key)]
+            )
+            for group_id, (key, (group, food_ids)) in enumerate(groups.items(), 1):
+                conn.execute("INSERT INTO food_groups (id, name, name_normalized, food_count) VALUES (?, ?, ?, ?)",
+                             (group_id, group, key, len(food_ids)))
+                conn.executemany("INSERT INTO group_foods (group_id, position, food_id) VALUES (?, ?, ?)",
+                                 [(group_id, position, food_id) for position, food_id in enumerate(food_ids)])
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('data_hash', ?)", (data_hash,))
+
+        self.version = data_hash
+        print(f"Loaded {len(foods)} foods into the SQLite graph at {self.path}")
+        return True
+
+    @staticmethod
+    def _rows(row: tuple) -> List[Dict[str, Any]]:
+        """One row per food group, in the shape of the ingredient Cypher queries"""
+        name, _, status, food_groups, fodmap_categories = row
+        categories = json.loads(fodmap_categories)
+        return [{
+            "ingredient": name,
+            "food_group": group,
+            "fodmap_categories": list(categories),
+            "status": status
+        } for group in (json.loads(food_groups) or [None])]
+
+    def lookup_ingredient(self, term: str, limit: int = INGREDIENT_LIMIT) -> List[Dict[str, Any]]:
+        term = normalize_name(term)
+        term_words = name_words(term)
+        if not term_words:
+            return []
+        # Names in which every term word starts some word: one prefix range per term word, intersected
+        matched = " INTERSECT ".join(
+            ["SELECT name_normalized, food_id FROM food_name_words WHERE word >= ? AND word < ?"] * len(term_words)
+        )
+        ranges = [bound for word in term_words for bound in (word, word + PREFIX_END)]
+        rows = self._connection().execute(
+            f"SELECT {FOOD_COLUMNS}, max(m.name_normalized = ?) AS exact "
+            f"FROM ({matched}) m JOIN foods f ON f.id = m.food_id "
+            "GROUP BY f.id ORDER BY exact DESC, f.name LIMIT ?",
+            (term, *ranges, limit)
+        ).fetchall()
+
+        results = []
+        for row in rows:
+            results.extend(self._rows(row[:5]))
+        return results
+
+    def lookup_ingredients(self, names: List[str]) -> List[Dict[str, Any]]:
+        conn = self._connection()
+        results = []
+        seen = set()
+        for name in names:
+            row = conn.execute(
+                f"SELECT f.id, {FOOD_COLUMNS} FROM food_names n JOIN foods f ON f.id = n.food_id "
+                "WHERE n.name_normalized = ? ORDER BY n.canonical DESC, f.id LIMIT 1",
+                (normalize_name(name),)
+            ).fetchone()
+            if row is not None and row[0] not in seen:
+                seen.add(row[0])
+                results.extend(self._rows(row[1:]))
+        return results
+
+    def lookup_food_groups(self, groups: List[str], limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        conn = self._connection()
+        results = []
+        for group in groups:
+            entry = conn.execute(
+                "SELECT id, name, food_count FROM food_groups WHERE name_normalized = ?", (normalize_name(group),)
+            ).fetchone()
+            if entry is None:
+                continue
+            group_id, name, total = entry
+            foods = conn.execute(
+                "SELECT f.name, f.status, coalesce(f.fodmap_level, 'unknown') FROM group_foods g "
+                "JOIN foods f ON f.id = g.food_id WHERE g.group_id = ? AND g.position >= ? "
+                "ORDER BY g.position LIMIT ?",
+                (group_id, offset, limit)
+            ).fetchall()
+            results.append({
+                "group": name,
+                "foods": [{"name": food, "status": status, "fodmap_level": level} for food, status, level in foods],
+                "total": total
+            })
+        return results
+
+    def vocabulary(self) -> Tuple[List[str], Dict[str, str], List[str]]:
+        """Food names, alternative name -> food name, and food group names, like the snapshot's"""
+        conn = self._connection()
+        food_names = [row[0] for row in conn.execute("SELECT name FROM foods ORDER BY id")]
+        alternative_names = {}
+        for alt_name, food in conn.execute(
+            "SELECT n.name, f.name FROM food_names n JOIN foods f ON f.id = n.food_id "
+            "WHERE n.canonical = 0 ORDER BY f.id"
+        ):
+            alternative_names.setdefault(alt_name, food)
+        group_names = [row[0] for row in conn.execute("SELECT name FROM food_groups ORDER BY name")]
+        return food_names, alternative_names, group_names
+
+    def answer(self, query_info: Dict) -> Optional[List[Dict[str, Any]]]:
+        """Answer a generated query, timed under "<template>@sqlite" when a profiler is attached"""
+        started = time.perf_counter()
+        records = self._dispatch(query_info)
+        if records is not None and self.profiler is not None:
+            self.profiler.record(f"{query_info.get('template', 'adhoc')}@{self.name}",
+                                 (time.perf_counter() - started) * 1000, rows=len(records))
+        return records
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and conn is not self._anchor:
+            conn.close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Load parsed FODMAP JSON into the embedded SQLite graph")
+    arg_parser.add_argument("--data", default="fodmap_data.json", help="output of gptgraphbuilder")
+    arg_parser.add_argument("--path", default=os.getenv("FODMAP_SQLITE_PATH", ".fodmap_cache/graph.sqlite3"))
+    args = arg_parser.parse_args()
+
+    backend = SQLiteGraphBackend(args.path)
+    if not backend.load_file(args.data):
+        print(f"{args.path} is already up to date with {args.data}")
+
+    food_names, _, group_names = backend.vocabulary()
+    started = time.perf_counter()
+    for name in food_names:
+        backend.lookup_ingredients([name])
+    per_lookup_us = (time.perf_counter() - started) / max(len(food_names), 1) * 1_000_000
+    print(f"{len(food_names)} foods in {len(group_names)} groups; exact lookup {per_lookup_us:.0f} µs on average")
+
+if __name__ == "__main__":
+    main()
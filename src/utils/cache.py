@@ -0,0 +1,255 @@
+from typing import Any, Dict, Optional
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from .text import normalize_query
+
+
+def content_key(*parts: str) -> str:
+    """Stable SHA-256 key over the given text parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """Content-addressed store of structured LLM parse results, one JSON file per key"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        """Write atomically so concurrent workers never read a partial file"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class LLMResponseCache:
+    """Disk-backed cache of parsed LLM responses, shared between processes through SQLite.
+
+    Lookups only read. Hit/miss counts and LRU access times are kept in memory and written in one
+    transaction at most every flush_interval seconds, on put, and on close.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl_seconds: Optional[float] = 7 * 24 * 3600,
+                 flush_interval: float = 30.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._pending_lock = threading.Lock()
+        self._pending_counts: Dict[str, Dict[str, int]] = {}
+        self._pending_access: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS stats (
+                    namespace TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+        atexit.register(self.close)
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets several worker processes read while one writes"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(namespace: str, prompt: str, model: str, user_input: str) -> str:
+        """Key on normalized input, a version hash of the prompt text, and the model"""
+        prompt_version = content_key(prompt)[:16]
+        return content_key(namespace, prompt_version, model, normalize_query(user_input))
+
+    def _count(self, namespace: str, column: str, key: Optional[str] = None):
+        """Record a lookup in memory; flush if the last flush is older than flush_interval"""
+        with self._pending_lock:
+            counts = self._pending_counts.setdefault(namespace, {"hits": 0, "misses": 0})
+            counts[column] += 1
+            if key is not None:
+                self._pending_access[key] = time.time()
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def _take_pending(self):
+        with self._pending_lock:
+            counts, access = self._pending_counts, self._pending_access
+            self._pending_counts, self._pending_access = {}, {}
+            self._last_flush = time.monotonic()
+        return counts, access
+
+    def _write_pending(self, conn: sqlite3.Connection, counts: Dict[str, Dict[str, int]], access: Dict[str, float]):
+        conn.executemany(
+            "INSERT INTO stats (namespace, hits, misses) VALUES (?, ?, ?) "
+            "ON CONFLICT(namespace) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses",
+            [(namespace, c["hits"], c["misses"]) for namespace, c in counts.items()]
+        )
+        conn.executemany(
+            "UPDATE entries SET accessed_at = max(accessed_at, ?) WHERE key = ?",
+            [(accessed_at, key) for key, accessed_at in access.items()]
+        )
+
+    def flush(self):
+        """Write the buffered hit/miss counts and access times"""
+        counts, access = self._take_pending()
+        if not counts and not access:
+            return
+        try:
+            with self._connection() as conn:
+                self._write_pending(conn, counts, access)
+        except sqlite3.Error as e:
+            print(f"LLM cache stats flush failed: {str(e)}")
+
+    def close(self):
+        """Flush buffered stats; registered to run at interpreter shutdown"""
+        self.flush()
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        # Expired rows are left for put to replace or evict, keeping lookups read-only
+        if row is None or (self.ttl_seconds is not None and time.time() - row[1] > self.ttl_seconds):
+            self._count(namespace, "misses")
+            return None
+        self._count(namespace, "hits", key)
+        return json.loads(row[0])
+
+    def put(self, namespace: str, key: str, value: Any):
+        now = time.time()
+        counts, access = self._take_pending()
+        with self._connection() as conn:
+            # Piggyback the buffered stats on the write transaction put needs anyway
+            self._write_pending(conn, counts, access)
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, namespace, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, namespace, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            # Least recently used entries go first once the cache is over capacity
+            conn.execute("""
+                DELETE FROM entries WHERE key IN (
+                    SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Hit/miss counts and hit rate per namespace, across every process sharing the file.
+
+        Other processes' counts show up once they flush; this process's unflushed counts are added in.
+        """
+        with self._connection() as conn:
+            entries = dict(conn.execute("SELECT namespace, count(*) FROM entries GROUP BY namespace"))
+            totals = {namespace: [hits, misses]
+                      for namespace, hits, misses in conn.execute("SELECT namespace, hits, misses FROM stats")}
+        with self._pending_lock:
+            for namespace, counts in self._pending_counts.items():
+                total = totals.setdefault(namespace, [0, 0])
+                total[0] += counts["hits"]
+                total[1] += counts["misses"]
+
+        report = {}
+        for namespace, (hits, misses) in totals.items():
+            total = hits + misses
+            report[namespace] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / total if total else 0.0,
+                "entries": entries.get(namespace, 0)
+            }
+        return report
+
+
+_default_llm_cache = None
+_default_llm_cache_lock = threading.Lock()
+
+
+def default_llm_cache() -> Optional[LLMResponseCache]:
+    """Process-wide cache at FODMAP_LLM_CACHE_PATH; set the variable to an empty string to disable"""
+    global _default_llm_cache
+    path = os.getenv("FODMAP_LLM_CACHE_PATH", ".fodmap_cache/llm_cache.sqlite3")
+    if not path:
+        return None
+    with _default_llm_cache_lock:
+        if _default_llm_cache is None or _default_llm_cache.path != path:
+            _default_llm_cache = LLMResponseCache(
+                path,
+                max_entries=int(os.getenv("FODMAP_LLM_CACHE_MAX_ENTRIES", "10000")),
+                ttl_seconds=float(os.getenv("FODMAP_LLM_CACHE_TTL", str(7 * 24 * 3600))),
+                flush_interval=float(os.getenv("FODMAP_LLM_CACHE_FLUSH_INTERVAL", "30"))
+            )
+        return _default_llm_cache
+
+
+_default_embedding_cache = None
+
+
+def default_embedding_cache() -> Optional[LLMResponseCache]:
+    """Process-wide embedding store at FODMAP_EMBEDDING_CACHE_PATH; embeddings never expire"""
+    global _default_embedding_cache
+    path = os.getenv("FODMAP_EMBEDDING_CACHE_PATH", ".fodmap_cache/embeddings.sqlite3")
+    if not path:
+        return None
+    with _default_llm_cache_lock:
+        if _default_embedding_cache is None or _default_embedding_cache.path != path:
+            _default_embedding_cache = LLMResponseCache(
+                path,
+                max_entries=int(os.getenv("FODMAP_EMBEDDING_CACHE_MAX_ENTRIES", "200000")),
+                ttl_seconds=None
+            )
+        return _default_embedding_cache
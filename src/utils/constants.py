@@ -84,4 +84,62 @@ Soru: "Soğan FODMAP için zararlı mı?"
     "query_type": "ingredient",
     "identified_items": ["soğan"],
     "requires_ingredient_breakdown": false
-}"""
\ No newline at end of file
+}"""
+
+DISH_CATALOG_BATCH_PROMPT = """Sen bir FODMAP diyeti uzmanısın. Sana verilen her yemeği temel malzemelerine ayır.
+Yanıtı şu JSON formatında ver, her yemek için bir kayıt olsun ve yemekleri verilen sırayla listele:
+{
+    "dishes": [
+        {
+            "dish_name": "yemeğin adı",
+            "ingredients": [
+                {
+                    "name": "malzeme adı (Türkçe)",
+                    "is_main_ingredient": boolean,
+                    "typical_preparation": "çiğ|pişmiş|işlenmiş"
+                }
+            ]
+        }
+    ]
+}
+
+Önemli noktalar:
+- Malzeme isimlerini Türkçe olarak ver (örn: "soğan", "sarımsak", "patlıcan")
+- Sadece ana malzemeleri listele
+- Baharat ve çok az miktardaki malzemeleri dahil etme
+- FODMAP açısından önemli malzemelere odaklan
+- Yemek adını sana verildiği haliyle yaz"""
+
+# Well-known Turkish dishes recognised locally as "meal" queries
+KNOWN_DISHES = [
+    "karnıyarık", "imam bayıldı", "mantı", "mercimek çorbası", "ezogelin çorbası",
+    "yayla çorbası", "tarhana çorbası", "işkembe çorbası", "menemen", "lahmacun",
+    "pide", "börek", "su böreği", "sigara böreği", "gözleme", "simit", "kuru fasulye",
+    "nohut yemeği", "pilav", "bulgur pilavı", "etli nohut", "taze fasulye", "zeytinyağlı fasulye",
+    "dolma", "biber dolması", "yaprak sarma", "sarma", "musakka", "hünkar beğendi",
+    "köfte", "izmir köfte", "içli köfte", "çiğ köfte", "adana kebap", "iskender",
+    "döner", "şiş kebap", "tavuk sote", "güveç", "türlü", "mücver", "cacık",
+    "ezme", "haydari", "humus", "baklava", "künefe", "sütlaç", "kazandibi",
+    "aşure", "revani", "lokma", "tavuk göğsü", "irmik helvası", "kısır", "çoban salatası"
+]
+
+# Turkish food group words mapped to the FoodGroup names used in the graph
+FOOD_GROUP_ALIASES = {
+    "meyve": "Fruits",
+    "sebze": "Vegetables",
+    "tahıl": "Grains",
+    "tahıllar": "Grains",
+    "süt ürünü": "Dairy",
+    "süt ürünleri": "Dairy",
+    "protein": "Proteins",
+    "et ürünleri": "Proteins",
+    "kuruyemiş": "Nuts and Seeds",
+    "kuruyemişler": "Nuts and Seeds",
+    "içecek": "Beverages",
+    "içecekler": "Beverages",
+    "baharat": "Condiments",
+    "sos": "Condiments",
+    "soslar": "Condiments",
+    "tatlandırıcı": "Sweeteners",
+    "tatlandırıcılar": "Sweeteners"
+}
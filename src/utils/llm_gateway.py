@@ -0,0 +1,464 @@
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from collections import defaultdict, deque
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
+from .llm_scheduler import INTERACTIVE, LLMScheduler, SchedulerTimeout, Ticket
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError,
+                    openai.APIConnectionError, openai.APITimeoutError)
+
+
+def _wake(freed: asyncio.Future):
+    if not freed.done():
+        freed.set_result(None)
+
+
+class LLMGatewayError(Exception):
+    """Raised when an LLM call fails for good (non-retryable error, retries exhausted or deadline passed)"""
+
+
+class CallSiteMetrics:
+    def __init__(self, window: int = 1000):
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies = deque(maxlen=window)
+        self.queue_waits = deque(maxlen=window)
+
+    def snapshot(self) -> Dict[str, float]:
+        latencies = sorted(self.latencies)
+        queue_waits = sorted(self.queue_waits)
+
+        def percentile(p: float, values=latencies) -> float:
+            if not values:
+                return 0.0
+            return values[min(len(values) - 1, int(p * len(values)))] * 1000
+
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_p50_ms": percentile(0.50),
+            "latency_p95_ms": percentile(0.95),
+            "latency_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+            "queue_wait_p95_ms": percentile(0.95, queue_waits)
+        }
+
+
+class LLMGateway:
+    """Single entry point for OpenAI calls: shared connection pool, deadlines, retries, in-flight cap, metrics.
+
+    Every call runs in a priority class (interactive, batch or evaluation). Calls default to
+    `default_priority`; offline jobs set it to BATCH or EVALUATION for their whole process.
+    """
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, default_model: str = "gpt-4",
+                 models: Optional[Dict[str, str]] = None, timeout: float = 60.0, max_retries: int = 3,
+                 max_in_flight: int = 16, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 scheduler: Optional[LLMScheduler] = None, default_priority: str = INTERACTIVE,
+                 interactive_slots: int = 4):
+        self.default_model = default_model
+        self.models = dict(models or {})
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_in_flight = max_in_flight
+        self.scheduler = scheduler
+        self.default_priority = default_priority
+        # Slots only interactive calls may use, so background work never fills the whole pool
+        self.interactive_slots = min(interactive_slots, max_in_flight - 1) if max_in_flight > 1 else 0
+
+        self.api_key = api_key
+        self.base_url = base_url
+        self._limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+        self.http_client = httpx.Client(limits=self._limits, timeout=timeout)
+        # Retries are handled here so they share the deadline and the metrics
+        self.client = OpenAI(api_key=api_key, base_url=base_url, http_client=self.http_client,
+                             max_retries=0, timeout=timeout)
+        self._in_flight = 0
+        self._slot_freed = threading.Condition()
+        # Async callers waiting for a slot, woken on their own loop; guarded by _slot_freed
+        self._slot_waiters: Dict[asyncio.Future, asyncio.AbstractEventLoop] = {}
+        self._metrics: Dict[str, CallSiteMetrics] = defaultdict(CallSiteMetrics)
+        self._metrics_lock = threading.Lock()
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = \
+            weakref.WeakKeyDictionary()
+        self._async_clients_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, api_key: str) -> "LLMGateway":
+        return cls(
+            api_key,
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            default_model=os.getenv("OPENAI_MODEL", "gpt-4"),
+            timeout=float(os.getenv("OPENAI_TIMEOUT", "60")),
+            max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "3")),
+            max_in_flight=int(os.getenv("OPENAI_MAX_IN_FLIGHT", "16")),
+            scheduler=LLMScheduler.from_env(),
+            interactive_slots=int(os.getenv("OPENAI_INTERACTIVE_SLOTS", "4"))
+        )
+
+    def model_for(self, call_site: str) -> str:
+        """Per call site model: explicit mapping, then OPENAI_MODEL_<CALL_SITE>, then the default"""
+        if call_site in self.models:
+            return self.models[call_site]
+        return os.getenv(f"OPENAI_MODEL_{call_site.upper()}", self.default_model)
+
+    def _record(self, call_site: str, latency: Optional[float] = None, failed: bool = False,
+                retried: bool = False, usage: Any = None, queue_wait: Optional[float] = None):
+        with self._metrics_lock:
+            metrics = self._metrics[call_site]
+            if queue_wait is not None:
+                metrics.queue_waits.append(queue_wait)
+            if latency is not None:
+                metrics.calls += 1
+                metrics.latencies.append(latency)
+            if failed:
+                metrics.failures += 1
+            if retried:
+                metrics.retries += 1
+            if usage is not None:
+                metrics.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+                metrics.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when the server sends one"""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _slot_limit(self, priority: str) -> int:
+        return self.max_in_flight if priority == INTERACTIVE else self.max_in_flight - self.interactive_slots
+
+    def _acquire_slot(self, priority: str, timeout: float) -> bool:
+        limit = self._slot_limit(priority)
+        with self._slot_freed:
+            if not self._slot_freed.wait_for(lambda: self._in_flight < limit, timeout=timeout):
+                return False
+            self._in_flight += 1
+            return True
+
+    def _release_slot(self):
+        with self._slot_freed:
+            self._in_flight -= 1
+            self._slot_freed.notify_all()
+            waiters, self._slot_waiters = self._slot_waiters, {}
+        for freed, loop in waiters.items():
+            try:
+                loop.call_soon_threadsafe(_wake, freed)
+            except RuntimeError:
+                # The waiter's loop has closed; nobody is left to wake
+                pass
+
+    def _settle(self, ticket: Optional[Ticket], usage: Any):
+        if ticket is not None and usage is not None:
+            self.scheduler.settle(ticket, getattr(usage, "total_tokens", None))
+
+    def _refund(self, ticket: Optional[Ticket]):
+        """Give back the tokens of an admitted call that was never sent"""
+        if ticket is not None:
+            self.scheduler.settle(ticket, 0)
+
+    @staticmethod
+    def estimate_tokens(messages: List[Dict], max_tokens: Optional[int]) -> int:
+        """Rough prompt size (4 characters per token) plus the completion budget"""
+        prompt_chars = sum(len(str(message.get("content") or "")) for message in messages)
+        return prompt_chars // 4 + (max_tokens or 1000)
+
+    def _schedule(self, call_site: str, priority: str, estimated_tokens: int, deadline: float) -> Optional[Ticket]:
+        if self.scheduler is None or not self.scheduler.enabled:
+            return None
+        try:
+            return self.scheduler.acquire(priority, estimated_tokens, max(0.0, deadline - time.monotonic()))
+        except SchedulerTimeout as e:
+            self._record(call_site, failed=True)
+            raise LLMGatewayError(f"{call_site}: {str(e)}") from e
+
+    def _deadline_error(self, call_site: str) -> LLMGatewayError:
+        self._record(call_site, failed=True)
+        return LLMGatewayError(f"{call_site}: deadline exceeded before the request could be sent")
+
+    def _completed(self, call_site: str, started: float, result: Any, ticket: Optional[Ticket], hold_slot: bool):
+        usage = getattr(result, "usage", None)
+        self._record(call_site, latency=time.perf_counter() - started, usage=usage)
+        if not hold_slot:
+            self._settle(ticket, usage)
+
+    def _retry_delay(self, call_site: str, ticket: Optional[Ticket], attempt: int, error: Exception,
+                     deadline: float) -> float:
+        """Backoff before the next attempt, or LLMGatewayError once retries or time run out"""
+        # A rejected request still used its request budget, but no tokens
+        self._refund(ticket)
+        delay = self._backoff(attempt, error)
+        if attempt + 1 > self.max_retries or time.monotonic() + delay >= deadline:
+            self._record(call_site, failed=True)
+            raise LLMGatewayError(f"{call_site}: giving up after {attempt + 1} attempt(s): {str(error)}") from error
+        self._record(call_site, retried=True)
+        return delay
+
+    def _call(self, call_site: str, request, timeout: Optional[float], priority: Optional[str] = None,
+              estimated_tokens: int = 0, hold_slot: bool = False):
+        """Run request(remaining_seconds) once admitted by the scheduler and the in-flight cap,
+        retrying transient failures. Returns (result, ticket).
+
+        With hold_slot the in-flight slot stays taken after success and the token usage is not
+        settled; the caller must do both.
+        """
+        priority = priority or self.default_priority
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            queued_at = time.perf_counter()
+            ticket = self._schedule(call_site, priority, estimated_tokens, deadline)
+            remaining = deadline - time.monotonic()
+            try:
+                acquired = remaining > 0 and self._acquire_slot(priority, remaining)
+            except BaseException:
+                self._refund(ticket)
+                raise
+            if not acquired:
+                self._refund(ticket)
+                raise self._deadline_error(call_site)
+            self._record(call_site, queue_wait=time.perf_counter() - queued_at)
+
+            release = True
+            try:
+                result = request(max(0.001, deadline - time.monotonic()))
+            except RETRYABLE_ERRORS as e:
+                error = e
+            except openai.OpenAIError as e:
+                # Rejected requests use no tokens
+                self._refund(ticket)
+                self._record(call_site, failed=True)
+                raise LLMGatewayError(f"{call_site}: {str(e)}") from e
+            else:
+                self._completed(call_site, started, result, ticket, hold_slot)
+                release = not hold_slot
+                return result, ticket
+            finally:
+                if release:
+                    self._release_slot()
+
+            time.sleep(self._retry_delay(call_site, ticket, attempt, error, deadline))
+            attempt += 1
+
+    def _async_client(self) -> AsyncOpenAI:
+        """AsyncOpenAI client for the running event loop; its connections cannot be shared across loops"""
+        loop = asyncio.get_running_loop()
+        with self._async_clients_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = AsyncOpenAI(
+                    api_key=self.api_key, base_url=self.base_url, max_retries=0, timeout=self.timeout,
+                    http_client=httpx.AsyncClient(limits=self._limits, timeout=self.timeout)
+                )
+                self._async_clients[loop] = client
+            return client
+
+    async def _aacquire_slot(self, priority: str, timeout: float) -> bool:
+        """Take an in-flight slot without blocking the event loop; waits on a future _release_slot resolves"""
+        limit = self._slot_limit(priority)
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._slot_freed:
+                if self._in_flight < limit:
+                    self._in_flight += 1
+                    return True
+                freed = loop.create_future()
+                self._slot_waiters[freed] = loop
+            try:
+                await asyncio.wait_for(freed, max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                with self._slot_freed:
+                    self._slot_waiters.pop(freed, None)
+
+    async def _aschedule(self, call_site: str, priority: str, estimated_tokens: int,
+                         deadline: float) -> Optional[Ticket]:
+        """_schedule in a worker thread, since the scheduler waits on SQLite.
+
+        The thread cannot be interrupted, so if the caller is cancelled meanwhile, a ticket it
+        still obtains is refunded.
+        """
+        if self.scheduler is None or not self.scheduler.enabled:
+            return None
+        future = asyncio.ensure_future(
+            asyncio.to_thread(self._schedule, call_site, priority, estimated_tokens, deadline)
+        )
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            def refund(done):
+                if not done.cancelled() and done.exception() is None:
+                    self._refund(done.result())
+            future.add_done_callback(refund)
+            raise
+
+    async def _acall(self, call_site: str, request, timeout: Optional[float], priority: Optional[str] = None,
+                     estimated_tokens: int = 0, hold_slot: bool = False):
+        """Async twin of _call: request(remaining_seconds) returns an awaitable"""
+        priority = priority or self.default_priority
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            queued_at = time.perf_counter()
+            ticket = await self._aschedule(call_site, priority, estimated_tokens, deadline)
+            remaining = deadline - time.monotonic()
+            try:
+                acquired = remaining > 0 and await self._aacquire_slot(priority, remaining)
+            except BaseException:
+                self._refund(ticket)
+                raise
+            if not acquired:
+                self._refund(ticket)
+                raise self._deadline_error(call_site)
+            self._record(call_site, queue_wait=time.perf_counter() - queued_at)
+
+            release = True
+            try:
+                result = await request(max(0.001, deadline - time.monotonic()))
+            except RETRYABLE_ERRORS as e:
+                error = e
+            except openai.OpenAIError as e:
+                self._refund(ticket)
+                self._record(call_site, failed=True)
+                raise LLMGatewayError(f"{call_site}: {str(e)}") from e
+            else:
+                self._completed(call_site, started, result, ticket, hold_slot)
+                release = not hold_slot
+                return result, ticket
+            finally:
+                if release:
+                    self._release_slot()
+
+            await asyncio.sleep(self._retry_delay(call_site, ticket, attempt, error, deadline))
+            attempt += 1
+
+    def chat(self, call_site: str, messages: List[Dict], timeout: Optional[float] = None,
+             priority: Optional[str] = None, **params):
+        """Chat completion for a named call site; returns the OpenAI response object"""
+        model = self.model_for(call_site)
+        response, _ = self._call(call_site, lambda remaining: self.client.chat.completions.create(
+            model=model, messages=messages, timeout=remaining, **params
+        ), timeout, priority, self.estimate_tokens(messages, params.get("max_tokens")))
+        return response
+
+    def stream_chat(self, call_site: str, messages: List[Dict], timeout: Optional[float] = None,
+                    priority: Optional[str] = None, **params) -> Iterator[str]:
+        """Yield content tokens; retries only happen before the stream is established"""
+        model = self.model_for(call_site)
+        stream, ticket = self._call(call_site, lambda remaining: self.client.chat.completions.create(
+            model=model, messages=messages, timeout=remaining, stream=True,
+            stream_options={"include_usage": True}, **params
+        ), timeout, priority, self.estimate_tokens(messages, params.get("max_tokens")), hold_slot=True)
+        try:
+            for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    self._record(call_site, usage=chunk.usage)
+                    self._settle(ticket, chunk.usage)
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if token:
+                    yield token
+        except openai.OpenAIError as e:
+            self._record(call_site, failed=True)
+            raise LLMGatewayError(f"{call_site}: stream interrupted: {str(e)}") from e
+        finally:
+            stream.close()
+            self._release_slot()
+
+    def embed(self, call_site: str, inputs: List[str], model: str = "text-embedding-ada-002",
+              timeout: Optional[float] = None, priority: Optional[str] = None) -> List[List[float]]:
+        """Embeddings for a batch of texts, in input order"""
+        estimated_tokens = sum(len(text) for text in inputs) // 4 + 1
+        response, _ = self._call(call_site, lambda remaining: self.client.embeddings.create(
+            model=model, input=inputs, timeout=remaining
+        ), timeout, priority, estimated_tokens)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def achat(self, call_site: str, messages: List[Dict], timeout: Optional[float] = None,
+                    priority: Optional[str] = None, **params):
+        """Async chat completion; shares the in-flight cap, scheduler and metrics with chat"""
+        model = self.model_for(call_site)
+        client = self._async_client()
+        response, _ = await self._acall(call_site, lambda remaining: client.chat.completions.create(
+            model=model, messages=messages, timeout=remaining, **params
+        ), timeout, priority, self.estimate_tokens(messages, params.get("max_tokens")))
+        return response
+
+    async def astream_chat(self, call_site: str, messages: List[Dict], timeout: Optional[float] = None,
+                           priority: Optional[str] = None, **params) -> AsyncIterator[str]:
+        """Async twin of stream_chat"""
+        model = self.model_for(call_site)
+        client = self._async_client()
+        stream, ticket = await self._acall(call_site, lambda remaining: client.chat.completions.create(
+            model=model, messages=messages, timeout=remaining, stream=True,
+            stream_options={"include_usage": True}, **params
+        ), timeout, priority, self.estimate_tokens(messages, params.get("max_tokens")), hold_slot=True)
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    self._record(call_site, usage=chunk.usage)
+                    self._settle(ticket, chunk.usage)
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if token:
+                    yield token
+        except openai.OpenAIError as e:
+            self._record(call_site, failed=True)
+            raise LLMGatewayError(f"{call_site}: stream interrupted: {str(e)}") from e
+        finally:
+            await stream.close()
+            self._release_slot()
+
+    async def aembed(self, call_site: str, inputs: List[str], model: str = "text-embedding-ada-002",
+                     timeout: Optional[float] = None, priority: Optional[str] = None) -> List[List[float]]:
+        """Async twin of embed"""
+        client = self._async_client()
+        estimated_tokens = sum(len(text) for text in inputs) // 4 + 1
+        response, _ = await self._acall(call_site, lambda remaining: client.embeddings.create(
+            model=model, input=inputs, timeout=remaining
+        ), timeout, priority, estimated_tokens)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        with self._metrics_lock:
+            return {call_site: metrics.snapshot() for call_site, metrics in self._metrics.items()}
+
+    def close(self):
+        self.http_client.close()
+        with self._async_clients_lock:
+            async_clients = list(self._async_clients.items())
+            self._async_clients.clear()
+        for loop, client in async_clients:
+            # Async clients must be closed on the loop that owns their connections
+            if loop.is_running():
+                try:
+                    asyncio.run_coroutine_threadsafe(client.close(), loop).result(timeout=5)
+                except Exception as e:
+                    print(f"Error closing async OpenAI client: {str(e)}")
+        if self.scheduler is not None:
+            self.scheduler.close()
@@ -0,0 +1,235 @@
+from typing import Dict, Optional, Tuple
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+EVALUATION = "evaluation"
+
+# A waiting interactive call holds back every queued batch/evaluation call; the lower classes do not
+# wait on each other, each only queues behind earlier calls of its own class
+PRIORITY_RANK = {INTERACTIVE: 0, BATCH: 1, EVALUATION: 2}
+
+# Waiters that have not polled for this long belong to a crashed process and are dropped
+STALE_WAITER_SECONDS = 30.0
+
+
+class SchedulerTimeout(Exception):
+    """Raised when a call cannot be admitted before its deadline"""
+
+
+class Ticket:
+    """Admission handed out by LLMScheduler.acquire; settle it with the real token usage"""
+
+    def __init__(self, priority: str, estimated_tokens: int, queue_wait: float):
+        self.priority = priority
+        self.estimated_tokens = estimated_tokens
+        self.queue_wait = queue_wait
+
+
+class LLMScheduler:
+    """Priority admission for LLM calls with requests/tokens-per-minute token buckets.
+
+    Buckets live in SQLite so the Streamlit app, the evaluation framework and the graph
+    builder draw from the same account budget even though they run as separate processes.
+    Every class has optional RPM/TPM caps of its own and all classes share the account
+    caps; non-interactive classes must leave `interactive_reserve` of the account buckets
+    untouched, and they wait while any interactive call is queued. Calls are first-in first-out
+    within a class.
+    """
+
+    def __init__(self, path: str = ":memory:", account_limits: Tuple[float, float] = (0, 0),
+                 class_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+                 interactive_reserve: float = 0.2, poll_interval: float = 0.05):
+        self.path = path
+        self.account_limits = account_limits
+        self.class_limits = dict(class_limits or {})
+        self.interactive_reserve = interactive_reserve
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path) if path != ":memory:" else ""
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                name TEXT PRIMARY KEY,
+                level REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS waiters (
+                id TEXT PRIMARY KEY,
+                rank INTEGER NOT NULL,
+                enqueued_at REAL NOT NULL,
+                heartbeat REAL NOT NULL
+            )
+        """)
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMScheduler"]:
+        """Limits from OPENAI_RPM/OPENAI_TPM and OPENAI_RPM_<CLASS>/OPENAI_TPM_<CLASS>.
+
+        0 or unset means unlimited; returns None when no limit is configured at all.
+        """
+        def limits(suffix: str = "") -> Tuple[float, float]:
+            return (float(os.getenv(f"OPENAI_RPM{suffix}", "0") or 0),
+                    float(os.getenv(f"OPENAI_TPM{suffix}", "0") or 0))
+
+        account_limits = limits()
+        class_limits = {priority: limits(f"_{priority.upper()}") for priority in PRIORITY_RANK}
+        if not any(account_limits) and not any(any(value) for value in class_limits.values()):
+            return None
+        return cls(
+            path=os.getenv("OPENAI_SCHEDULER_PATH", ".fodmap_cache/llm_scheduler.sqlite3") or ":memory:",
+            account_limits=account_limits,
+            class_limits=class_limits,
+            interactive_reserve=float(os.getenv("OPENAI_INTERACTIVE_RESERVE", "0.2"))
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """False when no budget is configured, so the gateway can skip admission"""
+        return any(self.account_limits) or any(any(limits) for limits in self.class_limits.values())
+
+    def _buckets(self, priority: str) -> Dict[str, Tuple[float, float]]:
+        """Bucket name -> (per-minute capacity, usable floor) for the buckets this class draws from"""
+        reserve = 0.0 if priority == INTERACTIVE else self.interactive_reserve
+        buckets = {}
+        for unit, limit in zip(("rpm", "tpm"), self.account_limits):
+            if limit:
+                buckets[f"account:{unit}"] = (limit, limit * reserve)
+        for unit, limit in zip(("rpm", "tpm"), self.class_limits.get(priority, (0, 0))):
+            if limit:
+                buckets[f"{priority}:{unit}"] = (limit, 0.0)
+        return buckets
+
+    def _level(self, name: str, capacity: float, now: float) -> float:
+        """Current bucket level after refilling at capacity per minute since the last update"""
+        row = self._conn.execute("SELECT level, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return capacity
+        level, updated_at = row
+        return min(capacity, level + (now - updated_at) * capacity / 60.0)
+
+    def _store(self, name: str, level: float, now: float):
+        self._conn.execute(
+            "INSERT INTO buckets (name, level, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET level = excluded.level, updated_at = excluded.updated_at",
+            (name, level, now)
+        )
+
+    def _try_admit(self, waiter_id: str, priority: str, estimated_tokens: int) -> Optional[float]:
+        """Take the budget if this waiter is at the head of its class and no interactive call waits;
+        otherwise return seconds to wait"""
+        rank = PRIORITY_RANK[priority]
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("UPDATE waiters SET heartbeat = ? WHERE id = ?", (now, waiter_id))
+                self._conn.execute("DELETE FROM waiters WHERE heartbeat < ?", (now - STALE_WAITER_SECONDS,))
+                row = self._conn.execute("SELECT enqueued_at FROM waiters WHERE id = ?", (waiter_id,)).fetchone()
+                if row is None:
+                    # Dropped as stale by another process (e.g. after a long pause); rejoin the queue
+                    self._conn.execute(
+                        "INSERT INTO waiters (id, rank, enqueued_at, heartbeat) VALUES (?, ?, ?, ?)",
+                        (waiter_id, rank, now, now)
+                    )
+                    row = (now,)
+                enqueued_at = row[0]
+                ahead = self._conn.execute(
+                    "SELECT count(*) FROM waiters WHERE (rank = ? AND enqueued_at < ?) OR (rank = ? AND ? > ?)",
+                    (rank, enqueued_at, PRIORITY_RANK[INTERACTIVE], rank, PRIORITY_RANK[INTERACTIVE])
+                ).fetchone()[0]
+                if ahead:
+                    self._conn.execute("COMMIT")
+                    return self.poll_interval
+
+                wait = 0.0
+                updates = {}
+                for name, (capacity, floor) in self._buckets(priority).items():
+                    # A single call larger than the whole budget would otherwise never be admitted
+                    cost = min(1.0 if name.endswith(":rpm") else float(estimated_tokens), capacity - floor)
+                    level = self._level(name, capacity, now)
+                    if level - cost < floor:
+                        wait = max(wait, (floor + cost - level) * 60.0 / capacity)
+                    updates[name] = level - cost
+
+                if wait > 0:
+                    self._conn.execute("COMMIT")
+                    return max(wait, self.poll_interval)
+
+                for name, level in updates.items():
+                    self._store(name, level, now)
+                self._conn.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,))
+                self._conn.execute("COMMIT")
+                return None
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def acquire(self, priority: str, estimated_tokens: int, timeout: float) -> Ticket:
+        """Block until the call fits the budgets of its class and no higher-priority call is waiting"""
+        if priority not in PRIORITY_RANK:
+            raise ValueError(f"Unknown LLM priority: {priority}")
+
+        started = time.monotonic()
+        deadline = started + timeout
+        waiter_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO waiters (id, rank, enqueued_at, heartbeat) VALUES (?, ?, ?, ?)",
+                (waiter_id, PRIORITY_RANK[priority], now, now)
+            )
+
+        try:
+            while True:
+                wait = self._try_admit(waiter_id, priority, estimated_tokens)
+                if wait is None:
+                    return Ticket(priority, estimated_tokens, time.monotonic() - started)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SchedulerTimeout(f"{priority} call not admitted within {timeout:.1f}s")
+                # Poll at least every poll_interval so a newly queued interactive call is noticed quickly
+                time.sleep(min(wait, remaining, self.poll_interval * 4))
+        except BaseException:
+            with self._lock:
+                self._conn.execute("DELETE FROM waiters WHERE id = ?", (waiter_id,))
+            raise
+
+    def settle(self, ticket: Ticket, actual_tokens: Optional[int]):
+        """Correct the token buckets once the real usage is known"""
+        if actual_tokens is None or actual_tokens == ticket.estimated_tokens:
+            return
+        difference = actual_tokens - ticket.estimated_tokens
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for name, (capacity, _) in self._buckets(ticket.priority).items():
+                    if name.endswith(":tpm"):
+                        self._store(name, self._level(name, capacity, now) - difference, now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def queued(self) -> Dict[str, int]:
+        """Waiting calls per priority class, across every process sharing the file"""
+        names = {rank: priority for priority, rank in PRIORITY_RANK.items()}
+        with self._lock:
+            rows = self._conn.execute("SELECT rank, count(*) FROM waiters GROUP BY rank").fetchall()
+        return {names.get(rank, str(rank)): count for rank, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,267 @@
+from typing import Any, Coroutine, Dict, Optional, Tuple
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
+import atexit
+import os
+import threading
+import time
+from neo4j import AsyncGraphDatabase, GraphDatabase
+from .llm_gateway import LLMGateway
+
+
+class _PoolInstrumentation:
+    """Session bound and pool metrics shared by the sync and async driver wrappers"""
+
+    def __init__(self, driver, max_pool_size: int, acquisition_timeout: float):
+        self._driver = driver
+        self.max_pool_size = max_pool_size
+        self.acquisition_timeout = acquisition_timeout
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._acquisitions = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _acquired(self, waited: float):
+        with self._lock:
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            self._acquisitions += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+    def _released(self):
+        with self._lock:
+            self._in_use -= 1
+
+    def _timed_out(self) -> TimeoutError:
+        return TimeoutError(f"Timed out after {self.acquisition_timeout}s waiting for a Neo4j connection")
+
+    def metrics(self) -> Dict[str, float]:
+        """Sessions in use now and at peak, plus acquisition wait times.
+
+        These count sessions opened through this wrapper; the driver does not expose how many
+        idle connections its pool is holding, so no idle count is reported.
+        """
+        with self._lock:
+            return {
+                "max_pool_size": self.max_pool_size,
+                "in_use": self._in_use,
+                "peak_in_use": self._peak_in_use,
+                "acquisitions": self._acquisitions,
+                "avg_acquisition_wait_ms": (
+                    self._wait_total / self._acquisitions * 1000 if self._acquisitions else 0.0
+                ),
+                "max_acquisition_wait_ms": self._wait_max * 1000
+            }
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._driver, name)
+
+
+class InstrumentedDriver(_PoolInstrumentation):
+    """Neo4j driver wrapper that bounds concurrent sessions to the pool size and records pool metrics"""
+
+    def __init__(self, driver, max_pool_size: int, acquisition_timeout: float):
+        super().__init__(driver, max_pool_size, acquisition_timeout)
+        self._slots = threading.BoundedSemaphore(max_pool_size)
+
+    @contextmanager
+    def session(self, **kwargs):
+        """Wait for a free pool slot, then open a session on it"""
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.acquisition_timeout):
+            raise self._timed_out()
+        self._acquired(time.perf_counter() - started)
+
+        try:
+            with self._driver.session(**kwargs) as session:
+                yield session
+        finally:
+            self._released()
+            self._slots.release()
+
+    def close(self):
+        self._driver.close()
+
+
+class InstrumentedAsyncDriver(_PoolInstrumentation):
+    """Async twin of InstrumentedDriver; use it from a single event loop"""
+
+    def __init__(self, driver, max_pool_size: int, acquisition_timeout: float):
+        super().__init__(driver, max_pool_size, acquisition_timeout)
+        self._slots = asyncio.BoundedSemaphore(max_pool_size)
+
+    @asynccontextmanager
+    async def session(self, **kwargs):
+        """Wait for a free pool slot without blocking the loop, then open a session on it"""
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquisition_timeout)
+        except asyncio.TimeoutError:
+            raise self._timed_out() from None
+        self._acquired(time.perf_counter() - started)
+
+        try:
+            async with self._driver.session(**kwargs) as session:
+                yield session
+        finally:
+            self._released()
+            self._slots.release()
+
+    async def close(self):
+        await self._driver.close()
+
+
+class BackgroundEventLoop:
+    """One asyncio loop on a daemon thread; blocking callers submit coroutines to it and wait"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="fodmap-event-loop", daemon=True)
+        self._thread.start()
+
+    def run(self, coroutine: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and block until it finishes"""
+        if threading.current_thread() is self._thread:
+            coroutine.close()
+            raise RuntimeError("Blocking wrapper called on the event loop thread; await the async method instead")
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+class ResourceRegistry:
+    """Process-wide owner of long-lived clients, shared across Streamlit sessions and reruns"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._drivers: Dict[Tuple[str, str], InstrumentedDriver] = {}
+        self._llm_gateways: Dict[str, LLMGateway] = {}
+        self._async_drivers: Dict[Tuple[str, str], Any] = {}
+        self._event_loop: Optional[BackgroundEventLoop] = None
+        atexit.register(self.close)
+
+    def neo4j_driver(self, uri: str, user: str, password: str) -> InstrumentedDriver:
+        """One driver per (uri, user), created with tuned pool settings on first use"""
+        key = (uri, user)
+        with self._lock:
+            driver = self._drivers.get(key)
+            if driver is None:
+                max_pool_size = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+                acquisition_timeout = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "10"))
+                driver = InstrumentedDriver(
+                    GraphDatabase.driver(
+                        uri,
+                        auth=(user, password),
+                        max_connection_pool_size=max_pool_size,
+                        connection_acquisition_timeout=acquisition_timeout,
+                        max_connection_lifetime=float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600")),
+                        keep_alive=True
+                    ),
+                    max_pool_size,
+                    acquisition_timeout
+                )
+                self._drivers[key] = driver
+            return driver
+
+    def llm_gateway(self, api_key: str) -> LLMGateway:
+        """One LLM gateway (and HTTP connection pool) per API key, configured from the environment"""
+        with self._lock:
+            gateway = self._llm_gateways.get(api_key)
+            if gateway is None:
+                gateway = LLMGateway.from_env(api_key)
+                self._llm_gateways[api_key] = gateway
+            return gateway
+
+    def neo4j_async_driver(self, uri: str, user: str, password: str) -> InstrumentedAsyncDriver:
+        """Async driver for the same database, with the same pool settings and metrics; use it from a single event loop"""
+        key = (uri, user)
+        with self._lock:
+            driver = self._async_drivers.get(key)
+            if driver is None:
+                max_pool_size = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+                acquisition_timeout = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", "10"))
+                driver = InstrumentedAsyncDriver(
+                    AsyncGraphDatabase.driver(
+                        uri,
+                        auth=(user, password),
+                        max_connection_pool_size=max_pool_size,
+                        connection_acquisition_timeout=acquisition_timeout,
+                        max_connection_lifetime=float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600")),
+                        keep_alive=True
+                    ),
+                    max_pool_size,
+                    acquisition_timeout
+                )
+                self._async_drivers[key] = driver
+            return driver
+
+    def event_loop(self) -> BackgroundEventLoop:
+        """The process-wide loop that runs the async pipeline behind the blocking API"""
+        with self._lock:
+            if self._event_loop is None:
+                self._event_loop = BackgroundEventLoop()
+            return self._event_loop
+
+    def pool_metrics(self) -> Dict[str, Dict[str, float]]:
+        """Metrics per driver, keyed by URI; drivers used by the async pipeline are suffixed with (async)"""
+        with self._lock:
+            drivers = dict(self._drivers)
+            async_drivers = dict(self._async_drivers)
+        metrics = {uri: driver.metrics() for (uri, _), driver in drivers.items()}
+        metrics.update({f"{uri} (async)": driver.metrics() for (uri, _), driver in async_drivers.items()})
+        return metrics
+
+    def close(self):
+        """Close every driver and client; registered to run at interpreter shutdown"""
+        with self._lock:
+            drivers = list(self._drivers.values())
+            async_drivers = list(self._async_drivers.values())
+            gateways = list(self._llm_gateways.values())
+            event_loop = self._event_loop
+            self._drivers.clear()
+            self._async_drivers.clear()
+            self._llm_gateways.clear()
+            self._event_loop = None
+        for driver in drivers:
+            try:
+                driver.close()
+            except Exception as e:
+                print(f"Error closing Neo4j driver: {str(e)}")
+        for gateway in gateways:
+            try:
+                gateway.close()
+            except Exception as e:
+                print(f"Error closing LLM gateway: {str(e)}")
+        if event_loop is not None:
+            for driver in async_drivers:
+                try:
+                    event_loop.run(driver.close(), timeout=5)
+                except Exception as e:
+                    print(f"Error closing async Neo4j driver: {str(e)}")
+            event_loop.close()
+
+
+_registry = ResourceRegistry()
+
+
+def get_registry() -> ResourceRegistry:
+    return _registry
+
+
+def run_sync(coroutine: Coroutine, timeout: Optional[float] = None) -> Any:
+    """Blocking wrapper used by the synchronous API: run a pipeline coroutine on the shared loop"""
+    return _registry.event_loop().run(coroutine, timeout)
+
+
+def on_event_loop() -> bool:
+    """True when called from a coroutine or callback, where blocking I/O would stall the whole loop"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
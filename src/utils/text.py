@@ -0,0 +1,62 @@
+from typing import List
+
+
+def turkish_lower(text: str) -> str:
+    """Lowercase with Turkish dotted/dotless I rules (I -> ı, İ -> i)"""
+    return text.replace("I", "ı").replace("İ", "i").lower()
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a food or dish name for lookups (case and whitespace insensitive)"""
+    if not name:
+        return ""
+    return " ".join(turkish_lower(name).split())
+
+
+def normalize_query(text: str) -> str:
+    """Normalize free-text user input so trivially different phrasings share a cache key"""
+    return normalize_name(text).strip(" \t\"'.,!?;:")
+
+
+# Turkish letters and circumflex vowels mapped to what users type on a keyboard without them
+ASCII_FOLDING = str.maketrans("çğıöşüâîû", "cgiosuaiu")
+
+
+def fold_diacritics(text: str) -> str:
+    """normalize_name, then strip Turkish diacritics so "soğan" and "sogan" compare equal"""
+    return normalize_name(text).translate(ASCII_FOLDING)
+
+
+# Common Turkish inflectional suffixes, longest first
+TURKISH_SUFFIXES = sorted([
+    "lerden", "lardan", "lerde", "larda", "leri", "ları", "ler", "lar",
+    "nın", "nin", "nun", "nün", "dan", "den", "tan", "ten", "yla", "yle",
+    "sız", "siz", "suz", "süz", "lı", "li", "lu", "lü",
+    "yı", "yi", "yu", "yü", "sı", "si", "su", "sü", "ya", "ye",
+    "da", "de", "ta", "te", "ı", "i", "u", "ü", "a", "e"
+], key=len, reverse=True)
+
+SOFTENED_CONSONANTS = {"ğ": "k", "b": "p", "c": "ç", "d": "t"}
+
+
+def turkish_stem_candidates(word: str, min_length: int = 3, max_suffixes: int = 2) -> List[str]:
+    """The word plus the stems left after stripping up to max_suffixes Turkish suffixes"""
+    candidates = [word]
+    frontier = [word]
+    for _ in range(max_suffixes):
+        next_frontier = []
+        for current in frontier:
+            for suffix in TURKISH_SUFFIXES:
+                if not current.endswith(suffix) or len(current) - len(suffix) < min_length:
+                    continue
+                stem = current[:-len(suffix)]
+                # Undo consonant softening before a vowel suffix (sarımsağı -> sarımsak)
+                variants = [stem]
+                if stem[-1] in SOFTENED_CONSONANTS:
+                    variants.append(stem[:-1] + SOFTENED_CONSONANTS[stem[-1]])
+                for variant in variants:
+                    if variant not in candidates:
+                        candidates.append(variant)
+                        next_frontier.append(variant)
+        frontier = next_frontier
+    return candidates
@@ -0,0 +1,90 @@
+import argparse
+import json
+import random
+import statistics
+import time
+from src.database.fuzzy_matcher import FuzzyMatcher
+from src.database.knowledge_snapshot import records_from_data
+from src.utils.text import fold_diacritics
+
+SYLLABLES = ["ka", "ba", "ğa", "şe", "çi", "lı", "mu", "sü", "ör", "te", "pa", "rı", "ya", "don",
+             "sar", "ım", "bi", "ber", "pat", "can", "ma", "nar", "zey", "tin", "fıs", "tık", "üz", "üm"]
+
+
+def synthetic_catalog(size: int, seed: int = 7) -> list:
+    """size unique Turkish-looking food names of one to three words"""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < size:
+        words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+                 for _ in range(rng.choice((1, 1, 2, 3)))]
+        names.add(" ".join(words))
+    return sorted(names)
+
+
+def misspell(name: str, rng: random.Random) -> str:
+    """What a user typing quickly on an ASCII keyboard might produce"""
+    typed = fold_diacritics(name)
+    if len(typed) > 5 and rng.random() < 0.7:
+        position = rng.randrange(1, len(typed) - 1)
+        edit = rng.choice(("drop", "substitute", "double"))
+        if edit == "drop":
+            typed = typed[:position] + typed[position + 1:]
+        elif edit == "substitute":
+            typed = typed[:position] + rng.choice("aeiklmnrst") + typed[position + 1:]
+        else:
+            typed = typed[:position] + typed[position] + typed[position:]
+    return typed
+
+
+def run(matcher: FuzzyMatcher, queries: list) -> dict:
+    timings = []
+    correct = 0
+    for query, expected in queries:
+        started = time.perf_counter()
+        matches = matcher.match(query)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+        correct += bool(matches) and matches[0].food == expected
+
+    timings.sort()
+    return {
+        "queries": len(queries),
+        "top1_accuracy": correct / len(queries),
+        "p50_us": statistics.median(timings),
+        "p95_us": timings[int(0.95 * (len(timings) - 1))],
+        "p99_us": timings[int(0.99 * (len(timings) - 1))],
+        "max_us": timings[-1]
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark the fuzzy ingredient matcher")
+    arg_parser.add_argument("--names", type=int, default=10000, help="synthetic catalog size")
+    arg_parser.add_argument("--queries", type=int, default=5000)
+    arg_parser.add_argument("--data", default="tests/fodmap_sample_data.json",
+                            help="real foods to mix into the catalog")
+    args = arg_parser.parse_args()
+
+    rng = random.Random(11)
+    with open(args.data, "r", encoding="utf-8") as f:
+        records = records_from_data(json.load(f))
+    pairs = [(record["name"], record["name"]) for record in records]
+    pairs += [(alt, record["name"]) for record in records for alt in record["alternative_names"]]
+    pairs += [(name, name) for name in synthetic_catalog(args.names)]
+
+    started = time.perf_counter()
+    matcher = FuzzyMatcher.from_names(pairs)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f"Indexed {len(pairs)} names in {build_ms:.0f} ms")
+
+    sampled = [rng.choice(pairs) for _ in range(args.queries)]
+    folded_only = [(fold_diacritics(surface), food) for surface, food in sampled]
+    typos = [(misspell(surface, rng), food) for surface, food in sampled]
+
+    for label, queries in (("diacritics dropped", folded_only), ("diacritics dropped + typo", typos)):
+        report = run(matcher, queries)
+        print(f"{label}: top-1 {report['top1_accuracy']:.1%}, p50 {report['p50_us']:.0f} µs, "
+              f"p95 {report['p95_us']:.0f} µs, p99 {report['p99_us']:.0f} µs, max {report['max_us']:.0f} µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from tests.fake_openai import FakeOpenAIServer
+from src.database.knowledge_snapshot import FODMAPKnowledgeSnapshot, records_from_data
+from src.database.sqlite_backend import SQLiteGraphBackend
+from src.utils.constants import MEAL_ANALYSIS_PROMPT, QUERY_CLASSIFICATION_PROMPT
+from src.utils.resources import run_sync
+
+# Pipeline stages in request order; "context_assembly" is get_relevant_context minus the stages it calls.
+# "graph_query" is the wait for graph results after classification; prefetched lookups overlap classify_query.
+STAGES = ("classify_query", "analyze_meals", "analyze_meal", "graph_query", "context_assembly",
+          "completion_first_token", "completion", "request")
+
+COMPLETION_TEXT = ("Bu besin düşük FODMAP diyetinde dikkatli tüketilmelidir. Porsiyon kontrolü önemlidir "
+                   "ve belirtilerinizi takip etmeniz önerilir. ") * 4
+
+
+def meal_item(query: str) -> str:
+    """The dish a scripted classification names for a meal question: its first word"""
+    return query.split()[0].strip("?,.").lower()
+
+
+class ScriptedResponder:
+    """Answers each call site of the pipeline with the test case's expected outcome"""
+
+    def __init__(self, test_cases: List[Dict]):
+        self.classifications = {}
+        self.meals = {}
+        for case in test_cases:
+            query_type = case["expected_classification"]
+            if query_type == "meal":
+                item = meal_item(case["query"])
+                self.meals[item] = {
+                    "dish_name": item,
+                    "ingredients": [{"name": node, "is_main_ingredient": True, "typical_preparation": "pişmiş"}
+                                    for node in case["expected_nodes"]]
+                }
+            else:
+                item = case["expected_nodes"][0] if case["expected_nodes"] else case["query"].lower()
+            self.classifications[case["query"]] = {"query_type": query_type, "identified_items": [item]}
+
+    def __call__(self, request: Dict) -> str:
+        messages = request.get("messages", [])
+        system = messages[0]["content"] if messages else ""
+        user = messages[-1]["content"] if messages else ""
+        quoted = user.split('"')[1] if user.count('"') >= 2 else user
+        if system == QUERY_CLASSIFICATION_PROMPT:
+            return json.dumps(self.classifications.get(
+                quoted, {"query_type": "general", "identified_items": []}), ensure_ascii=False)
+        if system == MEAL_ANALYSIS_PROMPT:
+            return json.dumps(self.meals.get(quoted, {"dish_name": quoted, "ingredients": []}), ensure_ascii=False)
+        return COMPLETION_TEXT
+
+
+class StageTimer:
+    """Collects per-stage durations across threads and tasks, plus per-request sums for the current request.
+
+    The per-request sums live in a context variable: run_sync hands the caller's context to the
+    pipeline's task on the event loop, so stages timed there still add to the caller's request.
+    """
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._request = contextvars.ContextVar("stage_timer_request", default=None)
+
+    def begin_request(self):
+        self._request.set(defaultdict(float))
+
+    def request_total(self, stage: str) -> float:
+        return (self._request.get() or {}).get(stage, 0.0)
+
+    def add(self, stage: str, elapsed_ms: float):
+        with self._lock:
+            self.samples[stage].append(elapsed_ms)
+            stages = self._request.get()
+            if stages is not None:
+                stages[stage] += elapsed_ms
+
+    def wrap(self, stage: str, function):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(stage, (time.perf_counter() - started) * 1000)
+        return timed
+
+    def awrap(self, stage: str, function):
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                self.add(stage, (time.perf_counter() - started) * 1000)
+        return timed
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(p * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 0.50), 2),
+        "p95_ms": round(percentile(values, 0.95), 2),
+        "p99_ms": round(percentile(values, 0.99), 2),
+        "max_ms": round(values[-1], 2) if values else 0.0
+    }
+
+
+def start_stub_backends(test_cases: List[Dict], llm_latency: float, token_latency: float,
+                        **server_options) -> FakeOpenAIServer:
+    """Fake OpenAI server scripted from the test cases, with the pipeline pointed at it"""
+    server = FakeOpenAIServer(ScriptedResponder(test_cases), latency=llm_latency,
+                              token_latency=token_latency, **server_options).start()
+    # Every run starts cold: no shared LLM cache or dish catalog, so each stage does its full work
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["FODMAP_LLM_CACHE_PATH"] = ""
+    os.environ["FODMAP_DISH_CATALOG_PATH"] = ""
+    return server
+
+
+def with_latency(function, latency: float):
+    async def delayed(*args, **kwargs):
+        await asyncio.sleep(latency)
+        return await function(*args, **kwargs)
+    return delayed
+
+
+def build_chatbot(args, timer: StageTimer):
+    """AIFODMAPChatbot against the fake server, with its stages wrapped by the timer"""
+    from src.chatbot.ai_chatbot import AIFODMAPChatbot
+
+    snapshot = None
+    backend = None
+    if args.graph == "snapshot":
+        with open(args.data, "r", encoding="utf-8") as f:
+            snapshot = FODMAPKnowledgeSnapshot(None)
+            snapshot.load_records(records_from_data(json.load(f)))
+    elif args.graph == "sqlite":
+        backend = SQLiteGraphBackend(":memory:")
+        backend.load_file(args.data)
+
+    chatbot = AIFODMAPChatbot(
+        os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+        os.getenv("NEO4J_USER", "neo4j"),
+        os.getenv("NEO4J_PASSWORD", ""),
+        os.getenv("OPENAI_API_KEY", "bench"),
+        snapshot=snapshot,
+        backend=backend
+    )
+    processor = chatbot.query_processor
+    if args.llm_classify and processor.local_classifier is not None:
+        # Every query goes to the LLM, but the vocabulary still drives speculative lookups
+        processor.local_classifier.min_confidence = float("inf")
+    if not args.speculate:
+        processor.speculative_lookups = 0
+    if args.graph_latency:
+        # Stand-in for a Neo4j round trip, so the in-process graphs show what overlapping lookups saves
+        for source in (chatbot.snapshot, chatbot.backend):
+            if source is not None:
+                source.aanswer = with_latency(source.aanswer, args.graph_latency)
+
+    # The pipeline runs on the shared event loop; the blocking methods only wrap these
+    processor.aclassify_query = timer.awrap("classify_query", processor.aclassify_query)
+    processor.aanalyze_meals = timer.awrap("analyze_meals", processor.aanalyze_meals)
+    processor.meal_analyzer.aanalyze_meal = timer.awrap("analyze_meal", processor.meal_analyzer.aanalyze_meal)
+    chatbot.arun_queries = timer.awrap("graph_query", chatbot.arun_queries)
+    return chatbot
+
+
+async def arun_request(chatbot, timer: StageTimer, query: str, stream: bool):
+    """One request through the same stages the app runs, on the pipeline's event loop"""
+    timer.begin_request()
+    started = time.perf_counter()
+
+    context, _ = await chatbot.aget_relevant_context(query)
+    context_ms = (time.perf_counter() - started) * 1000
+    timer.add("context_assembly", context_ms - sum(
+        timer.request_total(stage) for stage in ("classify_query", "analyze_meals", "graph_query")))
+
+    messages = chatbot.build_messages(query, context)
+    completion_started = time.perf_counter()
+    if stream:
+        first_token = None
+        async for _ in chatbot.gateway.astream_chat("generate_response", messages, temperature=0.7, max_tokens=500):
+            if first_token is None:
+                first_token = time.perf_counter()
+                timer.add("completion_first_token", (first_token - completion_started) * 1000)
+    else:
+        await chatbot.gateway.achat("generate_response", messages, temperature=0.7, max_tokens=500)
+    finished = time.perf_counter()
+    timer.add("completion", (finished - completion_started) * 1000)
+    timer.add("request", (finished - started) * 1000)
+
+
+def run_request(chatbot, timer: StageTimer, query: str, stream: bool):
+    run_sync(arun_request(chatbot, timer, query, stream))
+
+
+def run_benchmark(args) -> Dict:
+    with open(args.test_cases, "r", encoding="utf-8") as f:
+        test_cases = json.load(f)["test_cases"]
+    queries = [case["query"] for case in test_cases]
+
+    server = start_stub_backends(test_cases, args.llm_latency, args.token_latency)
+    try:
+        timer = StageTimer()
+        chatbot = build_chatbot(args, timer)
+
+        for query in queries[:args.warmup]:
+            run_request(chatbot, timer, query, args.stream)
+        timer.samples.clear()
+        chatbot.speculation.update(prefetched=0, reused=0, discarded=0)
+
+        errors = 0
+        workload = [queries[i % len(queries)] for i in range(args.requests)]
+
+        def safe_request(query: str) -> bool:
+            try:
+                run_request(chatbot, timer, query, args.stream)
+                return True
+            except Exception as e:
+                print(f"Request failed ({query}): {str(e)}")
+                return False
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for ok in executor.map(safe_request, workload):
+                errors += not ok
+        wall = time.perf_counter() - started
+        speculation = dict(chatbot.speculation)
+    finally:
+        server.stop()
+
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "graph": args.graph,
+            "stream": args.stream,
+            "llm_classify": args.llm_classify,
+            "speculate": args.speculate,
+            "graph_latency_ms": args.graph_latency * 1000,
+            "llm_latency_ms": args.llm_latency * 1000,
+            "token_latency_ms": args.token_latency * 1000
+        },
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round((args.requests - errors) / wall, 2) if wall else 0.0,
+        "stages": {stage: summarize(timer.samples[stage]) for stage in STAGES if timer.samples.get(stage)},
+        "speculation": speculation
+    }
+
+
+def compare_runs(baseline: Dict, current: Dict, threshold: float = 0.2) -> List[str]:
+    """Stages whose p95 grew, or a throughput drop, by more than threshold relative to the baseline"""
+    regressions = []
+    for stage, before in baseline.get("stages", {}).items():
+        after = current["stages"].get(stage)
+        if after is None:
+            continue
+        old, new = before["p95_ms"], after["p95_ms"]
+        if old and (new - old) / old > threshold:
+            regressions.append(f"{stage} p95 {old:.1f} -> {new:.1f} ms")
+    old_rps, new_rps = baseline.get("throughput_rps"), current["throughput_rps"]
+    if old_rps and (old_rps - new_rps) / old_rps > threshold:
+        regressions.append(f"throughput {old_rps:.1f} -> {new_rps:.1f} req/s")
+    return regressions
+
+
+def print_report(report: Dict):
+    print(f"{report['config']['requests']} requests, concurrency {report['config']['concurrency']}: "
+          f"{report['throughput_rps']:.1f} req/s, {report['errors']} errors")
+    print(f"{'stage':<24}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<24}{stats['count']:>7}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+    speculation = report.get("speculation")
+    if speculation:
+        print(f"Speculative lookups: {speculation['prefetched']} prefetched, {speculation['reused']} reused, "
+              f"{speculation['discarded']} discarded")
+
+
+def main(argv: Optional[List[str]] = None):
+    arg_parser = argparse.ArgumentParser(description="Per-stage latency benchmark of the chatbot pipeline")
+    arg_parser.add_argument("--requests", type=int, default=200)
+    arg_parser.add_argument("--concurrency", type=int, default=8)
+    arg_parser.add_argument("--warmup", type=int, default=10, help="requests run before measuring")
+    arg_parser.add_argument("--llm-latency", type=float, default=0.05, help="fake OpenAI delay per call (s)")
+    arg_parser.add_argument("--token-latency", type=float, default=0.002, help="delay per streamed token (s)")
+    arg_parser.add_argument("--graph", choices=("snapshot", "sqlite", "neo4j"), default="snapshot",
+                            help="snapshot or sqlite: in-process graph seeded from --data; neo4j: the graph at NEO4J_URI")
+    arg_parser.add_argument("--data", default="tests/fodmap_sample_data.json")
+    arg_parser.add_argument("--test-cases", default="tests/test_cases.json")
+    arg_parser.add_argument("--no-stream", dest="stream", action="store_false",
+                            help="time the completion as one non-streaming call")
+    arg_parser.add_argument("--llm-classify", action="store_true",
+                            help="skip the local classifier so every query is classified by the LLM")
+    arg_parser.add_argument("--no-speculate", dest="speculate", action="store_false",
+                            help="wait for classification before any graph lookup")
+    arg_parser.add_argument("--graph-latency", type=float, default=0.0,
+                            help="delay added to every graph lookup (s), e.g. a Neo4j round trip")
+    arg_parser.add_argument("--output", default="bench_pipeline.json", help="where to write this run")
+    arg_parser.add_argument("--baseline", help="earlier run to compare against; exits 1 on regressions")
+    arg_parser.add_argument("--threshold", type=float, default=0.2,
+                            help="relative change reported as a regression")
+    args = arg_parser.parse_args(argv)
+
+    report = run_benchmark(args)
+    print_report(report)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_runs(json.load(f), report, args.threshold)
+        for regression in regressions:
+            print(f"❌ {regression}")
+        if regressions:
+            raise SystemExit(1)
+        print("✅ No regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
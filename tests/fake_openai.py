@@ -0,0 +1,156 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+
+def _default_responder(request: Dict) -> str:
+    return "Bu yanıt test sunucusundan geliyor."
+
+
+def fake_embedding(text: str, dimensions: int = 64) -> List[float]:
+    """Deterministic pseudo-embedding so similarities are stable across runs"""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [(digest[i % len(digest)] - 128) / 128.0 for i in range(dimensions)]
+
+
+class FakeOpenAIServer:
+    """Local OpenAI-compatible HTTP server with configurable latency and scripted failures.
+
+    Serves /v1/chat/completions (plain and streaming) and /v1/embeddings. `responder`
+    receives the decoded request body and returns the assistant message content.
+    `fail_statuses` is consumed in order, one status per request, before requests succeed.
+    After that, each request fails with `failure_status` with probability `failure_rate`.
+    """
+
+    def __init__(self, responder: Callable[[Dict], str] = _default_responder, latency: float = 0.0,
+                 token_latency: float = 0.0, fail_statuses: Optional[List[int]] = None,
+                 failure_rate: float = 0.0, failure_status: int = 503, seed: Optional[int] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.responder = responder
+        self.latency = latency
+        self.token_latency = token_latency
+        self.fail_statuses = list(fail_statuses or [])
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self._random = random.Random(seed)
+        self.requests: List[Dict] = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                with server._lock:
+                    server.requests.append({"path": self.path, "body": request})
+                    status = server.fail_statuses.pop(0) if server.fail_statuses else None
+                    if status is None and server.failure_rate and server._random.random() < server.failure_rate:
+                        status = server.failure_status
+
+                if server.latency:
+                    time.sleep(server.latency)
+
+                if status is not None:
+                    self._send_json(status, {"error": {"message": f"scripted {status}", "type": "fake"}},
+                                    {"retry-after": "0"} if status == 429 else None)
+                    return
+
+                if self.path.endswith("/embeddings"):
+                    inputs = request["input"] if isinstance(request["input"], list) else [request["input"]]
+                    self._send_json(200, {
+                        "object": "list",
+                        "model": request.get("model"),
+                        "data": [{"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+                                 for i, text in enumerate(inputs)],
+                        "usage": {"prompt_tokens": sum(len(t.split()) for t in inputs),
+                                  "total_tokens": sum(len(t.split()) for t in inputs)}
+                    })
+                elif self.path.endswith("/chat/completions"):
+                    content = server.responder(request)
+                    if request.get("stream"):
+                        self._stream(request, content)
+                    else:
+                        self._send_json(200, self._completion(request, content))
+                else:
+                    self._send_json(404, {"error": {"message": "not found"}})
+
+            def _completion(self, request: Dict, content: str) -> Dict:
+                prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+                return {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content.split()),
+                              "total_tokens": prompt_tokens + len(content.split())}
+                }
+
+            def _stream(self, request: Dict, content: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                tokens = [word + " " for word in content.split(" ")]
+                for token in tokens:
+                    if server.token_latency:
+                        time.sleep(server.token_latency)
+                    chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk",
+                             "created": int(time.time()), "model": request.get("model"),
+                             "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                usage = self._completion(request, content)["usage"]
+                final = {"id": "chatcmpl-fake", "object": "chat.completion.chunk",
+                         "created": int(time.time()), "model": request.get("model"),
+                         "choices": [], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
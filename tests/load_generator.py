@@ -0,0 +1,212 @@
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from tests.bench_pipeline import StageTimer, build_chatbot, run_request, start_stub_backends, summarize
+from src.database.knowledge_snapshot import records_from_data
+from src.utils.resources import get_registry
+
+# Question shapes users actually type, filled with foods and groups from the data file
+INGREDIENT_TEMPLATES = ("{} yiyebilir miyim?", "{} FODMAP açısından uygun mu?", "{} tüketmek sorun olur mu?",
+                        "IBS için {} güvenli mi?")
+GROUP_TEMPLATES = ("Hangi {} güvenli?", "{} arasında düşük FODMAP olanlar hangileri?")
+
+
+def build_corpus(test_cases: List[Dict], data_path: Optional[str] = None, extra_paths: List[str] = (),
+                 expand: int = 0, seed: int = 7) -> List[str]:
+    """Test-case questions, plus one question per line from extra files, plus `expand` generated ones"""
+    corpus = [case["query"] for case in test_cases]
+    for path in extra_paths:
+        with open(path, "r", encoding="utf-8") as f:
+            corpus.extend(line.strip() for line in f if line.strip())
+
+    if expand and data_path:
+        with open(data_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        foods = [record["name"] for record in records_from_data(data)]
+        groups = [group["name"] for group in data.get("standard_food_groups", [])]
+        rng = random.Random(seed)
+        for _ in range(expand):
+            if groups and rng.random() < 0.2:
+                corpus.append(rng.choice(GROUP_TEMPLATES).format(rng.choice(groups).lower()))
+            elif foods:
+                corpus.append(rng.choice(INGREDIENT_TEMPLATES).format(rng.choice(foods)))
+    return corpus
+
+
+class InFlight:
+    """Counts requests between arrival and completion, keeping the peak"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+
+    def enter(self):
+        with self._lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+
+    def leave(self):
+        with self._lock:
+            self.current -= 1
+
+
+def run_step(chatbot, corpus: List[str], rate: float, duration: float, executor: ThreadPoolExecutor,
+             rng: random.Random, stream: bool, slo_ms: float) -> Dict:
+    """Open-loop load at `rate` requests/s with Poisson arrivals for `duration` seconds.
+
+    Latency is measured from each request's scheduled arrival, so time spent waiting for a free
+    user thread counts against it instead of silently lowering the offered load.
+    """
+    timer = StageTimer()
+    in_flight = InFlight()
+    outcomes = []
+    outcomes_lock = threading.Lock()
+
+    def user_request(query: str, arrival: float):
+        ok = True
+        try:
+            run_request(chatbot, timer, query, stream)
+        except Exception as e:
+            ok = False
+            print(f"Request failed ({query}): {str(e)}")
+        finished = time.perf_counter()
+        in_flight.leave()
+        with outcomes_lock:
+            outcomes.append(((finished - arrival) * 1000, ok, finished))
+
+    started = time.perf_counter()
+    offset = rng.expovariate(rate)
+    futures = []
+    while offset < duration:
+        arrival = started + offset
+        delay = arrival - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        in_flight.enter()
+        futures.append(executor.submit(user_request, rng.choice(corpus), arrival))
+        offset += rng.expovariate(rate)
+    for future in futures:
+        future.result()
+
+    latencies = [latency for latency, _, _ in outcomes]
+    errors = sum(1 for _, ok, _ in outcomes if not ok)
+    slo_misses = sum(1 for latency, ok, _ in outcomes if ok and latency > slo_ms)
+    elapsed = max((finished for _, _, finished in outcomes), default=started) - started
+    return {
+        "offered_rps": rate,
+        "requests": len(outcomes),
+        "achieved_rps": round(len(outcomes) / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(errors / len(outcomes), 4) if outcomes else 0.0,
+        "slo_miss_rate": round(slo_misses / len(outcomes), 4) if outcomes else 0.0,
+        "peak_concurrency": in_flight.peak,
+        # Little's law: mean requests in the system over the step
+        "mean_concurrency": round(sum(latencies) / 1000 / elapsed, 2) if elapsed else 0.0,
+        "latency": summarize(latencies),
+        "stages_p95_ms": {stage: summarize(samples)["p95_ms"] for stage, samples in timer.samples.items()}
+    }
+
+
+def find_knee(steps: List[Dict], degradation: float = 2.0, max_error_rate: float = 0.01) -> Optional[Dict]:
+    """First step whose p95 exceeds `degradation` times the best p95 of the lighter steps, or whose errors exceed the limit"""
+    reference = None
+    for step in steps:
+        if step["error_rate"] > max_error_rate:
+            return {"offered_rps": step["offered_rps"], "mean_concurrency": step["mean_concurrency"],
+                    "peak_concurrency": step["peak_concurrency"], "reason": f"error rate {step['error_rate']:.1%}"}
+        if reference and step["latency"]["p95_ms"] > degradation * reference:
+            return {"offered_rps": step["offered_rps"], "mean_concurrency": step["mean_concurrency"],
+                    "peak_concurrency": step["peak_concurrency"],
+                    "reason": f"p95 {step['latency']['p95_ms']:.0f} ms > {degradation:g}x {reference:.0f} ms"}
+        # A running minimum keeps one noisy light step from hiding the knee
+        if step["requests"] and (reference is None or step["latency"]["p95_ms"] < reference):
+            reference = step["latency"]["p95_ms"]
+    return None
+
+
+def main(argv: Optional[List[str]] = None):
+    arg_parser = argparse.ArgumentParser(description="Replay Turkish questions against the pipeline at rising load")
+    arg_parser.add_argument("--rates", default="2,5,10,20,40,80",
+                            help="comma-separated arrival rates (requests/s), one step each")
+    arg_parser.add_argument("--duration", type=float, default=15.0, help="seconds per step")
+    arg_parser.add_argument("--warmup", type=int, default=10, help="requests run before the first step")
+    arg_parser.add_argument("--max-users", type=int, default=500, help="simultaneous users (worker threads)")
+    arg_parser.add_argument("--corpus", action="append", default=[],
+                            help="extra questions, one per line; may be repeated")
+    arg_parser.add_argument("--expand", type=int, default=200,
+                            help="questions generated from foods and groups in --data")
+    arg_parser.add_argument("--llm-latency", type=float, default=0.3, help="fake OpenAI delay per call (s)")
+    arg_parser.add_argument("--token-latency", type=float, default=0.01, help="delay per streamed token (s)")
+    arg_parser.add_argument("--llm-failure-rate", type=float, default=0.0,
+                            help="fraction of fake OpenAI calls answered with 503")
+    arg_parser.add_argument("--graph", choices=("snapshot", "sqlite", "neo4j"), default="snapshot",
+                            help="snapshot or sqlite: in-process graph seeded from --data; neo4j: the graph at NEO4J_URI")
+    arg_parser.add_argument("--data", default="tests/fodmap_sample_data.json")
+    arg_parser.add_argument("--test-cases", default="tests/test_cases.json")
+    arg_parser.add_argument("--no-stream", dest="stream", action="store_false")
+    arg_parser.add_argument("--llm-classify", action="store_true",
+                            help="skip the local classifier so every query is classified by the LLM")
+    arg_parser.add_argument("--no-speculate", dest="speculate", action="store_false",
+                            help="wait for classification before any graph lookup")
+    arg_parser.add_argument("--graph-latency", type=float, default=0.0,
+                            help="delay added to every graph lookup (s), e.g. a Neo4j round trip")
+    arg_parser.add_argument("--slo-ms", type=float, default=5000.0, help="latency counted as an SLO miss")
+    arg_parser.add_argument("--degradation", type=float, default=2.0,
+                            help="p95 growth over the lightest step that marks the knee")
+    arg_parser.add_argument("--max-error-rate", type=float, default=0.01)
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--output", default="load_report.json")
+    args = arg_parser.parse_args(argv)
+
+    with open(args.test_cases, "r", encoding="utf-8") as f:
+        test_cases = json.load(f)["test_cases"]
+    corpus = build_corpus(test_cases, args.data, args.corpus, args.expand, args.seed)
+    rates = [float(rate) for rate in args.rates.split(",")]
+    rng = random.Random(args.seed)
+
+    server = start_stub_backends(test_cases, args.llm_latency, args.token_latency,
+                                 failure_rate=args.llm_failure_rate, seed=args.seed)
+    steps = []
+    try:
+        chatbot = build_chatbot(args, StageTimer())
+        for query in corpus[:args.warmup]:
+            run_request(chatbot, StageTimer(), query, args.stream)
+        print(f"Corpus: {len(corpus)} questions; stepping through {len(rates)} arrival rates")
+        with ThreadPoolExecutor(max_workers=args.max_users) as executor:
+            for rate in rates:
+                step = run_step(chatbot, corpus, rate, args.duration, executor, rng, args.stream, args.slo_ms)
+                steps.append(step)
+                latency = step["latency"]
+                print(f"{rate:>7.1f} req/s offered, {step['achieved_rps']:>7.1f} achieved: "
+                      f"p50 {latency['p50_ms']:>7.0f} ms, p95 {latency['p95_ms']:>7.0f} ms, "
+                      f"p99 {latency['p99_ms']:>7.0f} ms, errors {step['error_rate']:.1%}, "
+                      f"concurrency mean {step['mean_concurrency']:.1f} / peak {step['peak_concurrency']}")
+        llm_metrics = chatbot.gateway.metrics()
+        pool_metrics = get_registry().pool_metrics() if args.graph == "neo4j" else None
+    finally:
+        server.stop()
+
+    knee = find_knee(steps, args.degradation, args.max_error_rate)
+    if knee is None:
+        print("No degradation within the tested rates")
+    else:
+        print(f"Latency degrades at {knee['offered_rps']:g} req/s "
+              f"(~{knee['mean_concurrency']:.0f} concurrent requests, peak {knee['peak_concurrency']}): {knee['reason']}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "corpus_size": len(corpus),
+            "steps": steps,
+            "knee": knee,
+            "llm_calls": llm_metrics,
+            "neo4j_pools": pool_metrics
+        }, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import asyncio
+
+from src.chatbot.base import BaseFODMAPChatbot, collect_query_errors
+from src.database.sqlite_backend import SQLiteGraphBackend
+
+
+class FailingBackend(SQLiteGraphBackend):
+    def answer(self, query_info):
+        raise RuntimeError("database is locked")
+
+
+def make_chatbot(backend) -> BaseFODMAPChatbot:
+    return BaseFODMAPChatbot("", "", "", backend=backend)
+
+
+def test_errors_from_worker_threads_reach_the_collecting_request():
+    # An ad-hoc query goes to query_graph in a worker thread, where an in-process backend has no driver
+    chatbot = make_chatbot(SQLiteGraphBackend(":memory:"))
+
+    async def run():
+        errors = []
+        with collect_query_errors(errors):
+            rows = await chatbot.arun_query({"template": "adhoc", "query": "RETURN 1", "params": {}})
+        return rows, errors
+
+    rows, errors = asyncio.run(run())
+    assert rows == []
+    assert errors == ["The sqlite graph backend cannot run Cypher queries"]
+
+
+def test_backend_failures_of_concurrent_lookups_are_collected():
+    chatbot = make_chatbot(FailingBackend(":memory:"))
+    queries = [{"template": "ingredient", "params": {"ingredient": name}} for name in ("elma", "soğan")]
+
+    async def run():
+        errors = []
+        with collect_query_errors(errors):
+            results = await chatbot.arun_queries(queries, chatbot.prefetch_queries(queries[:1]))
+        return results, errors
+
+    results, errors = asyncio.run(run())
+    assert results == [[], []]
+    assert errors == ["Database query error: database is locked"] * 2
+
+
+def test_errors_without_a_collector_are_only_logged(capsys):
+    chatbot = make_chatbot(FailingBackend(":memory:"))
+    assert chatbot.run_query({"template": "ingredient", "params": {"ingredient": "elma"}}) == []
+    assert "database is locked" in capsys.readouterr().out
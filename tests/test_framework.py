@@ -1,8 +1,11 @@
 import json
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from openai import OpenAI
+from src.utils.resources import get_registry
+from src.utils.llm_scheduler import EVALUATION
+from src.utils.cache import LLMResponseCache, content_key, default_embedding_cache
 import pandas as pd
 from src.database.query_processor import FODMAPQueryProcessor
 from src.chatbot.base import BaseFODMAPChatbot
@@ -14,9 +17,20 @@ class FODMAPTestFramework:
                  neo4j_user: str,
                  neo4j_password: str,
                  openai_api_key: str,
-                 test_data_path: str):
+                 test_data_path: str,
+                 embedding_model: str = "text-embedding-ada-002",
+                 embedding_batch_size: int = 256,
+                 embedding_cache: Optional[LLMResponseCache] = None,
+                 max_workers: int = 8):
         """Initialize the test framework with necessary components"""
-        self.openai_client = OpenAI(api_key=openai_api_key)
+        self.max_workers = max_workers
+        self.embedding_model = embedding_model
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_cache = embedding_cache if embedding_cache is not None else default_embedding_cache()
+        self.embedding_calls = 0
+        self.gateway = get_registry().llm_gateway(openai_api_key)
+        # Every LLM call made from this process (including the chatbot's) runs in the evaluation lane
+        self.gateway.default_priority = EVALUATION
         self.query_processor = FODMAPQueryProcessor(openai_api_key)
         self.chatbot = BaseFODMAPChatbot(neo4j_uri, neo4j_user, neo4j_password)
         self.test_data = self._load_test_data(test_data_path)
@@ -27,34 +41,60 @@ class FODMAPTestFramework:
             data = json.load(f)
             return data["test_cases"]  # Return the list of test cases
     
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """Embeddings for all texts as one matrix (row per input), batching API calls and caching on disk"""
+        unique_texts = list(dict.fromkeys(texts))
+        vectors = {}
+        keys = {text: content_key("embedding", self.embedding_model, text) for text in unique_texts}
+
+        if self.embedding_cache is not None:
+            for text in unique_texts:
+                cached = self.embedding_cache.get("embedding", keys[text])
+                if cached is not None:
+                    vectors[text] = cached
+
+        missing = [text for text in unique_texts if text not in vectors]
+        for start in range(0, len(missing), self.embedding_batch_size):
+            batch = missing[start:start + self.embedding_batch_size]
+            embeddings = self.gateway.embed("evaluate_embeddings", batch, model=self.embedding_model)
+            self.embedding_calls += 1
+            for text, embedding in zip(batch, embeddings):
+                vectors[text] = embedding
+                if self.embedding_cache is not None:
+                    self.embedding_cache.put("embedding", keys[text], embedding)
+
+        return np.array([vectors[text] for text in texts], dtype=np.float64)
+
     def _get_embedding(self, text: str) -> np.ndarray:
         """Get OpenAI embedding for a text"""
-        response = self.openai_client.embeddings.create(
-            model="text-embedding-ada-002",
-            input=text
-        )
-        return np.array(response.data[0].embedding)
+        return self.embed_texts([text])[0]
     
     def _compute_cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
         """Compute cosine similarity between two vectors"""
         return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
     
-    def evaluate_query_understanding(self, test_case: Dict) -> float:
-        """Evaluate query classification accuracy"""
+    def evaluate_query_understanding(self, test_case: Dict, classification: Optional[Dict] = None) -> float:
+        """Evaluate query classification accuracy; pass a classification already computed to reuse it"""
         expected_type = test_case["expected_classification"]
-        classification = self.query_processor.classify_query(test_case["query"])
+        if classification is None:
+            classification = self.query_processor.classify_query(test_case["query"])
         return 1.0 if classification["query_type"] == expected_type else 0.0
     
-    def evaluate_knowledge_retrieval(self, test_case: Dict) -> float:
-        """Evaluate knowledge retrieval precision"""
-        queries, _ = self.query_processor.process_query(test_case["query"])
+    def evaluate_knowledge_retrieval(self, test_case: Dict, queries: Optional[List[Dict]] = None) -> float:
+        """Evaluate knowledge retrieval precision; pass the processed queries to skip re-running the pipeline"""
+        if queries is None:
+            queries, _ = self.query_processor.process_query(test_case["query"])
         
         retrieved_nodes = set()
         for query_info in queries:
-            results = self.chatbot.query_graph(query_info["query"], query_info["params"])
+            results = self.chatbot.run_query(query_info)
+            if query_info.get("template") == "meal_batch":
+                results = [result for row in results for result in row["results"]]
             for result in results:
                 if "ingredient" in result:
                     retrieved_nodes.add(result["ingredient"].lower())
+                elif "group" in result:
+                    retrieved_nodes.update(food["name"].lower() for food in result["foods"])
                 elif "food_group" in result:
                     retrieved_nodes.add(result["food_group"].lower())
         
@@ -67,45 +107,66 @@ class FODMAPTestFramework:
     
     def evaluate_response_relevance(self, response: str, test_case: Dict) -> float:
         """Evaluate response relevance using embedding similarity"""
-        response_embedding = self._get_embedding(response)
-        query_embedding = self._get_embedding(test_case["query"])
-        expected_embedding = self._get_embedding(test_case["expected_response"])
-        
-        query_similarity = self._compute_cosine_similarity(response_embedding, query_embedding)
-        expected_similarity = self._compute_cosine_similarity(response_embedding, expected_embedding)
-        
+        return float(self.evaluate_relevance_batch([response], [test_case])[0])
+
+    def evaluate_relevance_batch(self, responses: List[str], test_cases: List[Dict]) -> np.ndarray:
+        """Relevance for many cases at once: one embedding pass, then row-wise cosine similarities"""
+        count = len(test_cases)
+        if count == 0:
+            return np.zeros(0)
+        texts = list(responses) + [case["query"] for case in test_cases] + \
+            [case["expected_response"] for case in test_cases]
+        matrix = self.embed_texts(texts)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1.0, norms)
+
+        response_vectors = matrix[:count]
+        query_similarity = np.einsum("ij,ij->i", response_vectors, matrix[count:2 * count])
+        expected_similarity = np.einsum("ij,ij->i", response_vectors, matrix[2 * count:])
         return (query_similarity + expected_similarity) / 2
     
+    def evaluate_case(self, test_case: Dict) -> Dict[str, Any]:
+        """Run the pipeline once for a test case and score every stage-based metric from that one run"""
+        queries, classification = self.query_processor.process_query(test_case["query"])
+        return {
+            "query": test_case["query"],
+            "query_understanding": self.evaluate_query_understanding(test_case, classification),
+            "knowledge_retrieval": self.evaluate_knowledge_retrieval(test_case, queries),
+            "expected_type": test_case["expected_classification"],
+            "actual_type": classification["query_type"]
+        }
+    
+    def _evaluate_case_safely(self, test_case: Dict) -> Tuple[Dict, Optional[Dict[str, Any]]]:
+        try:
+            return test_case, self.evaluate_case(test_case)
+        except Exception as e:
+            print(f"Error processing test case: {test_case.get('query', 'Unknown')}")
+            print(f"Error details: {str(e)}")
+            return test_case, None
+    
     def run_tests(self) -> pd.DataFrame:
         """Run all tests and compile results"""
         results = []
+        evaluated_cases = []
+        
+        # Cases run concurrently; map yields them back in test-file order
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for test_case, result in executor.map(self._evaluate_case_safely, self.test_data):
+                if result is not None:
+                    results.append(result)
+                    evaluated_cases.append(test_case)
+        
+        # Relevance for every case comes from one batched embedding pass
+        try:
+            relevance = self.evaluate_relevance_batch(
+                [test_case.get("actual_response", "") for test_case in evaluated_cases], evaluated_cases
+            )
+        except Exception as e:
+            print(f"Error computing response relevance: {str(e)}")
+            relevance = np.full(len(evaluated_cases), np.nan)
+        for result, response_relevance in zip(results, relevance):
+            result["response_relevance"] = float(response_relevance)
         
-        for test_case in self.test_data:
-            try:
-                # Process query
-                queries, metadata = self.query_processor.process_query(test_case["query"])
-                
-                # Calculate metrics
-                query_understanding = self.evaluate_query_understanding(test_case)
-                knowledge_retrieval = self.evaluate_knowledge_retrieval(test_case)
-                
-                # Get response for relevance evaluation
-                response = test_case.get("actual_response", "")
-                response_relevance = self.evaluate_response_relevance(response, test_case)
-                
-                results.append({
-                    "query": test_case["query"],
-                    "query_understanding": query_understanding,
-                    "knowledge_retrieval": knowledge_retrieval,
-                    "response_relevance": response_relevance,
-                    "expected_type": test_case["expected_classification"],
-                    "actual_type": metadata["query_type"]
-                })
-                
-            except Exception as e:
-                print(f"Error processing test case: {test_case.get('query', 'Unknown')}")
-                print(f"Error details: {str(e)}")
-                
         return pd.DataFrame(results)
     
     def generate_report(self, results_df: pd.DataFrame) -> Dict[str, float]:
@@ -132,7 +193,8 @@ def main():
         neo4j_user=os.getenv("NEO4J_USER"),
         neo4j_password=os.getenv("NEO4J_PASSWORD"),
         openai_api_key=os.getenv("OPENAI_API_KEY"),
-        test_data_path="tests/test_cases.json"
+        test_data_path="tests/test_cases.json",
+        max_workers=int(os.getenv("FODMAP_EVAL_WORKERS", "8"))
     )
     
     # Run tests
@@ -143,6 +205,9 @@ def main():
     
     # Save detailed results
     results_df.to_csv("test_results.csv", index=False)
+    framework.chatbot.profiler.export("query_profile.json")
+    
+    print(f"Embedding API calls: {framework.embedding_calls}")
     
     # Print summary
     print("\nTest Results Summary:")
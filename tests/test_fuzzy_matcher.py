@@ -0,0 +1,83 @@
+import pytest
+from src.database.fuzzy_matcher import FuzzyMatcher, bounded_levenshtein, max_edits
+
+NAMES = [
+    ("elma", "elma"),
+    ("ekmek", "ekmek"),
+    ("beyaz ekmek", "ekmek"),
+    ("soğan", "soğan"),
+    ("kuru soğan", "soğan"),
+    ("domates", "domates"),
+    ("patlıcan", "patlıcan"),
+    ("sarımsak", "sarımsak"),
+]
+
+
+@pytest.fixture
+def matcher():
+    return FuzzyMatcher.from_names(NAMES)
+
+
+@pytest.mark.parametrize("a, b, bound, expected", [
+    ("domates", "domates", 2, 0),
+    ("domates", "domatez", 1, 1),      # substitution
+    ("domates", "domtes", 1, 1),       # deletion
+    ("domates", "domatess", 1, 1),     # insertion
+    ("patlican", "patlcann", 2, 2),
+    ("patlican", "patlcann", 1, None),
+    ("elma", "elmalar", 2, None),      # length difference alone exceeds the bound
+    ("", "ab", 2, 2),
+])
+def test_bounded_levenshtein(a, b, bound, expected):
+    assert bounded_levenshtein(a, b, bound) == expected
+    assert bounded_levenshtein(b, a, bound) == expected
+
+
+@pytest.mark.parametrize("length, expected", [(1, 0), (3, 0), (4, 1), (7, 1), (8, 2), (20, 2)])
+def test_max_edits(length, expected):
+    assert max_edits(length) == expected
+
+
+def test_exact_name(matcher):
+    assert matcher.match("soğan")[0] == ("soğan", "soğan", 1.0)
+    assert matcher.resolve("soğan") == "soğan"
+
+
+def test_diacritics_are_folded(matcher):
+    assert matcher.match("sogan")[0].score == 1.0
+    assert matcher.resolve("SARIMSAK") == "sarımsak"
+    assert matcher.resolve("patlican") == "patlıcan"
+
+
+def test_alternative_name_resolves_to_its_food(matcher):
+    assert matcher.resolve("kuru sogan") == "soğan"
+
+
+def test_one_edit_on_a_long_name_is_accepted(matcher):
+    assert matcher.resolve("domtes") == "domates"
+    assert matcher.resolve("sarımsk") == "sarımsak"
+    assert matcher.suggest("domtes") == []
+
+
+def test_two_edits_are_matched_but_only_suggested(matcher):
+    matches = matcher.match("patlcann")
+    assert matches[0].food == "patlıcan"
+    assert matches[0].score == pytest.approx(0.75)
+    assert matcher.resolve("patlcann") is None
+    assert matcher.suggest("patlcann") == ["patlıcan"]
+
+
+@pytest.mark.parametrize("term, near", [("elmas", "elma"), ("etmek", "ekmek")])
+def test_different_words_one_edit_away_are_not_rewritten(matcher, term, near):
+    assert matcher.resolve(term) is None
+    assert matcher.suggest(term) == [near]
+
+
+@pytest.mark.parametrize("term", ["xyz", "elm", "muzlu kek", ""])
+def test_rejected(matcher, term):
+    assert matcher.resolve(term) is None
+    assert matcher.suggest(term) == []
+
+
+def test_too_many_edits_find_nothing(matcher):
+    assert matcher.match("domatesler") == []
@@ -0,0 +1,233 @@
+import copy
+
+import pytest
+from src.database.gptgraphbuilder import (DEFAULT_DIET_TYPE, ensure_diet_type, flatten_fodmap_data,
+                                         food_content_hashes, merge_parsed_chunks, plan_incremental_update,
+                                         split_source_sections)
+
+DATA = {
+    "diet_type": {"name": "Low FODMAP", "description": "IBS diyeti"},
+    "standard_food_groups": [
+        {"name": "Fruits", "foods": [
+            {"name": "elma", "should_avoid": True, "is_recommended": False, "fodmap_level": "high"},
+            {"name": "çilek", "should_avoid": False, "is_recommended": True, "fodmap_level": "low"}
+        ]},
+        {"name": "Vegetables", "foods": [
+            {"name": "soğan", "should_avoid": True, "is_recommended": False, "fodmap_level": "high",
+             "alternative_names": ["kuru soğan"]},
+            {"name": "havuç", "should_avoid": False, "is_recommended": True, "fodmap_level": "low"}
+        ]}
+    ],
+    "fodmap_categories": [
+        {"name": "Fructans", "description": "Fruktanlar", "foods": [{"name": "soğan", "amount": "az"}]},
+        {"name": "Fructose", "description": "Fruktoz", "foods": [{"name": "elma"}]}
+    ]
+}
+
+
+def group(data, name):
+    return next(entry for entry in data["standard_food_groups"] if entry["name"] == name)
+
+
+def food(data, group_name, food_name):
+    return next(entry for entry in group(data, group_name)["foods"] if entry["name"] == food_name)
+
+
+def hashes(data):
+    return food_content_hashes(flatten_fodmap_data(data))
+
+
+def plan(old_data, new_data):
+    return plan_incremental_update(flatten_fodmap_data(new_data), hashes(old_data))
+
+
+def test_hashes_cover_every_food_and_are_stable():
+    first = hashes(DATA)
+    assert set(first) == {"elma", "çilek", "soğan", "havuç"}
+    assert hashes(copy.deepcopy(DATA)) == first
+
+
+def test_hash_ignores_the_order_of_groups_categories_and_aliases():
+    reordered = copy.deepcopy(DATA)
+    reordered["standard_food_groups"].reverse()
+    reordered["fodmap_categories"].reverse()
+    food(reordered, "Vegetables", "soğan")["alternative_names"] = ["kuru soğan"]
+    assert hashes(reordered) == hashes(DATA)
+
+
+@pytest.mark.parametrize("edit", [
+    lambda data: food(data, "Fruits", "elma").update(fodmap_level="moderate"),
+    lambda data: food(data, "Fruits", "elma").update(should_avoid=False, is_recommended=True),
+    lambda data: food(data, "Fruits", "elma").update(alternative_names=["yeşil elma"]),
+    lambda data: data["fodmap_categories"][1]["foods"][0].update(amount="1 adet"),
+    lambda data: data["fodmap_categories"][0]["foods"].append({"name": "elma"}),
+])
+def test_any_edit_to_a_food_changes_only_its_hash(edit):
+    edited = copy.deepcopy(DATA)
+    edit(edited)
+    before, after = hashes(DATA), hashes(edited)
+    assert before["elma"] != after["elma"]
+    assert {name: value for name, value in before.items() if name != "elma"} == \
+           {name: value for name, value in after.items() if name != "elma"}
+
+
+def test_unchanged_data_plans_no_writes():
+    result = plan(DATA, DATA)
+    assert result["added"] == result["changed"] == result["removed"] == []
+    assert result["hash_rows"] == []
+    assert all(rows == [] for rows in result["stage_rows"].values())
+
+
+def test_added_changed_and_removed_foods():
+    new_data = copy.deepcopy(DATA)
+    food(new_data, "Fruits", "elma")["fodmap_level"] = "moderate"
+    group(new_data, "Fruits")["foods"].append(
+        {"name": "muz", "should_avoid": False, "is_recommended": True, "fodmap_level": "low"}
+    )
+    group(new_data, "Vegetables")["foods"] = [
+        entry for entry in group(new_data, "Vegetables")["foods"] if entry["name"] != "havuç"
+    ]
+
+    result = plan(DATA, new_data)
+    assert result["added"] == ["muz"]
+    assert result["changed"] == ["elma"]
+    assert result["removed"] == ["havuç"]
+    assert {row["name"] for row in result["hash_rows"]} == {"muz", "elma"}
+    assert {row["name"] for row in result["stage_rows"]["foods"]} == {"muz", "elma"}
+    assert [row["food_name"] for row in result["stage_rows"]["category_foods"]] == ["elma"]
+    assert result["stage_rows"]["alternative_names"] == []
+
+
+def test_food_moved_to_another_group_is_rebuilt_and_the_old_group_is_stale():
+    new_data = copy.deepcopy(DATA)
+    moved = food(new_data, "Vegetables", "havuç")
+    group(new_data, "Vegetables")["foods"].remove(moved)
+    new_data["standard_food_groups"].append({"name": "Roots", "foods": [moved]})
+
+    result = plan(DATA, new_data)
+    assert result["changed"] == ["havuç"]
+    # Resetting the food drops its old BELONGS_TO link; the rows rebuild the new one
+    assert [row["group_name"] for row in result["stage_rows"]["foods"]] == ["Roots"]
+    assert result["group_names"] == ["Fruits", "Vegetables", "Roots"]
+
+
+def test_removed_group_and_category_are_left_out_of_the_keep_lists():
+    new_data = copy.deepcopy(DATA)
+    new_data["standard_food_groups"] = [group(new_data, "Fruits")]
+    new_data["fodmap_categories"] = [new_data["fodmap_categories"][1]]
+
+    result = plan(DATA, new_data)
+    assert result["group_names"] == ["Fruits"]
+    assert result["category_names"] == ["Fructose"]
+    assert sorted(result["removed"]) == ["havuç", "soğan"]
+
+
+def test_food_without_a_stored_hash_is_rewritten():
+    current = hashes(DATA)
+    current["çilek"] = None
+    result = plan_incremental_update(flatten_fodmap_data(DATA), current)
+    assert result["changed"] == ["çilek"]
+
+
+def test_sections_are_packed_into_chunks_without_splitting_them():
+    sections = [f"Bölüm {i}\n" + "x" * 30 for i in range(6)]
+    chunks = split_source_sections("\n\n".join(sections), max_chunk_chars=90)
+
+    assert all(len(chunk) <= 90 for chunk in chunks)
+    assert [section for chunk in chunks for section in chunk.split("\n\n")] == sections
+
+
+def test_heading_stays_with_the_section_it_introduces():
+    body = "\n".join(["elma - yüksek FODMAP"] * 3)
+    content = "\n\n".join([body, "MEYVELER", body])
+    chunks = split_source_sections(content, max_chunk_chars=len(body) + 20)
+
+    assert chunks == [body, "MEYVELER\n\n" + body]
+
+
+def test_oversized_section_is_split_on_lines():
+    lines = [f"yiyecek {i}: düşük" for i in range(20)]
+    chunks = split_source_sections("\n".join(lines), max_chunk_chars=60)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    assert "\n".join(chunks).splitlines() == lines
+
+
+def test_short_content_is_one_chunk():
+    assert split_source_sections("elma\n\narmut") == ["elma\n\narmut"]
+    assert split_source_sections("   ") == ["   "]
+
+
+def part(groups=(), categories=(), diet_type=None):
+    return {"diet_type": diet_type, "standard_food_groups": list(groups), "fodmap_categories": list(categories)}
+
+
+def test_duplicate_foods_across_chunks_are_merged_once():
+    merged = merge_parsed_chunks([
+        part([{"name": "Fruits", "foods": [
+            {"name": "Elma", "should_avoid": False, "is_recommended": True, "fodmap_level": "low",
+             "alternative_names": ["yeşil elma"]}
+        ]}]),
+        part([{"name": "Fruits", "foods": [
+            {"name": "elma", "should_avoid": False, "is_recommended": True, "fodmap_level": "low",
+             "serving_info": "1 adet", "alternative_names": ["yeşil elma", "kırmızı elma"]},
+            {"name": "muz", "should_avoid": False, "is_recommended": True, "fodmap_level": "low"}
+        ]}])
+    ])
+
+    fruits = merged["standard_food_groups"]
+    assert [entry["name"] for entry in fruits] == ["Fruits"]
+    assert [entry["name"] for entry in fruits[0]["foods"]] == ["Elma", "muz"]
+    elma = fruits[0]["foods"][0]
+    assert elma["serving_info"] == "1 adet"
+    assert elma["alternative_names"] == ["yeşil elma", "kırmızı elma"]
+    assert "_foods" not in fruits[0]
+
+
+def test_conflicting_chunks_resolve_to_avoid_and_the_highest_level():
+    merged = merge_parsed_chunks([
+        part([{"name": "Vegetables", "foods": [
+            {"name": "soğan", "should_avoid": False, "is_recommended": True, "fodmap_level": "low"}
+        ]}]),
+        part([{"name": "Vegetables", "foods": [
+            {"name": "soğan", "should_avoid": True, "is_recommended": False, "fodmap_level": "high"}
+        ]}]),
+        part([{"name": "Vegetables", "foods": [
+            {"name": "soğan", "should_avoid": False, "is_recommended": False, "fodmap_level": "moderate"}
+        ]}])
+    ])
+
+    soğan = merged["standard_food_groups"][0]["foods"][0]
+    assert soğan["should_avoid"] is True
+    assert soğan["is_recommended"] is False
+    assert soğan["fodmap_level"] == "high"
+
+
+def test_categories_merge_foods_and_keep_the_first_description():
+    merged = merge_parsed_chunks([
+        part(categories=[{"name": "Fructans", "description": "", "foods": [{"name": "soğan"}]}]),
+        part(categories=[{"name": "Fructans", "description": "Fruktanlar",
+                          "foods": [{"name": "soğan", "amount": "az"}, {"name": "sarımsak"}]}])
+    ])
+
+    fructans = merged["fodmap_categories"][0]
+    assert fructans["description"] == "Fruktanlar"
+    assert fructans["foods"] == [{"name": "soğan", "amount": "az"}, {"name": "sarımsak"}]
+
+
+def test_first_named_diet_type_wins():
+    merged = merge_parsed_chunks([
+        part(diet_type=None),
+        part(diet_type={"name": ""}),
+        part(diet_type={"name": "Low FODMAP", "description": "IBS"}),
+        part(diet_type={"name": "Başka"})
+    ])
+    assert merged["diet_type"] == {"name": "Low FODMAP", "description": "IBS"}
+
+
+def test_missing_diet_type_falls_back_to_the_default():
+    merged = merge_parsed_chunks([part(), part(diet_type={"description": "isimsiz"})])
+    assert merged["diet_type"] == DEFAULT_DIET_TYPE
+    assert ensure_diet_type({"diet_type": {"name": "Low FODMAP"}})["diet_type"] == \
+           {"name": "Low FODMAP", "description": None}
@@ -0,0 +1,108 @@
+import copy
+import json
+import os
+
+import pytest
+from src.database.food_lookup import fulltext_search, name_words, words_match
+from src.database.knowledge_snapshot import FODMAPKnowledgeSnapshot, records_from_data
+from src.database.sqlite_backend import SQLiteGraphBackend
+
+SAMPLE_DATA = os.path.join(os.path.dirname(__file__), "fodmap_sample_data.json")
+
+
+def sample_data():
+    with open(SAMPLE_DATA, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    # One food in two groups, so limits that count rows and limits that count foods differ
+    grains = next(group for group in data["standard_food_groups"] if group["name"] == "Grains")
+    grains["foods"].append({"name": "mercimek", "should_avoid": True, "is_recommended": False,
+                            "fodmap_level": "high"})
+    return data
+
+
+def snapshot_backend(data):
+    snapshot = FODMAPKnowledgeSnapshot(None)
+    snapshot.load_records(records_from_data(data))
+    return snapshot
+
+
+def sqlite_backend(data):
+    backend = SQLiteGraphBackend(":memory:")
+    backend.load_data(data)
+    return backend
+
+
+@pytest.fixture(scope="module", params=[snapshot_backend, sqlite_backend], ids=["snapshot", "sqlite"])
+def backend(request):
+    return request.param(sample_data())
+
+
+@pytest.fixture(scope="module")
+def both():
+    data = sample_data()
+    return snapshot_backend(data), sqlite_backend(copy.deepcopy(data))
+
+
+def names(rows):
+    return [row["ingredient"] for row in rows]
+
+
+@pytest.mark.parametrize("term", [
+    "soğan", "SOĞAN", "kuru soğan", "kuru", "so", "elma", "elma suyu", "suyu", "ekmek", "beyaz", "süt",
+    "sütü", "inek", "mercimek", "kırmızı mer", "zeytin", "zeytinyağı", "yağı", "ğan", "fıstık", "xyz", "",
+    "  ", "domates salçası"
+])
+@pytest.mark.parametrize("limit", [1, 2, 25])
+def test_backends_return_the_same_rows(both, term, limit):
+    snapshot, sqlite = both
+    assert snapshot.lookup_ingredient(term, limit) == sqlite.lookup_ingredient(term, limit)
+
+
+def test_every_term_word_must_start_a_word_of_the_name(backend):
+    assert names(backend.lookup_ingredient("zeytin")) == ["zeytin", "zeytinyağı"]
+    # A word inside a compound is not a word start
+    assert backend.lookup_ingredient("yağı") == []
+    assert backend.lookup_ingredient("ğan") == []
+    assert names(backend.lookup_ingredient("kırmızı mer")) == ["mercimek", "mercimek"]
+
+
+def test_alternative_names_resolve_to_their_food(backend):
+    assert names(backend.lookup_ingredient("kuru")) == ["soğan"]
+    assert names(backend.lookup_ingredient("inek sütü")) == ["süt"]
+
+
+def test_exact_hits_come_first_then_name_order(backend):
+    assert names(backend.lookup_ingredient("elma")) == ["elma", "elma suyu"]
+    assert names(backend.lookup_ingredient("beyaz")) == ["ekmek", "peynir"]
+    # "süt" is a food name; "laktozsuz süt" only contains the word
+    assert names(backend.lookup_ingredient("süt")) == ["süt", "laktozsuz süt"]
+    assert names(backend.lookup_ingredient("beyaz ekmek")) == ["ekmek"]
+
+
+def test_limit_counts_foods_not_rows(backend):
+    rows = backend.lookup_ingredient("mercimek", limit=1)
+    assert names(rows) == ["mercimek", "mercimek"]
+    assert sorted(row["food_group"] for row in rows) == ["Grains", "Proteins"]
+
+
+def test_dispatch_applies_the_default_limit(backend):
+    rows = backend.answer({"template": "ingredient", "params": {"ingredient": "e", "limit": None}})
+    assert len({row["ingredient"] for row in rows}) == min(25, len(rows))
+
+
+@pytest.mark.parametrize("term, name, expected", [
+    ("soğan", "kuru soğan", True),
+    ("soğan", "soğanlı", True),
+    ("soğan", "yeşilsoğan", False),
+    ("kuru so", "kuru soğan", True),
+    ("so kuru", "kuru soğan", True),
+    ("kuru ekmek", "kuru soğan", False),
+    ("", "soğan", False),
+])
+def test_words_match(term, name, expected):
+    assert words_match(name_words(term), name_words(name)) is expected
+
+
+def test_fulltext_search_is_the_same_rule_in_lucene():
+    assert fulltext_search("Kuru Soğan") == "kuru* AND soğan*"
+    assert fulltext_search("  ") is None
@@ -0,0 +1,36 @@
+import pytest
+from src.database.knowledge_snapshot import FODMAPKnowledgeSnapshot
+
+
+class UnreachableDriver:
+    """Driver stand-in whose every session fails, like Neo4j being down"""
+
+    def __init__(self):
+        self.sessions = 0
+
+    def session(self):
+        self.sessions += 1
+        raise ConnectionError("Neo4j is unreachable")
+
+
+def test_failed_version_check_is_throttled_by_the_refresh_interval():
+    driver = UnreachableDriver()
+    snapshot = FODMAPKnowledgeSnapshot(driver, refresh_interval=60.0)
+
+    assert snapshot.refresh_due()
+    with pytest.raises(ConnectionError):
+        snapshot.refresh()
+    assert not snapshot.refresh_due()
+    for _ in range(5):
+        snapshot.refresh_quietly()
+    assert driver.sessions == 1
+    assert not snapshot.loaded
+
+
+def test_failed_version_check_is_retried_after_the_interval():
+    driver = UnreachableDriver()
+    snapshot = FODMAPKnowledgeSnapshot(driver, refresh_interval=0.0)
+
+    snapshot.refresh_quietly()
+    snapshot.refresh_quietly()
+    assert driver.sessions == 2
@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from src.utils.llm_gateway import LLMGateway, LLMGatewayError
+from tests.fake_openai import FakeOpenAIServer
+
+MESSAGES = [{"role": "user", "content": "Elma yiyebilir miyim?"}]
+
+
+class ConcurrencyProbe:
+    """Responder that holds each request for `hold` seconds and records the peak concurrency"""
+
+    def __init__(self, hold: float):
+        self.hold = hold
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.hold)
+        with self._lock:
+            self.active -= 1
+        return "tamam"
+
+
+def make_gateway(server: FakeOpenAIServer, **kwargs) -> LLMGateway:
+    kwargs.setdefault("backoff_base", 0.01)
+    kwargs.setdefault("backoff_max", 0.05)
+    return LLMGateway("test-key", base_url=server.base_url, default_model="fake-model", **kwargs)
+
+
+@pytest.fixture
+def server():
+    with FakeOpenAIServer() as server:
+        yield server
+
+
+@pytest.mark.parametrize("statuses", [[429], [503], [429, 500, 503]])
+def test_transient_failures_are_retried(server, statuses):
+    server.fail_statuses = list(statuses)
+    gateway = make_gateway(server, max_retries=3)
+
+    response = gateway.chat("answer", MESSAGES)
+
+    assert response.choices[0].message.content
+    assert len(server.requests) == len(statuses) + 1
+    metrics = gateway.metrics()["answer"]
+    assert metrics["retries"] == len(statuses)
+    assert metrics["failures"] == 0
+
+
+def test_async_transient_failures_are_retried(server):
+    server.fail_statuses = [429, 503]
+    gateway = make_gateway(server, max_retries=3)
+
+    response = asyncio.run(gateway.achat("answer", MESSAGES))
+
+    assert response.choices[0].message.content
+    assert len(server.requests) == 3
+    assert gateway.metrics()["answer"]["retries"] == 2
+
+
+def test_gives_up_after_max_retries(server):
+    server.fail_statuses = [503, 503, 503]
+    gateway = make_gateway(server, max_retries=1)
+
+    with pytest.raises(LLMGatewayError, match="giving up after 2 attempt"):
+        gateway.chat("answer", MESSAGES)
+    assert len(server.requests) == 2
+    assert gateway.metrics()["answer"]["failures"] == 1
+
+
+def test_client_errors_are_not_retried(server):
+    server.fail_statuses = [400]
+    gateway = make_gateway(server, max_retries=3)
+
+    with pytest.raises(LLMGatewayError):
+        gateway.chat("answer", MESSAGES)
+    assert len(server.requests) == 1
+
+
+def test_deadline_expires_on_a_slow_server(server):
+    server.latency = 1.0
+    gateway = make_gateway(server, max_retries=5)
+
+    started = time.monotonic()
+    with pytest.raises(LLMGatewayError):
+        gateway.chat("answer", MESSAGES, timeout=0.3)
+    # Retries stop at the deadline instead of waiting out every attempt
+    assert time.monotonic() - started < 1.0
+
+
+def test_deadline_expires_while_waiting_for_a_slot():
+    probe = ConcurrencyProbe(hold=0.5)
+    with FakeOpenAIServer(responder=probe) as server:
+        gateway = make_gateway(server, max_in_flight=1)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            slow = pool.submit(gateway.chat, "answer", MESSAGES)
+            while probe.active == 0:
+                time.sleep(0.01)
+            with pytest.raises(LLMGatewayError, match="deadline exceeded"):
+                gateway.chat("answer", MESSAGES, timeout=0.1)
+            assert slow.result().choices[0].message.content
+    assert len(server.requests) == 1
+
+
+def test_in_flight_cap_bounds_concurrent_requests():
+    probe = ConcurrencyProbe(hold=0.05)
+    with FakeOpenAIServer(responder=probe) as server:
+        gateway = make_gateway(server, max_in_flight=2)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(lambda _: gateway.chat("answer", MESSAGES), range(8)))
+
+    assert len(responses) == 8
+    assert probe.peak == 2
+
+
+def test_async_in_flight_cap_bounds_concurrent_requests():
+    probe = ConcurrencyProbe(hold=0.05)
+
+    async def run(gateway):
+        return await asyncio.gather(*(gateway.achat("answer", MESSAGES) for _ in range(8)))
+
+    with FakeOpenAIServer(responder=probe) as server:
+        gateway = make_gateway(server, max_in_flight=2)
+        responses = asyncio.run(run(gateway))
+
+    assert len(responses) == 8
+    assert probe.peak == 2
+
+
+def test_async_waiter_is_woken_when_a_thread_frees_its_slot():
+    probe = ConcurrencyProbe(hold=0.3)
+
+    async def run(gateway, pool):
+        blocking = asyncio.get_running_loop().run_in_executor(pool, gateway.chat, "answer", MESSAGES)
+        while probe.active == 0:
+            await asyncio.sleep(0.01)
+        started = time.monotonic()
+        response = await gateway.achat("answer", MESSAGES, timeout=5.0)
+        await blocking
+        return response, time.monotonic() - started
+
+    with FakeOpenAIServer(responder=probe) as server:
+        gateway = make_gateway(server, max_in_flight=1)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            response, waited = asyncio.run(run(gateway, pool))
+
+    assert response.choices[0].message.content
+    assert probe.peak == 1
+    assert waited < 1.0
+    assert gateway._slot_waiters == {}
+
+
+def test_async_deadline_expires_while_waiting_for_a_slot():
+    probe = ConcurrencyProbe(hold=0.5)
+
+    async def run(gateway, pool):
+        blocking = asyncio.get_running_loop().run_in_executor(pool, gateway.chat, "answer", MESSAGES)
+        while probe.active == 0:
+            await asyncio.sleep(0.01)
+        with pytest.raises(LLMGatewayError, match="deadline exceeded"):
+            await gateway.achat("answer", MESSAGES, timeout=0.1)
+        return await blocking
+
+    with FakeOpenAIServer(responder=probe) as server:
+        gateway = make_gateway(server, max_in_flight=1)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            assert asyncio.run(run(gateway, pool)).choices[0].message.content
+    assert len(server.requests) == 1
+    assert gateway._slot_waiters == {}
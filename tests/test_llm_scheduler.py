@@ -0,0 +1,148 @@
+import threading
+import time
+
+import pytest
+from src.utils.llm_scheduler import (BATCH, EVALUATION, INTERACTIVE, PRIORITY_RANK, LLMScheduler,
+                                     SchedulerTimeout)
+
+
+def make_scheduler(path: str = ":memory:", **kwargs) -> LLMScheduler:
+    kwargs.setdefault("interactive_reserve", 0.0)
+    return LLMScheduler(path, poll_interval=0.01, **kwargs)
+
+
+def acquire_in_background(scheduler: LLMScheduler, priority: str, tokens: int, timeout: float, log: list):
+    """Start acquire on a thread and wait until it is queued; log gets (priority, tokens) on admission"""
+    queued_before = sum(scheduler.queued().values())
+
+    def run():
+        try:
+            scheduler.acquire(priority, tokens, timeout)
+            log.append((priority, tokens))
+        except SchedulerTimeout:
+            log.append((priority, "timeout"))
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    while sum(scheduler.queued().values()) == queued_before and thread.is_alive():
+        time.sleep(0.005)
+    return thread
+
+
+def test_unconfigured_scheduler_is_disabled():
+    assert not make_scheduler().enabled
+    assert make_scheduler(account_limits=(10, 0)).enabled
+
+
+def test_requests_bucket_admits_up_to_its_capacity():
+    scheduler = make_scheduler(account_limits=(3, 0))
+    for _ in range(3):
+        assert scheduler.acquire(INTERACTIVE, 100, timeout=0.1).queue_wait < 0.1
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire(INTERACTIVE, 100, timeout=0.1)
+    assert scheduler.queued() == {}
+
+
+def test_tokens_bucket_refills_over_time():
+    # 60000 tokens per minute refill at 1000 per second
+    scheduler = make_scheduler(account_limits=(0, 60000))
+    scheduler.acquire(INTERACTIVE, 60000, timeout=0.1)
+    ticket = scheduler.acquire(INTERACTIVE, 200, timeout=2.0)
+    assert 0.1 < ticket.queue_wait < 1.0
+
+
+def test_call_larger_than_the_budget_is_still_admitted():
+    scheduler = make_scheduler(account_limits=(0, 1000))
+    assert scheduler.acquire(INTERACTIVE, 5000, timeout=0.1)
+
+
+def test_settle_gives_back_unused_tokens():
+    scheduler = make_scheduler(account_limits=(0, 1000))
+    ticket = scheduler.acquire(INTERACTIVE, 800, timeout=0.1)
+    scheduler.settle(ticket, 100)
+    assert scheduler.acquire(INTERACTIVE, 800, timeout=0.1)
+
+
+def test_settle_charges_extra_tokens():
+    scheduler = make_scheduler(account_limits=(0, 1000))
+    ticket = scheduler.acquire(INTERACTIVE, 100, timeout=0.1)
+    scheduler.settle(ticket, 900)
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire(INTERACTIVE, 500, timeout=0.1)
+
+
+def test_interactive_reserve_is_kept_from_other_classes():
+    scheduler = make_scheduler(account_limits=(10, 0), interactive_reserve=0.5)
+    for _ in range(5):
+        scheduler.acquire(BATCH, 10, timeout=0.1)
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire(EVALUATION, 10, timeout=0.1)
+    # The reserved half is still there for interactive calls
+    for _ in range(5):
+        scheduler.acquire(INTERACTIVE, 10, timeout=0.1)
+
+
+def test_interactive_waiter_holds_back_batch_and_evaluation(tmp_path):
+    path = str(tmp_path / "scheduler.sqlite3")
+    scheduler = make_scheduler(path, class_limits={INTERACTIVE: (1, 0)})
+    scheduler.acquire(INTERACTIVE, 10, timeout=0.1)
+
+    log = []
+    waiter = acquire_in_background(scheduler, INTERACTIVE, 10, 0.5, log)
+    assert scheduler.queued() == {INTERACTIVE: 1}
+
+    # Another process sharing the file sees the queued interactive call too
+    other = make_scheduler(path, class_limits={BATCH: (100, 0)})
+    with pytest.raises(SchedulerTimeout):
+        other.acquire(BATCH, 10, timeout=0.1)
+    with pytest.raises(SchedulerTimeout):
+        scheduler.acquire(EVALUATION, 10, timeout=0.1)
+
+    waiter.join()
+    assert log == [(INTERACTIVE, "timeout")]
+    assert other.acquire(BATCH, 10, timeout=0.1)
+
+
+def test_lower_classes_do_not_wait_on_each_other():
+    scheduler = make_scheduler(class_limits={BATCH: (1, 0)})
+    scheduler.acquire(BATCH, 10, timeout=0.1)
+
+    log = []
+    waiter = acquire_in_background(scheduler, BATCH, 10, 0.3, log)
+    ticket = scheduler.acquire(EVALUATION, 10, timeout=0.1)
+    assert ticket.queue_wait < 0.1
+    waiter.join()
+    assert log == [(BATCH, "timeout")]
+
+
+def test_calls_of_one_class_are_admitted_in_arrival_order():
+    scheduler = make_scheduler(class_limits={BATCH: (0, 60000)})
+    scheduler.acquire(BATCH, 60000, timeout=0.1)
+
+    log = []
+    first = acquire_in_background(scheduler, BATCH, 300, 2.0, log)
+    # The second call needs far less, but must not overtake the first
+    second = acquire_in_background(scheduler, BATCH, 10, 2.0, log)
+    first.join()
+    second.join()
+    assert log == [(BATCH, 300), (BATCH, 10)]
+
+
+def test_stale_waiters_from_crashed_processes_are_dropped(tmp_path):
+    path = str(tmp_path / "scheduler.sqlite3")
+    scheduler = make_scheduler(path, account_limits=(100, 0))
+    crashed = make_scheduler(path)
+    long_ago = time.time() - 3600
+    crashed._conn.execute(
+        "INSERT INTO waiters (id, rank, enqueued_at, heartbeat) VALUES (?, ?, ?, ?)",
+        ("crashed", PRIORITY_RANK[INTERACTIVE], long_ago, long_ago)
+    )
+    assert scheduler.queued() == {INTERACTIVE: 1}
+
+    assert scheduler.acquire(BATCH, 10, timeout=0.1)
+    assert scheduler.queued() == {}
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError):
+        make_scheduler(account_limits=(10, 0)).acquire("urgent", 10, timeout=0.1)
@@ -0,0 +1,84 @@
+import json
+import os
+
+import pytest
+from src.chatbot.dish_catalog import DishCatalog
+from src.database.local_classifier import LocalQueryClassifier
+
+SAMPLE_DATA = os.path.join(os.path.dirname(__file__), "fodmap_sample_data.json")
+
+
+@pytest.fixture
+def classifier():
+    with open(SAMPLE_DATA, "r", encoding="utf-8") as f:
+        return LocalQueryClassifier.from_data(json.load(f))
+
+
+def test_food_question_is_an_ingredient_query(classifier):
+    prediction = classifier.classify("Soğan yiyebilir miyim?")
+    assert prediction["query_type"] == "ingredient"
+    assert prediction["identified_items"] == ["soğan"]
+
+
+def test_catalogued_meal_label_cannot_override_a_food(classifier, tmp_path):
+    catalog = DishCatalog(str(tmp_path / "dishes.sqlite3"))
+    classifier.add_dish_names(catalog.dish_names())
+    catalog.subscribe(classifier.add_dish_names)
+
+    # A live breakdown that mislabelled the ingredient as a dish
+    catalog.put("soğan", [{"name": "soğan"}], source="live")
+    catalog.put("kuru soğan", [{"name": "soğan"}], source="live")
+
+    assert "soğan" not in classifier.dish_names
+    assert "kuru soğan" not in classifier.dish_names
+    prediction = classifier.classify("Soğan yiyebilir miyim?")
+    assert prediction["query_type"] == "ingredient"
+    assert prediction["identified_items"] == ["soğan"]
+
+
+def test_new_dish_from_the_catalog_is_a_meal(classifier, tmp_path):
+    catalog = DishCatalog(str(tmp_path / "dishes.sqlite3"))
+    catalog.subscribe(classifier.add_dish_names)
+
+    catalog.put("patlıcan kavurması", [{"name": "patlıcan"}], source="live")
+
+    prediction = classifier.classify("Patlıcan kavurması yiyebilir miyim?")
+    assert prediction["query_type"] == "meal"
+    assert prediction["identified_items"] == ["patlıcan kavurması"]
+
+
+def test_foods_win_over_dishes_in_the_same_vocabulary():
+    with open(SAMPLE_DATA, "r", encoding="utf-8") as f:
+        classifier = LocalQueryClassifier.from_data(json.load(f), dish_names=["soğan", "mercimek çorbası"])
+
+    assert classifier.classify("Soğan yiyebilir miyim?")["query_type"] == "ingredient"
+    assert classifier.classify("Mercimek çorbası yiyebilir miyim?")["query_type"] == "meal"
+
+
+@pytest.mark.parametrize("query", [
+    "Sebze çorbası içebilir miyim?",       # "çorbası" is the head; sebze only modifies it
+    "Soğan tozu kullanabilir miyim?",      # "tozu" is the head
+    "Domates salatası yiyebilir miyim?",
+    "Bal mı reçel mi?",                    # "reçel" is a food the vocabulary lacks
+])
+def test_unknown_content_words_fall_back_to_the_llm(classifier, query):
+    prediction = classifier.predict(query)
+    assert prediction["confidence"] < classifier.min_confidence
+    assert classifier.classify(query) is None
+
+
+@pytest.mark.parametrize("query, query_type, items", [
+    ("Soğan yiyebilir miyim?", "ingredient", ["soğan"]),
+    ("Elma mı armut mu?", "ingredient", ["elma", "armut"]),
+    ("Sarımsağı kullanabilir miyim?", "ingredient", ["sarımsak"]),
+    ("Hangi meyveler güvenli?", "food_group", ["Fruits"]),
+    ("Süt ürünleri tüketebilir miyim?", "food_group", ["Dairy"]),
+    ("Mercimek çorbası içebilir miyim?", "meal", ["mercimek çorbası"]),
+    ("Karnıyarık FODMAP açısından uygun mu?", "meal", ["karnıyarık"]),
+    ("Soğan yemek istiyorum", "ingredient", ["soğan"]),
+])
+def test_question_words_do_not_lower_confidence(classifier, query, query_type, items):
+    prediction = classifier.classify(query)
+    assert prediction is not None
+    assert prediction["query_type"] == query_type
+    assert prediction["identified_items"] == items
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from src.chatbot.dish_catalog import DishCatalog
+from src.database.query_processor import FODMAPQueryProcessor
+from src.utils.cache import LLMResponseCache
+
+
+class StubMealAnalyzer:
+    """Answers dishes from a table; a dish mapped to an exception raises it, None never returns"""
+
+    def __init__(self, answers):
+        self.answers = answers
+
+    async def aanalyze_meal(self, meal, timeout=None):
+        answer = self.answers[meal]
+        if answer is None:
+            await asyncio.sleep(60)
+        if isinstance(answer, Exception):
+            raise answer
+        return {"dish_name": meal, "ingredients": [{"name": name} for name in answer]}
+
+
+@pytest.fixture
+def processor(tmp_path):
+    processor = FODMAPQueryProcessor("test-key", cache=LLMResponseCache(str(tmp_path / "llm.sqlite3")),
+                                     dish_catalog=DishCatalog(str(tmp_path / "dishes.sqlite3")), meal_timeout=0.1)
+    processor.meal_analyzer = StubMealAnalyzer({
+        "menemen": ["domates", "yumurta"],
+        "kuru fasulye": RuntimeError("LLM unavailable"),
+        "karnıyarık": None,
+    })
+    return processor
+
+
+@pytest.mark.parametrize("meals", [["kuru fasulye"], ["menemen", "kuru fasulye"]])
+def test_failed_dish_gets_no_ingredients(processor, meals):
+    analyses = asyncio.run(processor.aanalyze_meals(meals))
+    assert analyses[-1] == {"error": "LLM unavailable", "dish_name": "kuru fasulye", "ingredients": []}
+
+
+@pytest.mark.parametrize("meals", [["karnıyarık"], ["menemen", "karnıyarık"]])
+def test_timed_out_dish_gets_no_ingredients(processor, meals):
+    analyses = asyncio.run(processor.aanalyze_meals(meals))
+    assert analyses[-1] == {"error": "timed out", "dish_name": "karnıyarık", "ingredients": []}
+
+
+def test_dishes_keep_their_input_order(processor):
+    analyses = asyncio.run(processor.aanalyze_meals(["kuru fasulye", "menemen"]))
+    assert [analysis["dish_name"] for analysis in analyses] == ["kuru fasulye", "menemen"]
+    assert analyses[1]["ingredients"] == [{"name": "domates"}, {"name": "yumurta"}]
+    assert asyncio.run(processor.aanalyze_meals([])) == []